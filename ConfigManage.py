@@ -19,6 +19,10 @@ class ConfigManager:
         except (json.JSONDecodeError, FileNotFoundError):
             return {}
     
+    def reload(self):
+        """重新从文件加载配置"""
+        self.config = self._load_config()
+    
     def save_config(self):
         """保存配置到文件"""
         with open(self.config_path, 'w', encoding='utf-8') as f:
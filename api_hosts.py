@@ -0,0 +1,23 @@
+import os
+
+# 哔哩哔哩接口地址
+#
+# 设置环境变量 BPMB_API_BASE（例如 http://127.0.0.1:8765）后，所有接口请求都会
+# 指向该地址，用于连接本地模拟服务进行压测，见 bench/fake_bili.py。
+
+_override = os.environ.get("BPMB_API_BASE", "").rstrip("/")
+
+API = _override or "https://api.bilibili.com"
+VC_API = _override or "https://api.vc.bilibili.com"
+WWW = _override or "https://www.bilibili.com"
+
+# GitHub 接口地址（插件市场）
+#
+# 设置环境变量 BPMB_GITHUB_BASE 后，插件搜索、package.json 和插件压缩包的下载
+# 都会指向该地址，用于连接本地模拟服务测试插件市场，见 bench/fake_github.py。
+
+_github_override = os.environ.get("BPMB_GITHUB_BASE", "").rstrip("/")
+
+GITHUB_API = _github_override or "https://api.github.com"
+GITHUB_RAW = _github_override or "https://raw.githubusercontent.com"
+GITHUB = _github_override or "https://github.com"
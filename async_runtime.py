@@ -0,0 +1,94 @@
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Optional
+
+# 插件共享的事件循环
+#
+# 所有插件的协程都在同一个后台线程的事件循环中运行，插件可以用 async def
+# 编写处理函数，并用 asyncio.gather 并发发起多个请求，而不需要额外创建线程。
+
+# 同步等待协程的默认超时时间（秒）
+DEFAULT_TIMEOUT = 30
+
+class AsyncRuntime:
+    """在后台线程中运行的共享事件循环"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._shutdown_callbacks = []
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """获取事件循环，首次调用时启动后台线程"""
+        if self._loop is not None and self._thread.is_alive():
+            return self._loop
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="plugin-async-loop", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def in_loop_thread(self) -> bool:
+        """当前是否在事件循环线程中"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Awaitable, timeout: Optional[float] = None) -> Future:
+        """把协程提交到共享事件循环，timeout 到期时协程会在循环内被取消"""
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+        """在共享事件循环中运行协程并同步等待结果，超时抛出 TimeoutError"""
+        if self.in_loop_thread():
+            raise RuntimeError("不能在事件循环线程中同步等待协程，请直接使用 await")
+        future = self.submit(coro, timeout)
+        try:
+            # 循环内的 wait_for 负责取消协程，这里多等一点时间拿到取消结果
+            return future.result(None if timeout is None else timeout + 1)
+        except (asyncio.TimeoutError, FutureTimeoutError):
+            future.cancel()
+            raise TimeoutError(f"协程执行超过 {timeout} 秒")
+
+    def resolve(self, value: Any, timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+        """如果是可等待对象则运行并返回结果，否则原样返回（用于同时支持同步和异步处理函数）"""
+        if inspect.isawaitable(value):
+            return self.run(value, timeout)
+        return value
+
+    def add_shutdown_callback(self, callback):
+        """注册在 shutdown 时于事件循环中执行的协程函数（如关闭连接池）"""
+        self._shutdown_callbacks.append(callback)
+
+    def shutdown(self, timeout: float = 5):
+        """执行清理回调并停止事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+            callbacks, self._shutdown_callbacks = self._shutdown_callbacks, []
+        if loop is None:
+            return
+        for callback in callbacks:
+            try:
+                asyncio.run_coroutine_threadsafe(callback(), loop).result(timeout)
+            except Exception as e:
+                logging.error(f"事件循环清理失败: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+# 全局共享事件循环
+runtime = AsyncRuntime()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""插件数据库写入基准
+
+在临时目录中用 PluginDatabase 写入 N 条消息记录，比较各种写法的每秒插入数：
+
+- legacy:        旧版实现，每次调用重新连接、提交并关闭（默认 journal 模式）
+- execute:       长连接 + WAL，每条 execute 单独提交
+- transaction:   长连接 + WAL，所有插入放在一个 transaction() 中
+- executemany:   长连接 + WAL，一次 executemany
+- execute_later: 写入延迟提交，由后台线程批量提交（计时包含最后的 flush）
+
+    python bench/db_bench.py --rows 20000 --threads 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import plugin_dev
+
+CREATE_SQL = "CREATE TABLE IF NOT EXISTS messages (msg_id INTEGER, talker_id INTEGER, content TEXT, ts INTEGER)"
+INSERT_SQL = "INSERT INTO messages VALUES (?, ?, ?, ?)"
+
+def make_rows(count: int, offset: int = 0) -> List[tuple]:
+    now = int(time.time())
+    return [(offset + i, 10000 + i % 50, f"第{offset + i}条测试消息，用于数据库写入基准", now) for i in range(count)]
+
+def legacy_insert(db_file: str, rows: List[tuple]):
+    """旧版 PluginDatabase.execute 的行为"""
+    for row in rows:
+        conn = sqlite3.connect(db_file)
+        try:
+            conn.execute(INSERT_SQL, row)
+            conn.commit()
+        finally:
+            conn.close()
+
+def run_mode(mode: str, rows_per_thread: int, threads: int) -> Dict[str, float]:
+    name = f"bench_{mode}"
+    database = plugin_dev.PluginDatabase(name)
+    database.create_table("messages", {"msg_id": "INTEGER", "talker_id": "INTEGER", "content": "TEXT", "ts": "INTEGER"})
+    if mode == "legacy":
+        # 旧版使用默认的回滚日志模式
+        database.close()
+        conn = sqlite3.connect(database.db_file)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+    def worker(index: int):
+        rows = make_rows(rows_per_thread, index * rows_per_thread)
+        if mode == "legacy":
+            legacy_insert(database.db_file, rows)
+        elif mode == "execute":
+            for row in rows:
+                database.execute(INSERT_SQL, row)
+        elif mode == "transaction":
+            with database.transaction() as conn:
+                for row in rows:
+                    conn.execute(INSERT_SQL, row)
+        elif mode == "executemany":
+            database.executemany(INSERT_SQL, rows)
+        elif mode == "execute_later":
+            for row in rows:
+                database.execute_later(INSERT_SQL, row)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if mode == "execute_later":
+        database.flush()
+    elapsed = time.perf_counter() - started
+
+    conn = sqlite3.connect(database.db_file)
+    written = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    conn.close()
+    database.close()
+    total = rows_per_thread * threads
+    return {
+        "rows": total,
+        "written": written,
+        "seconds": round(elapsed, 4),
+        "inserts_per_second": round(total / elapsed) if elapsed else None,
+    }
+
+MODES = ("legacy", "execute", "transaction", "executemany", "execute_later")
+
+def main():
+    parser = argparse.ArgumentParser(description="插件数据库写入基准")
+    parser.add_argument("--rows", type=int, default=5000, help="每种写法写入的总行数")
+    parser.add_argument("--legacy-rows", type=int, default=1000, help="legacy 写法的行数（每行一次 fsync，较慢）")
+    parser.add_argument("--threads", type=int, default=1, help="并发写入线程数")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"参与测试的写法，可选: {', '.join(MODES)}")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"未知的写法: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="bpmb-db-bench-")
+    old_cwd = os.getcwd()
+    results = {}
+    try:
+        # PluginDatabase 使用相对路径 plugins/<插件名>/<插件名>.db
+        os.chdir(workdir)
+        for mode in modes:
+            rows = args.legacy_rows if mode == "legacy" else args.rows
+            results[mode] = run_mode(mode, max(1, rows // args.threads), args.threads)
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"threads": args.threads, "results": results}, ensure_ascii=False, indent=2))
+        return
+    print("=" * 50)
+    print(f"线程数: {args.threads}")
+    print("-" * 50)
+    baseline = results.get("legacy", {}).get("inserts_per_second")
+    for mode, item in results.items():
+        speedup = f"  ×{item['inserts_per_second'] / baseline:.1f}" if baseline and mode != "legacy" else ""
+        print(f"  {mode:<14} {item['rows']:>8} 行  {item['seconds']:>8.3f}s  {item['inserts_per_second']:>10,} 行/s{speedup}")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""本地模拟的哔哩哔哩接口服务
+
+实现机器人用到的全部接口，可配置接口延迟、错误率和新消息的产生速率，
+用于在不访问真实哔哩哔哩的情况下对机器人进行压测。
+
+机器人进程设置环境变量 BPMB_API_BASE=http://127.0.0.1:<端口> 即可连接到本服务。
+
+额外的管理接口：
+    GET  /__bench/stats  统计数据（各接口请求数、已产生/已回复消息数、回复延迟分位数）
+    POST /__bench/reset  清空统计数据
+
+用法：
+    python bench/fake_bili.py --port 8765 --latency 0.05 --error-rate 0.01 --msg-rate 2
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# 模拟用户发送的消息内容，前两条能命中压测配置中的关键词
+MESSAGE_TEXTS = ["你好", "在吗 你好", "hello", "请问怎么获取资源", "资源", "随便聊聊"]
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """计算分位数（最近秩法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+class FakeBiliState:
+    """模拟服务的全部状态，所有方法线程安全"""
+
+    def __init__(self, talkers: int = 50, msg_rate: float = 1.0, follow_ratio: float = 1.0, seed: Optional[int] = None):
+        self.talkers = talkers
+        self.msg_rate = msg_rate
+        self.follow_ratio = follow_ratio
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        # 账号uid -> {talker_id: last_msg}
+        self.sessions: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        # (账号uid, talker_id, msg_seqno) -> 消息产生时间
+        self.pending: Dict[tuple, float] = {}
+        self.seqno = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.started = time.time()
+            self.requests: Dict[str, int] = {}
+            self.injected_errors = 0
+            self.generated = 0
+            self.replied = 0
+            self.overwritten = 0
+            self.duplicate_replies = 0
+            self.latencies: List[float] = []
+
+    def count_request(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def count_error(self):
+        with self._lock:
+            self.injected_errors += 1
+
+    def register_account(self, uid: int):
+        with self._lock:
+            self.sessions.setdefault(uid, {})
+
+    def generate(self, elapsed: float):
+        """按消息速率为每个账号产生新消息，elapsed 为距上次产生的秒数"""
+        with self._lock:
+            now = time.time()
+            for uid, sessions in self.sessions.items():
+                expected = self.msg_rate * elapsed
+                count = int(expected)
+                if self.random.random() < expected - count:
+                    count += 1
+                for _ in range(count):
+                    talker_id = 10000 + self.random.randrange(self.talkers)
+                    previous = sessions.get(talker_id)
+                    if previous and previous["sender_uid"] == talker_id:
+                        # 上一条消息还没有被回复就被新消息覆盖
+                        if self.pending.pop((uid, talker_id, previous["msg_seqno"]), None) is not None:
+                            self.overwritten += 1
+                    self.seqno += 1
+                    sessions[talker_id] = {
+                        "sender_uid": talker_id,
+                        "receiver_id": uid,
+                        "msg_type": 1,
+                        "msg_seqno": self.seqno,
+                        "timestamp": int(now),
+                        "content": json.dumps({"content": self.random.choice(MESSAGE_TEXTS)}, ensure_ascii=False),
+                    }
+                    self.pending[(uid, talker_id, self.seqno)] = now
+                    self.generated += 1
+
+    def session_list(self, uid: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            sessions = self.sessions.setdefault(uid, {})
+            ordered = sorted(sessions.items(), key=lambda item: item[1]["msg_seqno"], reverse=True)
+            return [{"talker_id": talker_id, "session_type": 1, "last_msg": dict(msg)} for talker_id, msg in ordered[:20]]
+
+    def record_reply(self, uid: int, talker_id: int):
+        """机器人回复了某个会话，记录该会话最新消息的回复延迟"""
+        with self._lock:
+            now = time.time()
+            sessions = self.sessions.setdefault(uid, {})
+            last = sessions.get(talker_id)
+            if last and last["sender_uid"] == talker_id:
+                created = self.pending.pop((uid, talker_id, last["msg_seqno"]), None)
+                if created is not None:
+                    self.replied += 1
+                    self.latencies.append(now - created)
+            else:
+                self.duplicate_replies += 1
+            self.seqno += 1
+            sessions[talker_id] = {
+                "sender_uid": uid,
+                "receiver_id": talker_id,
+                "msg_type": 1,
+                "msg_seqno": self.seqno,
+                "timestamp": int(now),
+                "content": json.dumps({"content": ""}),
+            }
+
+    def is_follower(self, mid: int) -> bool:
+        # 同一个用户的结果保持稳定
+        return (mid * 2654435761 % 1000) / 1000 < self.follow_ratio
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            latencies = list(self.latencies)
+            return {
+                "elapsed": round(elapsed, 3),
+                "accounts": len(self.sessions),
+                "requests": dict(self.requests),
+                "injected_errors": self.injected_errors,
+                "generated": self.generated,
+                "replied": self.replied,
+                "pending": len(self.pending),
+                "overwritten": self.overwritten,
+                "duplicate_replies": self.duplicate_replies,
+                "replies_per_second": round(self.replied / elapsed, 3),
+                "latency": {
+                    "p50": percentile(latencies, 0.50),
+                    "p90": percentile(latencies, 0.90),
+                    "p99": percentile(latencies, 0.99),
+                    "max": max(latencies) if latencies else None,
+                },
+            }
+
+class FakeBiliHandler(BaseHTTPRequestHandler):
+    """请求处理器，路由表见 ROUTES"""
+
+    server_version = "FakeBili/1.0"
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = {
+        "/x/frontend/finger/spi": "handle_spi",
+        "/": "handle_home",
+        "/session_svr/v1/session_svr/get_sessions": "handle_get_sessions",
+        "/web_im/v1/web_im/send_msg": "handle_send_msg",
+        "/x/web-interface/relation": "handle_relation",
+        "/x/relation/modify": "handle_relation_modify",
+        "/x/relation/fans": "handle_relation_fans",
+        "/x/web-interface/card": "handle_card",
+        "/x/web-interface/nav": "handle_nav",
+        "/bapis/bilibili.api.ticket.v1.Ticket/GenWebTicket": "handle_ticket",
+        "/x/dynamic/feed/draw/upload_bfs": "handle_upload_bfs",
+        "/__bench/stats": "handle_bench_stats",
+        "/__bench/reset": "handle_bench_reset",
+    }
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> FakeBiliState:
+        return self.server.state
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_HEAD(self):
+        self.dispatch()
+
+    def dispatch(self):
+        url = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.form = self.read_form()
+        handler = self.ROUTES.get(url.path)
+        if handler is None:
+            self.send_json({"code": -404, "message": "啥都木有"}, status=404)
+            return
+
+        if not url.path.startswith("/__bench/"):
+            self.state.count_request(url.path)
+            self.simulate_latency()
+            if self.random_error():
+                return
+        getattr(self, handler)()
+
+    def read_form(self) -> Dict[str, str]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        if "application/x-www-form-urlencoded" in (self.headers.get("Content-Type") or ""):
+            return {k: v[-1] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+        return {}
+
+    def simulate_latency(self):
+        latency, jitter = self.server.latency, self.server.jitter
+        if latency or jitter:
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    def random_error(self) -> bool:
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.state.count_error()
+            self.send_json({"code": -500, "message": "服务器错误"}, status=503)
+            return True
+        return False
+
+    def cookie_uid(self) -> int:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(self.headers.get("Cookie") or "")
+        except Exception:
+            return 0
+        morsel = cookie.get("DedeUserID")
+        try:
+            return int(morsel.value) if morsel else 0
+        except ValueError:
+            return 0
+
+    def send_json(self, payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def ok(self, data: Any = None):
+        self.send_json({"code": 0, "message": "0", "ttl": 1, "data": data if data is not None else {}})
+
+    # ---- 接口实现 ----
+
+    def handle_spi(self):
+        self.ok({"b_3": "FAKE-BUVID3-0000-0000infoc", "b_4": "FAKE-BUVID4-0000-0000-infoc"})
+
+    def handle_home(self):
+        self.send_json({}, headers={"Set-Cookie": f"b_nut={int(time.time())}; Path=/"})
+
+    def handle_get_sessions(self):
+        uid = self.cookie_uid()
+        self.state.register_account(uid)
+        self.ok({"session_list": self.state.session_list(uid), "has_more": 0})
+
+    def handle_send_msg(self):
+        uid = self.cookie_uid() or int(self.form.get("msg[sender_uid]") or 0)
+        try:
+            receiver_id = int(self.form.get("msg[receiver_id]") or 0)
+        except ValueError:
+            receiver_id = 0
+        if not receiver_id:
+            self.send_json({"code": -400, "message": "请求错误"})
+            return
+        self.state.record_reply(uid, receiver_id)
+        self.ok({"msg_key": random.getrandbits(63), "msg_content": self.form.get("msg[content]", "")})
+
+    def handle_relation(self):
+        mid = int(self.query.get("mid") or 0)
+        attribute = 2 if self.state.is_follower(mid) else 0
+        self.ok({"relation": {"mid": mid, "attribute": 0}, "be_relation": {"mid": mid, "attribute": attribute}})
+
+    def handle_relation_modify(self):
+        self.ok()
+
+    def handle_relation_fans(self):
+        now = int(time.time())
+        fans = [{"mid": 20000 + i, "uname": f"粉丝{i}", "mtime": now - i * 30} for i in range(5)]
+        self.ok({"list": fans, "total": len(fans)})
+
+    def handle_card(self):
+        mid = self.query.get("mid") or "0"
+        self.ok({"card": {"mid": mid, "name": f"用户{mid}"}, "following": False})
+
+    def handle_nav(self):
+        self.ok({
+            "isLogin": True,
+            "wbi_img": {
+                "img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+                "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png",
+            },
+        })
+
+    def handle_ticket(self):
+        self.ok({"ticket": f"fake.ticket.{int(time.time())}", "created_at": int(time.time()), "ttl": 259200})
+
+    def handle_upload_bfs(self):
+        self.ok({"image_url": "https://i0.hdslb.com/bfs/new_dyn/fake.png", "image_width": 300, "image_height": 300})
+
+    def handle_bench_stats(self):
+        self.send_json(self.state.stats())
+
+    def handle_bench_reset(self):
+        self.state.reset_stats()
+        self.send_json({"code": 0})
+
+class FakeBiliServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state: FakeBiliState, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        super().__init__(address, FakeBiliHandler)
+        self.state = state
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._stop = threading.Event()
+
+    def start_generator(self, tick: float = 0.1):
+        """启动新消息产生线程"""
+        def run():
+            last = time.time()
+            while not self._stop.wait(tick):
+                now = time.time()
+                self.state.generate(now - last)
+                last = now
+        threading.Thread(target=run, daemon=True).start()
+
+    def server_close(self):
+        self._stop.set()
+        super().server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的哔哩哔哩接口服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机抖动范围（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503错误的概率")
+    parser.add_argument("--msg-rate", type=float, default=1.0, help="每个账号每秒产生的新消息数")
+    parser.add_argument("--talkers", type=int, default=50, help="每个账号的模拟会话用户数")
+    parser.add_argument("--follow-ratio", type=float, default=1.0, help="已关注机器人账号的用户比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    state = FakeBiliState(talkers=args.talkers, msg_rate=args.msg_rate, follow_ratio=args.follow_ratio, seed=args.seed)
+    server = FakeBiliServer((args.host, args.port), state, args.latency, args.jitter, args.error_rate)
+    server.start_generator()
+    print(f"模拟服务已启动: http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
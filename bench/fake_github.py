@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""本地模拟的 GitHub 插件市场服务
+
+实现插件市场用到的三个接口，可配置延迟和错误率，用于在不访问 GitHub 的情况下
+测试插件搜索、package.json 缓存和插件安装：
+
+    GET /search/repositories?q=bilibot_plugins_<关键词> in:name   搜索仓库（支持 ETag / 304）
+    GET /<owner>/<repo>/main/package.json                        插件清单（支持 ETag / 304）
+    GET /<owner>/<repo>/archive/refs/heads/main.zip              插件压缩包（支持 ETag / 304）
+
+机器人或面板进程设置环境变量 BPMB_GITHUB_BASE=http://127.0.0.1:<端口> 即可连接到本服务。
+
+额外的管理接口：
+    GET  /__bench/stats  统计数据（各类请求数、304 次数、注入的错误数）
+    POST /__bench/reset  清空统计数据
+
+用法：
+    python bench/fake_github.py --port 8766 --repos 30 --latency 0.2
+"""
+import argparse
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+OWNER = "bench"
+
+class FakeGithubState:
+    """模拟的仓库列表和请求统计，所有方法线程安全"""
+
+    def __init__(self, repos: int = 30, missing_every: int = 5):
+        self._lock = threading.Lock()
+        # 每 missing_every 个仓库有一个没有 package.json（0 表示全部都有）
+        self.repos: List[Dict[str, Any]] = []
+        for i in range(repos):
+            name = f"bilibot_plugins_demo{i}"
+            self.repos.append({
+                "name": name,
+                "full_name": f"{OWNER}/{name}",
+                "stars": (repos - i) * 3,
+                "has_manifest": not (missing_every and i % missing_every == missing_every - 1),
+                "version": f"1.0.{i}",
+            })
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.started = time.time()
+            self.requests: Dict[str, int] = {}
+            self.not_modified = 0
+            self.injected_errors = 0
+
+    def count_request(self, kind: str):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def count_error(self):
+        with self._lock:
+            self.injected_errors += 1
+
+    def find(self, full_name: str) -> Optional[Dict[str, Any]]:
+        for repo in self.repos:
+            if repo["full_name"] == full_name:
+                return repo
+        return None
+
+    def bump(self, full_name: str):
+        """修改仓库的版本号，package.json 的 ETag 随之变化"""
+        with self._lock:
+            repo = self.find(full_name)
+            if repo is not None:
+                major, minor, patch = repo["version"].split(".")
+                repo["version"] = f"{major}.{minor}.{int(patch) + 1}"
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        term = query.split()[0].lower() if query.split() else ""
+        items = []
+        for repo in self.repos:
+            if term in repo["name"].lower():
+                items.append({
+                    "name": repo["name"],
+                    "full_name": repo["full_name"],
+                    "description": f"{repo['name']} 的模拟插件",
+                    "html_url": f"https://github.com/{repo['full_name']}",
+                    "clone_url": f"https://github.com/{repo['full_name']}.git",
+                    "stargazers_count": repo["stars"],
+                    "forks_count": repo["stars"] // 3,
+                    "updated_at": "2024-01-01T00:00:00Z",
+                    "owner": {"login": OWNER},
+                })
+        items.sort(key=lambda item: item["stargazers_count"], reverse=True)
+        return items
+
+    def manifest(self, repo: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "name": repo["name"],
+            "version": repo["version"],
+            "description": f"{repo['name']} 的模拟插件",
+            "author": OWNER,
+            "dependencies": [],
+        }
+
+    def archive(self, repo: Dict[str, Any]) -> bytes:
+        """GitHub 格式的源码压缩包：所有文件位于 <仓库名>-main/ 目录下"""
+        prefix = f"{repo['name']}-main/"
+        buffer = io.BytesIO()
+        files = {
+            "package.json": json.dumps(self.manifest(repo), ensure_ascii=False, indent=2),
+            "main.py": "from plugin_base import PluginBase\n",
+        }
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, content in files.items():
+                # 固定时间戳，内容不变时压缩包（和 ETag）也不变
+                zf.writestr(zipfile.ZipInfo(prefix + name, date_time=(2024, 1, 1, 0, 0, 0)), content)
+        return buffer.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "elapsed": round(time.time() - self.started, 3),
+                "repos": len(self.repos),
+                "requests": dict(self.requests),
+                "not_modified": self.not_modified,
+                "injected_errors": self.injected_errors,
+            }
+
+def etag_of(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+    """请求处理器，按路径前缀和后缀分发"""
+
+    server_version = "FakeGithub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> FakeGithubState:
+        return self.server.state
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        url = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        if path == "/__bench/stats":
+            self.send_json(self.state.stats())
+            return
+        if path == "/__bench/reset":
+            self.state.reset_stats()
+            self.send_json({"ok": True})
+            return
+
+        if path == "/search/repositories":
+            kind = "search"
+        elif path.endswith("/main/package.json"):
+            kind = "manifest"
+        elif path.endswith("/archive/refs/heads/main.zip"):
+            kind = "archive"
+        else:
+            self.send_json({"message": "Not Found"}, status=404)
+            return
+        self.state.count_request(kind)
+        self.simulate_latency()
+        if self.random_error():
+            return
+        getattr(self, f"handle_{kind}")(path)
+
+    def simulate_latency(self):
+        latency, jitter = self.server.latency, self.server.jitter
+        if latency or jitter:
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    def random_error(self) -> bool:
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.state.count_error()
+            self.send_json({"message": "Service Unavailable"}, status=503)
+            return True
+        return False
+
+    def send_body(self, body: bytes, content_type: str, status: int = 200, etag: Optional[str] = None):
+        # 与 GitHub 一致：请求带有相同的 If-None-Match 时返回没有内容的 304
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.state.count_not_modified()
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload: Any, status: int = 200, etag: bool = False):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_body(body, "application/json; charset=utf-8", status, etag_of(body) if etag else None)
+
+    def repo_from_path(self, path: str, suffix: str) -> Optional[Dict[str, Any]]:
+        return self.state.find(path[1:-len(suffix)])
+
+    # ---- 接口实现 ----
+
+    def handle_search(self, path: str):
+        items = self.state.search(self.query.get("q", ""))
+        self.send_json({"total_count": len(items), "incomplete_results": False, "items": items}, etag=True)
+
+    def handle_manifest(self, path: str):
+        repo = self.repo_from_path(path, "/main/package.json")
+        if repo is None or not repo["has_manifest"]:
+            self.send_body(b"404: Not Found", "text/plain; charset=utf-8", status=404)
+            return
+        self.send_json(self.state.manifest(repo), etag=True)
+
+    def handle_archive(self, path: str):
+        repo = self.repo_from_path(path, "/archive/refs/heads/main.zip")
+        if repo is None:
+            self.send_json({"message": "Not Found"}, status=404)
+            return
+        body = self.state.archive(repo)
+        self.send_body(body, "application/zip", etag=etag_of(body))
+
+class FakeGithubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state: FakeGithubState, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        super().__init__(address, FakeGithubHandler)
+        self.state = state
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 GitHub 插件市场服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--repos", type=int, default=30, help="模拟的插件仓库数")
+    parser.add_argument("--missing-every", type=int, default=5, help="每隔多少个仓库有一个没有 package.json（0 表示都有）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机抖动范围（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503错误的概率")
+    args = parser.parse_args()
+
+    state = FakeGithubState(repos=args.repos, missing_every=args.missing_every)
+    server = FakeGithubServer((args.host, args.port), state, args.latency, args.jitter, args.error_rate)
+    print(f"模拟服务已启动: http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""关键词匹配微基准
+
+生成 10 ~ 100k 条规则的关键词表（混合 ; 分隔的多关键词、中文和英文、长消息），
+测量各匹配引擎的规则吞吐量（规则数 × 消息数 / 秒）和单条消息延迟，
+结果以 JSON 输出，便于在版本之间做回归对比：
+    python bench/keyword_bench.py --sizes 10,100,1000,10000 --output keyword_bench.json
+    python bench/keyword_bench.py --config config.json --cassette cassettes/prod.jsonl.gz
+
+新的匹配引擎用 @register_engine 注册：引擎是一个工厂函数，接收关键词表，
+返回 match(message) -> Optional[str]，行为必须与 check_keywords 一致。
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+os.environ.setdefault("BPMB_LOG_LEVEL", "WARNING")
+
+import index
+
+# 常用汉字，用于生成中文关键词和消息
+CJK_CHARS = (
+    "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学"
+    "么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老"
+    "因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感见明问力理尔点文几定本公特做外孩相西果走将月十实向声车全"
+    "信重三机工物气每并别真打太新比才便夫再书部水像眼等体却加电主界门利海受听表德少克代员许稜先口由死安写性马光白或住"
+)
+ASCII_CHARS = "abcdefghijklmnopqrstuvwxyz"
+
+MatchFn = Callable[[str], Optional[str]]
+ENGINES: Dict[str, Callable[[Dict[str, str]], MatchFn]] = {}
+
+def register_engine(name: str):
+    """注册匹配引擎"""
+    def decorator(factory):
+        ENGINES[name] = factory
+        return factory
+    return decorator
+
+@register_engine("check_keywords")
+def build_check_keywords(table: Dict[str, str]) -> MatchFn:
+    """基线：直接调用 SimpleBilibiliReply.check_keywords"""
+    bot = SimpleNamespace(keyword_reply=table)
+    check = index.SimpleBilibiliReply.check_keywords
+    return lambda message: check(bot, message)
+
+@register_engine("precompiled")
+def build_precompiled(table: Dict[str, str]) -> MatchFn:
+    """预先拆分 ; 并转为小写的线性扫描，匹配顺序与 check_keywords 相同"""
+    needles = []
+    for keyword, reply in table.items():
+        if ';' in keyword:
+            needles.extend((k.strip().lower(), reply) for k in keyword.split(";") if k.strip())
+        else:
+            needles.append((keyword.lower(), reply))
+
+    def match(message: str) -> Optional[str]:
+        if not message:
+            return None
+        lower_message = message.lower()
+        for needle, reply in needles:
+            if needle in lower_message:
+                return reply
+        return None
+    return match
+
+def random_word(rng: random.Random, cjk: bool) -> str:
+    if cjk:
+        return "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 5)))
+    return "".join(rng.choice(ASCII_CHARS) for _ in range(rng.randint(4, 10)))
+
+def generate_table(size: int, rng: random.Random, cjk_ratio: float = 0.7, alt_ratio: float = 0.3) -> Dict[str, str]:
+    """生成 size 条规则的关键词表，alt_ratio 比例的规则使用 ; 分隔的多个关键词"""
+    table = {}
+    while len(table) < size:
+        count = rng.randint(2, 4) if rng.random() < alt_ratio else 1
+        words = [random_word(rng, rng.random() < cjk_ratio) for _ in range(count)]
+        # 英文关键词随机大写，覆盖大小写不敏感的路径
+        words = [w.upper() if w.isascii() and rng.random() < 0.2 else w for w in words]
+        table[";".join(words)] = f"回复{len(table)}"
+    return table
+
+def generate_messages(table: Dict[str, str], count: int, rng: random.Random,
+                      hit_ratio: float = 0.5, long_ratio: float = 0.1) -> List[str]:
+    """生成消息：hit_ratio 比例包含某条规则的关键词，long_ratio 比例为 500~2000 字的长消息"""
+    keys = list(table)
+    messages = []
+    for _ in range(count):
+        length = rng.randint(500, 2000) if rng.random() < long_ratio else rng.randint(4, 40)
+        filler = "".join(rng.choice(CJK_CHARS if rng.random() < 0.7 else ASCII_CHARS + " ") for _ in range(length))
+        if keys and rng.random() < hit_ratio:
+            needle = rng.choice(rng.choice(keys).split(";"))
+            position = rng.randint(0, len(filler))
+            filler = filler[:position] + needle + filler[position:]
+        messages.append(filler)
+    return messages
+
+def load_config_table(path: str) -> Dict[str, str]:
+    """从 config.json 中读取所有账号关键词和全局关键词"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    table = {}
+    for account in config.get("accounts", []):
+        table.update(account.get("keyword", {}))
+    table.update(config.get("global_keywords", {}))
+    return table
+
+def load_cassette_messages(path: str) -> List[str]:
+    """从录制文件中提取真实消息文本"""
+    import cassette
+    messages = []
+    for entry in cassette.read_cassette(path):
+        if entry.get("kind") != cassette.KIND_SESSIONS or not isinstance(entry.get("response"), dict):
+            continue
+        for session in (entry["response"].get("data") or {}).get("session_list") or []:
+            content = index.SimpleBilibiliReply.extract_message_content(None, session.get("last_msg") or {})
+            if content:
+                messages.append(content)
+    return messages
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def measure(match: MatchFn, messages: List[str], min_time: float) -> Dict[str, float]:
+    """重复匹配消息列表至少 min_time 秒，返回单条消息延迟统计"""
+    timings = []
+    hits = 0
+    started = time.perf_counter()
+    rounds = 0
+    while True:
+        rounds += 1
+        for message in messages:
+            t0 = time.perf_counter_ns()
+            reply = match(message)
+            timings.append(time.perf_counter_ns() - t0)
+            if rounds == 1 and reply is not None:
+                hits += 1
+        if time.perf_counter() - started >= min_time:
+            break
+    total = sum(timings) / 1e9
+    return {
+        "rounds": rounds,
+        "calls": len(timings),
+        "hits": hits,
+        "total_seconds": round(total, 6),
+        "mean_us": round(statistics.fmean(timings) / 1000, 3),
+        "p50_us": round(percentile(timings, 0.50) / 1000, 3),
+        "p99_us": round(percentile(timings, 0.99) / 1000, 3),
+        "max_us": round(max(timings) / 1000, 3),
+    }
+
+def run_case(name: str, table: Dict[str, str], messages: List[str], engines: List[str], min_time: float) -> Dict:
+    rules = len(table)
+    case = {"case": name, "rules": rules, "messages": len(messages), "engines": {}}
+    expected = None
+    for engine in engines:
+        t0 = time.perf_counter()
+        match = ENGINES[engine](table)
+        build_seconds = time.perf_counter() - t0
+        # 各引擎的结果必须与基线一致
+        results = [match(m) for m in messages]
+        if expected is None:
+            expected = results
+        mismatches = sum(1 for a, b in zip(results, expected) if a != b)
+        stats = measure(match, messages, min_time)
+        stats["build_ms"] = round(build_seconds * 1000, 3)
+        stats["rules_per_second"] = round(rules * stats["calls"] / stats["total_seconds"]) if stats["total_seconds"] else None
+        stats["messages_per_second"] = round(stats["calls"] / stats["total_seconds"]) if stats["total_seconds"] else None
+        stats["mismatches"] = mismatches
+        case["engines"][engine] = stats
+    return case
+
+def print_case(case: Dict):
+    print(f"[{case['case']}] 规则数: {case['rules']}  消息数: {case['messages']}", file=sys.stderr)
+    for engine, stats in case["engines"].items():
+        warn = f"  结果不一致: {stats['mismatches']}" if stats["mismatches"] else ""
+        print(f"  {engine:<16} p50={stats['p50_us']:>10.2f}µs  p99={stats['p99_us']:>10.2f}µs  "
+              f"规则/s={stats['rules_per_second']:>14,}  构建={stats['build_ms']}ms{warn}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词匹配微基准")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000", help="规则数，逗号分隔")
+    parser.add_argument("--messages", type=int, default=500, help="每组生成的消息数")
+    parser.add_argument("--hit-ratio", type=float, default=0.5, help="命中关键词的消息比例")
+    parser.add_argument("--long-ratio", type=float, default=0.1, help="长消息比例")
+    parser.add_argument("--cjk-ratio", type=float, default=0.7, help="中文关键词比例")
+    parser.add_argument("--alt-ratio", type=float, default=0.3, help="使用 ; 分隔多关键词的规则比例")
+    parser.add_argument("--min-time", type=float, default=1.0, help="每个引擎每组的最短测量时间（秒）")
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"参与测试的引擎，可选: {', '.join(ENGINES)}")
+    parser.add_argument("--config", default=None, help="使用 config.json 中的真实关键词表")
+    parser.add_argument("--cassette", default=None, help="使用录制文件中的真实消息")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="结果JSON写入的文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"未知的引擎: {', '.join(unknown)}")
+
+    rng = random.Random(args.seed)
+    real_messages = load_cassette_messages(args.cassette) if args.cassette else None
+    cases = []
+
+    if args.config:
+        table = load_config_table(args.config)
+        messages = real_messages or generate_messages(table, args.messages, rng, args.hit_ratio, args.long_ratio)
+        cases.append(run_case("config", table, messages, engines, args.min_time))
+        print_case(cases[-1])
+
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        table = generate_table(size, rng, args.cjk_ratio, args.alt_ratio)
+        messages = real_messages or generate_messages(table, args.messages, rng, args.hit_ratio, args.long_ratio)
+        cases.append(run_case(f"synthetic-{size}", table, messages, engines, args.min_time))
+        print_case(cases[-1])
+
+    result = {
+        "version": index.version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+        "params": vars(args),
+        "cases": cases,
+    }
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
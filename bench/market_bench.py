@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""插件市场搜索基准
+
+启动本地模拟的 GitHub 服务（bench/fake_github.py），测量一次插件搜索在各种情况下的耗时：
+
+- legacy:      旧版实现，搜索后逐个串行获取 package.json
+- cold:        没有缓存，package.json 并发获取
+- warm:        缓存未过期，不发出请求
+- revalidate:  缓存已过期，条件请求全部返回 304
+- offline:     重新创建 PluginManager，只使用磁盘上的缓存
+- unreachable: 服务不可用，自动退回缓存
+
+    python bench/market_bench.py --repos 30 --latency 0.2
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import plugin_manage
+from fake_github import FakeGithubServer, FakeGithubState
+
+def legacy_search(base: str, keyword: str) -> int:
+    """旧版 search_plugins 的请求方式"""
+    params = {'q': f'bilibot_plugins_{keyword} in:name fork:true', 'sort': 'stars', 'order': 'desc'}
+    items = requests.get(f"{base}/search/repositories", params=params, timeout=10).json().get('items', [])
+    for repo in items:
+        try:
+            requests.get(f"{base}/{repo['full_name']}/main/package.json", timeout=5)
+        except requests.RequestException:
+            pass
+    return len(items)
+
+def timed(server: FakeGithubServer, func) -> Dict[str, Any]:
+    server.state.reset_stats()
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    stats = server.state.stats()
+    plugins, source = result if isinstance(result, tuple) else (result, "network")
+    return {
+        "seconds": round(seconds, 4),
+        "plugins": plugins if isinstance(plugins, int) else len(plugins),
+        "source": source,
+        "requests": sum(stats["requests"].values()),
+        "not_modified": stats["not_modified"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="插件市场搜索基准")
+    parser.add_argument("--repos", type=int, default=30, help="模拟的插件仓库数")
+    parser.add_argument("--latency", type=float, default=0.1, help="模拟服务每个请求的延迟（秒）")
+    parser.add_argument("--keyword", default="", help="搜索关键词")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    state = FakeGithubState(repos=args.repos)
+    server = FakeGithubServer(("127.0.0.1", 0), state, latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    workdir = tempfile.mkdtemp(prefix="bpmb-market-bench-")
+    cache_file = os.path.join(workdir, "market_cache.json")
+    plugins_dir = os.path.join(workdir, "plugins")
+
+    def manager(url: str = base) -> plugin_manage.PluginManager:
+        return plugin_manage.PluginManager(plugins_dir, api_base=url, raw_base=url, download_base=url,
+                                           cache_file=cache_file)
+
+    results = {}
+    try:
+        results["legacy"] = timed(server, lambda: legacy_search(base, args.keyword))
+        pm = manager()
+        results["cold"] = timed(server, lambda: pm.search(args.keyword))
+        results["warm"] = timed(server, lambda: pm.search(args.keyword))
+        results["revalidate"] = timed(server, lambda: pm.search(args.keyword, refresh=True))
+        results["offline"] = timed(server, lambda: manager().search(args.keyword, offline=True))
+
+        server.shutdown()
+        server.server_close()
+        unreachable = manager(base)
+        results["unreachable"] = timed(server, lambda: unreachable.search(args.keyword, refresh=True))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"repos": args.repos, "latency": args.latency, "results": results}, ensure_ascii=False, indent=2))
+        return
+    print("=" * 60)
+    print(f"仓库数: {args.repos}  接口延迟: {args.latency}s")
+    print("-" * 60)
+    for name, item in results.items():
+        print(f"  {name:<12} {item['seconds']:>8.3f}s  {item['plugins']:>4} 个插件  "
+              f"{item['requests']:>4} 次请求  304: {item['not_modified']:<4} 来源: {item['source']}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""回放录制的接口流量，测量消息处理流水线的CPU开销
+
+录制：在 config.json 中设置 "record_cassette": "cassettes/prod.jsonl.gz"
+（或设置环境变量 BPMB_RECORD_CASSETTE）后正常运行机器人。
+
+回放：把录制的 get_sessions 响应按顺序喂给 process_messages，完整经过
+插件 → 关键词 → 关系检查 → 发送 流水线，所有网络请求都被替换为录制的响应
+或直接返回成功，不做任何等待，用于比较不同版本的流水线CPU开销：
+    python bench/replay_bench.py cassettes/prod.jsonl.gz --repeat 20 --plugins
+    python bench/replay_bench.py cassettes/prod.jsonl.gz --profile replay.pstats
+"""
+import argparse
+import cProfile
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# 回放时不再录制，且默认只输出警告以上的日志
+os.environ.pop("BPMB_RECORD_CASSETTE", None)
+os.environ.setdefault("BPMB_LOG_LEVEL", "WARNING")
+
+import cassette
+import index
+
+class ReplayBilibiliReply(index.SimpleBilibiliReply):
+    """使用录制数据代替网络请求的机器人"""
+
+    def __init__(self, polls: List[Dict[str, Any]], relations: Dict[int, Dict[str, Any]], **kwargs):
+        self.polls = polls
+        self.relations = relations
+        self.poll_index = 0
+        self.sent = 0
+        super().__init__(
+            sessdata="", bili_jct="", DedeUserID="", DedeUserID__ckMd5="", sid="",
+            device_id="REPLAY", **kwargs
+        )
+        self.recorder = None
+
+    def _build_headers(self, *args) -> Dict[str, str]:
+        return {}
+
+    def rewind(self):
+        """回到录制开头，清空已处理消息，使下一遍回放重新处理全部消息"""
+        self.poll_index = 0
+        self.processed_msg_ids.clear()
+
+    def has_next(self) -> bool:
+        return self.poll_index < len(self.polls)
+
+    def get_sessions(self) -> List[Dict]:
+        if not self.has_next():
+            return []
+        entry = self.polls[self.poll_index]
+        self.poll_index += 1
+        # 把消息时间平移到当前时间附近，避免被当作超过5分钟的旧消息跳过
+        offset = int(time.time() - entry["ts"])
+        sessions = []
+        for session in entry["response"].get("data", {}).get("session_list") or []:
+            session = dict(session)
+            last_msg = dict(session.get("last_msg") or {})
+            if last_msg.get("timestamp"):
+                last_msg["timestamp"] += offset
+            session["last_msg"] = last_msg
+            sessions.append(session)
+        self.metrics.last_poll.set_to_current_time()
+        return sessions
+
+    def check_user_relation(self, target_uid: int) -> Optional[Dict]:
+        with self.metrics.relation_latency.time():
+            relation = self.relations.get(int(target_uid))
+        if relation is None:
+            # 没有录制到的用户视为已关注，让消息走完整个发送流程
+            relation = {"be_relation": {"mid": target_uid, "attribute": 2}}
+        return relation
+
+    def get_userName(self, mid: int) -> Optional[Dict]:
+        return {"card": {"mid": mid, "name": f"用户{mid}"}}
+
+    def Auto_focus(self, mid: int) -> Optional[Dict]:
+        return True
+
+    def send_text_message(self, receiver_id: int, message: str) -> bool:
+        if self.at_user:
+            message = message.replace("[at_user]", self.get_userName(receiver_id)["card"]["name"])
+        self.sent += 1
+        return True
+
+    def send_image_message(self, receiver_id: int, image_message: str) -> bool:
+        self.sent += 1
+        return True
+
+def load_replay_data(path: str, account: Optional[str]):
+    """从录制文件中取出成功的会话轮询和关系检查结果"""
+    polls, relations = [], {}
+    self_uid = None
+    for entry in cassette.read_cassette(path):
+        if account and entry.get("account") != account:
+            continue
+        response = entry.get("response")
+        if not isinstance(response, dict) or response.get("code") != 0:
+            continue
+        kind = entry.get("kind")
+        if kind == cassette.KIND_SESSIONS:
+            polls.append(entry)
+        elif kind == cassette.KIND_RELATION:
+            mid = (entry.get("params") or {}).get("mid")
+            if mid is not None:
+                relations[int(mid)] = response.get("data") or {}
+        elif kind == cassette.KIND_SEND and self_uid is None:
+            self_uid = (entry.get("params") or {}).get("w_sender_uid")
+    return polls, relations, self_uid
+
+def find_account_keywords(account: Optional[str], path: Optional[str] = None) -> Dict[str, str]:
+    """关键词来源：--keywords 指定的JSON文件，否则使用 config.json 中同名账号的关键词"""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    for item in index.config.get_accounts():
+        if account is None or item.get("name") == account:
+            return dict(item.get("keyword", {}))
+    return {}
+
+def stage_totals() -> Dict[str, Dict[str, float]]:
+    """汇总各阶段的调用次数和总耗时（毫秒）"""
+    totals = {}
+    for sample in index.STAGE_LATENCY.collect()["samples"]:
+        stage = sample["labels"]["stage"]
+        item = totals.setdefault(stage, {"count": 0, "total_ms": 0.0})
+        item["count"] += sample["count"]
+        item["total_ms"] += sample["sum"] * 1000
+    return {k: {"count": v["count"], "total_ms": round(v["total_ms"], 2)} for k, v in totals.items()}
+
+def run_replay(args) -> Dict[str, Any]:
+    polls, relations, recorded_uid = load_replay_data(args.cassette, args.account)
+    if not polls:
+        raise SystemExit("录制文件中没有可回放的 get_sessions 记录")
+
+    bot = ReplayBilibiliReply(
+        polls, relations,
+        account_name=args.account or "回放",
+        self_uid=args.self_uid or recorded_uid or "0",
+        keywords=find_account_keywords(args.account, args.keywords),
+        at_user=args.at_user,
+        auto_focus=False,
+    )
+    if args.plugins:
+        index.plugin_loader.set_dependencies(None, index.config)
+        index.plugin_loader.load_all_plugins()
+        bot.set_plugin_loader(index.plugin_loader)
+
+    profiler = cProfile.Profile() if args.profile else None
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    if profiler:
+        profiler.enable()
+    for _ in range(args.repeat):
+        bot.rewind()
+        while bot.has_next():
+            bot.process_messages()
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    received = index.MESSAGES_RECEIVED.labels(bot.account_name).value
+    return {
+        "cassette": args.cassette,
+        "repeat": args.repeat,
+        "polls": len(polls) * args.repeat,
+        "messages": int(received),
+        "replies": bot.sent,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "cpu_us_per_poll": round(cpu / (len(polls) * args.repeat) * 1e6, 2),
+        "cpu_us_per_message": round(cpu / received * 1e6, 2) if received else None,
+        "messages_per_second": round(received / wall, 1) if wall else None,
+        "stages": stage_totals(),
+        "profile": args.profile,
+    }
+
+def print_report(result: Dict[str, Any]):
+    print("=" * 50)
+    print(f"录制文件: {result['cassette']}  回放次数: {result['repeat']}")
+    print(f"轮询: {result['polls']}  消息: {result['messages']}  回复: {result['replies']}")
+    print(f"耗时: {result['wall_seconds']}s  CPU: {result['cpu_seconds']}s  处理速率: {result['messages_per_second']} 条/s")
+    print(f"每轮CPU: {result['cpu_us_per_poll']}µs  每条消息CPU: {result['cpu_us_per_message']}µs")
+    print("-" * 50)
+    for stage, item in sorted(result["stages"].items(), key=lambda kv: -kv[1]["total_ms"]):
+        print(f"  {stage:<14} {item['count']:>8} 次  {item['total_ms']:>10.2f} ms")
+    if result["profile"]:
+        print(f"性能分析已保存到 {result['profile']}（python -m pstats {result['profile']}）")
+    print("=" * 50)
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的接口流量，测量消息处理流水线的CPU开销")
+    parser.add_argument("cassette", help="录制文件路径（.jsonl.gz）")
+    parser.add_argument("--account", default=None, help="只回放指定账号的记录，同时使用 config.json 中该账号的关键词")
+    parser.add_argument("--self-uid", default=None, help="机器人账号UID，默认从录制的发送记录中推断")
+    parser.add_argument("--keywords", default=None, help="关键词JSON文件（{关键词: 回复}），默认使用 config.json 中的账号关键词")
+    parser.add_argument("--repeat", type=int, default=1, help="回放遍数")
+    parser.add_argument("--plugins", action="store_true", help="加载 plugins 目录中的插件")
+    parser.add_argument("--at-user", action="store_true", help="开启 [at_user] 替换")
+    parser.add_argument("--profile", default=None, help="保存 cProfile 结果到指定文件")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    result = run_replay(args)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""机器人吞吐量/延迟压测入口
+
+启动本地模拟接口服务（bench/fake_bili.py），在同一进程中启动 N 个
+SimpleBilibiliReply 账号轮询该服务，运行指定时长后输出：
+
+- 每秒回复数
+- 回复延迟 p50/p99（从模拟服务产生消息到收到回复）
+- 机器人进程的 CPU 占用和 RSS
+
+每次性能改动前后运行一次即可得到可对比的基线：
+    python bench/run_bench.py --accounts 4 --duration 60 --msg-rate 2 --latency 0.05
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import psutil
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# 压测账号的关键词，能命中模拟服务产生的部分消息
+BENCH_KEYWORDS = {
+    "你好": "你好呀，这是自动回复",
+    "资源;获取": "资源请查看置顶动态",
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def http_json(url: str, method: str = "GET"):
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+def start_fake_server(args, port: int) -> subprocess.Popen:
+    """在子进程中启动模拟服务，避免其CPU占用计入机器人进程"""
+    cmd = [
+        sys.executable, os.path.join(BENCH_DIR, "fake_bili.py"),
+        "--port", str(port),
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate),
+        "--msg-rate", str(args.msg_rate),
+        "--talkers", str(args.talkers),
+        "--follow-ratio", str(args.follow_ratio),
+    ]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"模拟服务启动失败: {proc.stderr.read().decode('utf-8', 'replace')}")
+        try:
+            http_json(f"http://127.0.0.1:{port}/__bench/stats")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("等待模拟服务启动超时")
+
+def write_bench_config(workdir: str, args):
+    """在临时目录中写入压测用的 config.json"""
+    accounts = []
+    for i in range(args.accounts):
+        uid = str(900000 + i)
+        accounts.append({
+            "name": f"压测账号{i + 1}",
+            "enabled": True,
+            "config": {
+                "sessdata": f"bench-sessdata-{i}",
+                "bili_jct": f"bench-csrf-{i}",
+                "self_uid": uid,
+                "DedeUserID": uid,
+                "DedeUserID__ckMd5": "0" * 16,
+                "sid": "bench",
+                "device_id": f"BENCH-DEVICE-{i:04d}",
+                "keywords": dict(BENCH_KEYWORDS),
+                "at_user": False,
+                "auto_focus": False,
+                "auto_reply_follow": False,
+                "no_focus_hf": False,
+            }
+        })
+    config = {
+        "accounts": accounts,
+        "global_keywords": {},
+        "log_level": args.log_level,
+        "log_format": "text",
+        "poll_interval": args.poll_interval,
+    }
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+
+class ResourceMonitor:
+    """周期性采样当前进程的 CPU 和 RSS"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak_rss = 0
+        self.rss_samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._cpu_start = self.process.cpu_times()
+        self._wall_start = time.perf_counter()
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = self.process.memory_info().rss
+            self.rss_samples.append(rss)
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        cpu_end = self.process.cpu_times()
+        wall = time.perf_counter() - self._wall_start
+        cpu = (cpu_end.user - self._cpu_start.user) + (cpu_end.system - self._cpu_start.system)
+        rss = self.process.memory_info().rss
+        return {
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / wall * 100, 2) if wall else 0,
+            "rss_mb": round(rss / 1024 ** 2, 2),
+            "peak_rss_mb": round(max(self.peak_rss, rss) / 1024 ** 2, 2),
+        }
+
+def run_bench(args) -> dict:
+    port = args.port or free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = start_fake_server(args, port)
+    workdir = tempfile.mkdtemp(prefix="bpmb-bench-")
+    old_cwd = os.getcwd()
+    bots = []
+    try:
+        # 必须在导入 index 之前设置，api_hosts 在导入时读取
+        os.environ["BPMB_API_BASE"] = base
+        write_bench_config(workdir, args)
+        os.chdir(workdir)
+        sys.path.insert(0, ROOT_DIR)
+        import index
+
+        for account in index.config.get_accounts():
+            cfg = account["config"]
+            bot = index.SimpleBilibiliReply(
+                account_name=account["name"],
+                sessdata=cfg["sessdata"],
+                bili_jct=cfg["bili_jct"],
+                self_uid=cfg["self_uid"],
+                DedeUserID=cfg["DedeUserID"],
+                DedeUserID__ckMd5=cfg["DedeUserID__ckMd5"],
+                sid=cfg["sid"],
+                device_id=cfg["device_id"],
+                keywords=dict(cfg["keywords"]),
+                at_user=cfg["at_user"],
+                auto_focus=cfg["auto_focus"],
+                poll_interval=args.poll_interval,
+                auto_reply_follow=cfg["auto_reply_follow"],
+                no_focus_hf=cfg["no_focus_hf"],
+            )
+            bots.append(bot)
+
+        # 预热：账号在第一次轮询时才会在模拟服务中注册，之后再清空统计
+        threads = [threading.Thread(target=bot.run, daemon=True) for bot in bots]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.warmup)
+        http_json(f"{base}/__bench/reset", method="POST")
+
+        monitor = ResourceMonitor()
+        monitor.start()
+        time.sleep(args.duration)
+        resources = monitor.stop()
+        server_stats = http_json(f"{base}/__bench/stats")
+
+        for bot in bots:
+            bot.stop()
+        for thread in threads:
+            thread.join(timeout=args.poll_interval + 15)
+        # 设置了 BPMB_RECORD_CASSETTE 时顺便录制压测流量
+        index.cassette.close_all()
+    finally:
+        os.chdir(old_cwd)
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "params": {
+            "accounts": args.accounts,
+            "duration": args.duration,
+            "poll_interval": args.poll_interval,
+            "msg_rate": args.msg_rate,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+        },
+        "replies_per_second": server_stats["replies_per_second"],
+        "replied": server_stats["replied"],
+        "generated": server_stats["generated"],
+        "overwritten": server_stats["overwritten"],
+        "latency": server_stats["latency"],
+        "requests": server_stats["requests"],
+        "injected_errors": server_stats["injected_errors"],
+        "resources": resources,
+    }
+
+def format_seconds(value) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+def print_report(result: dict):
+    params = result["params"]
+    resources = result["resources"]
+    print("=" * 50)
+    print(f"账号数: {params['accounts']}  时长: {params['duration']}s  轮询间隔: {params['poll_interval']}s")
+    print(f"消息速率: {params['msg_rate']}/s/账号  接口延迟: {params['latency']}s±{params['jitter']}  错误率: {params['error_rate']}")
+    print("-" * 50)
+    print(f"产生消息: {result['generated']}  已回复: {result['replied']}  被覆盖: {result['overwritten']}")
+    print(f"回复速率: {result['replies_per_second']}/s")
+    print(f"回复延迟: p50={format_seconds(result['latency']['p50'])}  p90={format_seconds(result['latency']['p90'])}  "
+          f"p99={format_seconds(result['latency']['p99'])}  max={format_seconds(result['latency']['max'])}")
+    print(f"CPU: {resources['cpu_seconds']}s ({resources['cpu_percent']}%)  "
+          f"RSS: {resources['rss_mb']}MB (峰值 {resources['peak_rss_mb']}MB)")
+    print(f"接口请求: {sum(result['requests'].values())}  注入错误: {result['injected_errors']}")
+    print("=" * 50)
+
+def main():
+    parser = argparse.ArgumentParser(description="机器人吞吐量/延迟压测")
+    parser.add_argument("--accounts", type=int, default=2, help="同时运行的账号数")
+    parser.add_argument("--duration", type=float, default=30, help="统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒）")
+    parser.add_argument("--poll-interval", type=float, default=1, help="账号轮询间隔（秒）")
+    parser.add_argument("--msg-rate", type=float, default=1.0, help="每个账号每秒产生的新消息数")
+    parser.add_argument("--talkers", type=int, default=50, help="每个账号的模拟会话用户数")
+    parser.add_argument("--follow-ratio", type=float, default=1.0, help="已关注机器人账号的用户比例")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟接口的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="模拟接口延迟的随机抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟接口返回错误的概率")
+    parser.add_argument("--port", type=int, default=0, help="模拟服务端口，默认随机")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--log-level", default="WARNING", help="机器人日志级别")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    result = run_bench(args)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
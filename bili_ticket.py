@@ -2,6 +2,7 @@ import hmac
 import hashlib
 import requests
 import time
+import api_hosts
 
 def hmac_sha256(key, message):
     """
@@ -27,7 +28,7 @@ def hmac_sha256(key, message):
 
 def get():
     o = hmac_sha256("XgwSnGZ1p", f"ts{int(time.time())}")
-    api = "https://api.bilibili.com/bapis/bilibili.api.ticket.v1.Ticket/GenWebTicket"
+    api = f"{api_hosts.API}/bapis/bilibili.api.ticket.v1.Ticket/GenWebTicket"
     params = {
         "key_id": "ec02",
         "hexsign": o,
@@ -0,0 +1,69 @@
+import json
+import logging
+import sys
+import threading
+from typing import Any, Callable, Dict, Optional
+import bot_logger
+
+# 面板到机器人进程的控制通道
+#
+# 面板以 stdin=PIPE 启动机器人进程，每行写入一条 JSON 命令：
+#   {"type": "command", "id": "...", "command": "profile_start", "args": {"plugin": "..."}}
+# 机器人执行后通过 stdout（与日志、指标相同的 JSON 行管道）返回结果：
+#   {"type": "command_result", "data": {"id": "...", "ok": true, "result": ...}}
+# 只在 JSON 日志格式（由面板启动）下开启，直接在终端运行时不会读取 stdin。
+
+class CommandChannel:
+    """按命令名分发控制命令"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, command: str, handler: Callable[..., Any]):
+        """注册命令处理函数，以命令的 args 作为关键字参数调用，返回值需能序列化为 JSON"""
+        self._handlers[command] = handler
+
+    def handle_line(self, line: str) -> Optional[Dict[str, Any]]:
+        """执行一行命令，返回结果（不是命令的行返回 None）"""
+        line = line.strip()
+        if not line.startswith("{"):
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(message, dict) or message.get("type") != "command":
+            return None
+
+        result = {"id": message.get("id"), "ok": False}
+        handler = self._handlers.get(message.get("command"))
+        if handler is None:
+            result["error"] = f"未知命令: {message.get('command')}"
+            return result
+        try:
+            result["result"] = handler(**(message.get("args") or {}))
+            result["ok"] = True
+        except Exception as e:
+            logging.error(f"执行控制命令 {message.get('command')} 失败: {str(e)}")
+            result["error"] = str(e)
+        return result
+
+    def start(self, stream=None):
+        """在后台线程中读取命令（stream 默认为 stdin）"""
+        if self._thread is not None:
+            return
+        stream = stream or sys.stdin
+        if stream is None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(stream,), name="bot-control", daemon=True)
+        self._thread.start()
+
+    def _run(self, stream):
+        for line in iter(stream.readline, ""):
+            result = self.handle_line(line)
+            if result is not None:
+                bot_logger.emit_record("command_result", result)
+
+# 全局控制通道
+channel = CommandChannel()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+from colorama import Fore
+
+# 机器人进程的结构化日志模块
+#
+# - text 格式：带颜色的控制台输出，用于直接在终端运行 index.py
+# - json 格式：每行一个JSON对象，由管理面板通过管道读取并解析
+#
+# 格式和级别可由环境变量 BPMB_LOG_FORMAT / BPMB_LOG_LEVEL 或配置文件中的
+# log_format / log_level 指定，环境变量优先。
+
+LOGGER_NAME = "bot"
+
+# 记录中不属于上下文字段的标准属性
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_LEVEL_STYLES = {
+    logging.DEBUG: (Fore.MAGENTA, ""),
+    logging.INFO: (Fore.GREEN, "✓ "),
+    logging.WARNING: (Fore.YELLOW, "⚠ "),
+    logging.ERROR: (Fore.RED, "✗ "),
+    logging.CRITICAL: (Fore.RED, "✗ "),
+}
+
+_write_lock = threading.Lock()
+_current_format = "text"
+
+def _context_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """提取通过 extra 传入的上下文字段"""
+    return {
+        key: value for key, value in record.__dict__.items()
+        if key not in _RESERVED_ATTRS and not key.startswith("_")
+    }
+
+class JsonLineFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "type": "log",
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_context_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class ColorTextFormatter(logging.Formatter):
+    """控制台彩色文本格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        color, icon = _LEVEL_STYLES.get(record.levelno, ("", ""))
+        fields = _context_fields(record)
+        account = fields.pop("account", None)
+        prefix = f"[{account}] " if account else ""
+        text = f"{color}{icon}{prefix}{record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+class ContextAdapter(logging.LoggerAdapter):
+    """带有固定上下文字段（如账号名）的日志适配器，调用时的 extra 会与之合并"""
+
+    def process(self, msg, kwargs):
+        extra = dict(self.extra)
+        extra.update(kwargs.get("extra") or {})
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+    def bind(self, **fields) -> "ContextAdapter":
+        """派生一个附加了更多上下文字段的适配器"""
+        extra = dict(self.extra)
+        extra.update(fields)
+        return ContextAdapter(self.logger, extra)
+
+class _LockedStreamHandler(logging.StreamHandler):
+    """与 emit_record 共用写锁，保证管道中的每一行都是完整的"""
+
+    def emit(self, record):
+        with _write_lock:
+            super().emit(record)
+
+def setup(level: Optional[str] = None, fmt: Optional[str] = None, stream=None):
+    """初始化机器人日志"""
+    global _current_format
+
+    fmt = (os.environ.get("BPMB_LOG_FORMAT") or fmt or "text").lower()
+    level = (os.environ.get("BPMB_LOG_LEVEL") or level or "INFO").upper()
+    _current_format = fmt
+
+    handler = _LockedStreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonLineFormatter() if fmt == "json" else ColorTextFormatter())
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers[:] = [handler]
+    logger.setLevel(getattr(logging, level, logging.INFO))
+    logger.propagate = False
+
+    # 插件系统使用根日志记录器，统一输出到同一个管道
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    if root.level == logging.WARNING:
+        root.setLevel(logger.level)
+    return logger
+
+def get_logger(account: Optional[str] = None, **fields) -> ContextAdapter:
+    """获取日志适配器，account 会作为上下文字段附加在每条日志上"""
+    extra = dict(fields)
+    if account is not None:
+        extra["account"] = account
+    return ContextAdapter(logging.getLogger(LOGGER_NAME), extra)
+
+def is_json() -> bool:
+    """当前是否输出JSON行"""
+    return _current_format == "json"
+
+def emit_record(record_type: str, data: Dict[str, Any], stream=None):
+    """输出一行非日志的结构化记录（如指标快照），仅在 json 格式下输出"""
+    if not is_json():
+        return
+    line = json.dumps({"type": record_type, "ts": round(time.time(), 3), "data": data},
+                      ensure_ascii=False, default=str)
+    out = stream or sys.stdout
+    with _write_lock:
+        out.write(line + "\n")
+        out.flush()
@@ -0,0 +1,138 @@
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# 接口流量录制/回放
+#
+# 录制模式下，SimpleBilibiliReply 会把 get_sessions、关系检查和发送消息的原始响应
+# 写入 gzip 压缩的 JSONL 文件（cassette），每行一条记录：
+#   {"ts": 时间戳, "account": 账号名, "kind": 接口类型, "method": "GET",
+#    "url": 接口地址, "params": {...}, "data": {...}, "status": 200,
+#    "elapsed": 耗时秒数, "response": 响应JSON}
+# 请求头（含Cookie）不会被录制，参数和表单中的敏感字段会被替换为 ***。
+#
+# 回放见 bench/replay_bench.py。
+
+# 录制的接口类型
+KIND_SESSIONS = "get_sessions"
+KIND_RELATION = "relation"
+KIND_SEND = "send_msg"
+
+# 录制文件的最长刷新间隔（秒），进程被强制结束时最多丢失这段时间的记录
+FLUSH_INTERVAL = 5
+
+# 需要脱敏的参数名（不区分大小写）
+SCRUB_KEYS = {"csrf", "csrf_token", "sessdata", "bili_jct", "access_key", "cookie", "dedeuserid__ckmd5", "sid"}
+SCRUBBED = "***"
+
+def scrub(values: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """替换参数中的敏感字段"""
+    if not values:
+        return values
+    return {
+        key: SCRUBBED if str(key).lower() in SCRUB_KEYS else value
+        for key, value in values.items()
+    }
+
+class CassetteRecorder:
+    """线程安全的录制器，多个账号共用同一个文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # gzip 支持追加：每次打开都会写入一个新的成员，读取时自动拼接
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._last_flush = time.monotonic()
+        self.count = 0
+
+    def record(self, account: str, kind: str, method: str, url: str, response=None,
+               params: Optional[Dict] = None, data: Optional[Dict] = None, elapsed: float = 0.0):
+        """录制一次请求，response 为 requests 的响应对象"""
+        entry = {
+            "ts": round(time.time(), 3),
+            "account": account,
+            "kind": kind,
+            "method": method,
+            "url": url,
+            "params": scrub(params),
+            "data": scrub(data),
+            "status": getattr(response, "status_code", None),
+            "elapsed": round(elapsed, 4),
+            "response": None,
+        }
+        if response is not None:
+            try:
+                entry["response"] = response.json()
+            except ValueError:
+                entry["response"] = response.text
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.count += 1
+            if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_recorders: Dict[str, CassetteRecorder] = {}
+_recorders_lock = threading.Lock()
+
+def get_recorder(path: Optional[str]) -> Optional[CassetteRecorder]:
+    """获取指定路径的录制器，同一路径只打开一次；path 为空时返回 None"""
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    with _recorders_lock:
+        recorder = _recorders.get(path)
+        if recorder is None:
+            recorder = _recorders[path] = CassetteRecorder(path)
+        return recorder
+
+def recorder_path(config) -> Optional[str]:
+    """录制文件路径：环境变量 BPMB_RECORD_CASSETTE 优先，其次是配置项 record_cassette"""
+    return os.environ.get("BPMB_RECORD_CASSETTE") or config.get("record_cassette")
+
+def close_all():
+    """关闭所有录制器，确保gzip尾部写入"""
+    with _recorders_lock:
+        recorders = list(_recorders.values())
+        _recorders.clear()
+    for recorder in recorders:
+        recorder.close()
+
+def read_cassette(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取录制文件，忽略被截断的最后一行"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        except EOFError:
+            # 录制进程被强制结束时文件尾部可能不完整
+            return
+
+def load_cassette(path: str, account: Optional[str] = None) -> List[Dict[str, Any]]:
+    """读取录制文件中的全部记录，可按账号过滤"""
+    return [entry for entry in read_cassette(path) if account is None or entry.get("account") == account]
@@ -0,0 +1,207 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import metrics
+
+# 核心事件总线
+#
+# 机器人和 BotManager 在这里发布事件，插件加载后自动订阅。每个订阅者有自己的
+# 有界队列和投递线程，订阅者处理慢只会让自己的队列堆积，队列满时丢弃新事件并计数，
+# 发布方（轮询线程）永远不会被阻塞。
+
+# 事件类型
+BOT_START = "bot_start"                 # {"accounts": [账号名]}
+BOT_STOP = "bot_stop"                   # {"accounts": [账号名]}
+MESSAGE_RECEIVED = "message_received"   # {"account", "talker_id", "sender_uid", "content", "timestamp", "msg_id"}
+REPLY_SENT = "reply_sent"               # {"account", "receiver_id", "message"}
+SEND_FAILED = "send_failed"             # {"account", "receiver_id", "message"}
+NEW_FOLLOWER = "new_follower"           # {"account", "mid", "uname", "mtime"}
+CONFIG_RELOADED = "config_reloaded"     # {"path"}
+
+EVENT_TYPES = (BOT_START, BOT_STOP, MESSAGE_RECEIVED, REPLY_SENT, SEND_FAILED, NEW_FOLLOWER, CONFIG_RELOADED)
+
+# 订阅所有事件
+ALL_EVENTS = "*"
+
+# 每个订阅者队列的默认长度
+DEFAULT_QUEUE_SIZE = 1000
+
+EVENTS_PUBLISHED = metrics.registry.counter("bot_events_published_total", "发布的事件数", ["event"])
+EVENTS_DELIVERED = metrics.registry.counter("bot_events_delivered_total", "投递给订阅者的事件数", ["subscriber"])
+EVENTS_DROPPED = metrics.registry.counter("bot_events_dropped_total", "订阅者队列已满被丢弃的事件数", ["subscriber", "event"])
+EVENT_QUEUE_DEPTH = metrics.registry.gauge("bot_event_queue_depth", "订阅者队列中等待投递的事件数", ["subscriber"])
+EVENT_LAG = metrics.registry.histogram(
+    "bot_event_lag_seconds", "事件从发布到开始投递的延迟", ["subscriber"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+)
+
+class Event:
+    """一条事件"""
+
+    __slots__ = ("type", "data", "timestamp")
+
+    def __init__(self, event_type: str, data: Any = None):
+        self.type = event_type
+        self.data = data
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        return f"Event({self.type!r}, {self.data!r})"
+
+_STOP = object()
+
+class Subscription:
+    """一个订阅者：有界队列 + 投递线程"""
+
+    def __init__(self, bus: "EventBus", name: str, callback: Callable[[Event], Any],
+                 event_types: Iterable[str], queue_size: int):
+        self.bus = bus
+        self.name = name
+        self.callback = callback
+        self.event_types = frozenset(event_types)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.closed = False
+        # 队列深度是瞬时值，同名订阅（如热替换期间的新旧实例）各用自己的子指标，互不覆盖
+        self._depth = EVENT_QUEUE_DEPTH.replace(name)
+        self._lag = EVENT_LAG.labels(name)
+        self._delivered = EVENTS_DELIVERED.labels(name)
+        self._thread = threading.Thread(target=self._run, name=f"event-{name}", daemon=True)
+        self._thread.start()
+
+    def offer(self, event: Event) -> bool:
+        """放入队列，队列已满时丢弃并返回 False"""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            EVENTS_DROPPED.labels(self.name, event.type).inc()
+            return False
+        self._depth.set(self.queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            try:
+                if event is _STOP:
+                    break
+                lag = time.time() - event.timestamp
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                self._lag.observe(lag)
+                try:
+                    self.callback(event)
+                    self.delivered += 1
+                    self._delivered.inc()
+                except Exception as e:
+                    self.errors += 1
+                    logging.error(f"事件订阅者 {self.name} 处理 {event.type} 失败: {str(e)}")
+            finally:
+                self.queue.task_done()
+                self._depth.set(self.queue.qsize())
+
+    def wait_empty(self, timeout: float) -> bool:
+        """等待队列中的事件投递完毕"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 0):
+        """取消订阅，timeout > 0 时先等待已排队的事件投递完毕"""
+        if self.closed:
+            return
+        self.closed = True
+        self.bus._remove(self)
+        if timeout > 0:
+            self.wait_empty(timeout)
+        try:
+            self.queue.put_nowait(_STOP)
+        except queue.Full:
+            # 投递线程是守护线程，队列一直满时随进程退出
+            pass
+        # 同名的新订阅可能已经注册了自己的子指标，只移除本订阅注册的那个
+        EVENT_QUEUE_DEPTH.remove(self.name, child=self._depth)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": sorted(self.event_types),
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_lag_seconds": round(self.last_lag, 6),
+            "max_lag_seconds": round(self.max_lag, 6),
+        }
+
+class EventBus:
+    """发布/订阅事件总线"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+        # 事件类型 -> 订阅者元组，发布时只读，订阅变化时整体替换
+        self._routes: Dict[str, tuple] = {}
+
+    def subscribe(self, name: str, callback: Callable[[Event], Any], event_types: Iterable[str] = (ALL_EVENTS,),
+                  queue_size: int = DEFAULT_QUEUE_SIZE) -> Subscription:
+        """订阅事件，callback 在订阅者自己的线程中以 Event 为参数调用"""
+        if isinstance(event_types, str):
+            event_types = (event_types,)
+        subscription = Subscription(self, name, callback, event_types, queue_size)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            self._rebuild_routes()
+        return subscription
+
+    def _remove(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+                self._rebuild_routes()
+
+    def _rebuild_routes(self):
+        routes = {}
+        wildcard = [s for s in self._subscriptions if ALL_EVENTS in s.event_types]
+        for event_type in set(EVENT_TYPES).union(*(s.event_types for s in self._subscriptions)) - {ALL_EVENTS}:
+            routes[event_type] = tuple(s for s in self._subscriptions if event_type in s.event_types or s in wildcard)
+        routes[ALL_EVENTS] = tuple(wildcard)
+        self._routes = routes
+
+    def publish(self, event_type: str, data: Any = None) -> Optional[Event]:
+        """发布事件，不等待订阅者处理；没有订阅者时返回 None"""
+        EVENTS_PUBLISHED.labels(event_type).inc()
+        routes = self._routes
+        subscribers = routes.get(event_type, routes.get(ALL_EVENTS, ()))
+        if not subscribers:
+            return None
+        event = Event(event_type, data)
+        for subscription in subscribers:
+            subscription.offer(event)
+        return event
+
+    def flush(self, timeout: float = 5) -> bool:
+        """等待所有订阅者处理完已排队的事件"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return all(s.wait_empty(max(0.0, deadline - time.monotonic())) for s in subscriptions)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各订阅者的队列长度、投递、丢弃和延迟统计"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return {s.name: s.stats() for s in subscriptions}
+
+# 全局事件总线
+bus = EventBus()
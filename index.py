@@ -15,7 +15,16 @@ import threading
 import io
 import wbi
 import bili_ticket
-from plugin_loader import plugin_loader
+import api_hosts
+import bot_logger
+import metrics
+import cassette
+import async_runtime
+import event_bus
+import plugin_watcher
+import plugin_profiler
+import bot_control
+from plugin_loader import plugin_loader, RESULT_OK, RESULT_BUSY, RESULT_ERROR, RESULT_TIMEOUT
 
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
@@ -36,6 +45,45 @@ version = "1.1.2"
 # 初始化colorama
 colorama.init(autoreset=True)
 
+# 初始化日志（级别和格式可在 config.json 的 log_level / log_format 中配置）
+bot_logger.setup(config.get("log_level", "INFO"), config.get("log_format", "text"))
+logger = bot_logger.get_logger()
+
+# 运行指标
+POLLS = metrics.registry.counter("bot_polls_total", "会话列表轮询次数", ["account"])
+POLL_ERRORS = metrics.registry.counter("bot_poll_errors_total", "会话列表轮询失败次数", ["account"])
+LAST_POLL = metrics.registry.gauge("bot_last_successful_poll_timestamp_seconds", "最近一次成功轮询的时间戳", ["account"])
+MESSAGES_RECEIVED = metrics.registry.counter("bot_messages_received_total", "收到的新消息数", ["account"])
+REPLIES_SENT = metrics.registry.counter("bot_replies_sent_total", "成功发送的消息数", ["account"])
+SEND_FAILURES = metrics.registry.counter("bot_send_failures_total", "发送失败的消息数", ["account"])
+PLUGIN_HITS = metrics.registry.counter("bot_plugin_hits_total", "插件处理消息次数", ["account", "plugin"])
+RELATION_LATENCY = metrics.registry.histogram("bot_relation_check_seconds", "关系检查接口耗时", ["account"])
+BOT_RUNNING = metrics.registry.gauge("bot_running", "账号轮询线程是否在运行", ["account"])
+STAGE_LATENCY = metrics.registry.histogram("bot_stage_seconds", "消息处理各阶段耗时", ["account", "stage"])
+REPLY_LATENCY = metrics.registry.histogram(
+    "bot_reply_latency_seconds", "从收到消息到成功回复的端到端延迟", ["account"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 45, 60, 120, 300)
+)
+REPLY_SLO_BREACHES = metrics.registry.counter("bot_reply_slo_breaches_total", "超出回复延迟目标的次数", ["account"])
+SLOW_POLLS = metrics.registry.counter("bot_slow_polls_total", "超过慢轮询阈值的处理周期数", ["account"])
+
+class AccountMetrics:
+    """单个账号的指标子项，避免热路径上重复查找标签"""
+    
+    def __init__(self, account_name: str):
+        self.polls = POLLS.labels(account_name)
+        self.poll_errors = POLL_ERRORS.labels(account_name)
+        self.last_poll = LAST_POLL.labels(account_name)
+        self.messages_received = MESSAGES_RECEIVED.labels(account_name)
+        self.replies_sent = REPLIES_SENT.labels(account_name)
+        self.send_failures = SEND_FAILURES.labels(account_name)
+        self.relation_latency = RELATION_LATENCY.labels(account_name)
+        self.running = BOT_RUNNING.labels(account_name)
+        self.reply_latency = REPLY_LATENCY.labels(account_name)
+        self.slo_breaches = REPLY_SLO_BREACHES.labels(account_name)
+        self.slow_polls = SLOW_POLLS.labels(account_name)
+        self.stages = metrics.StageTimer(STAGE_LATENCY, account_name)
+
 def clean_screen():
     if os.name == "nt":
         os.system("cls")
@@ -46,13 +94,21 @@ class BotManager:
     def __init__(self):
         self.bots = []
         self.running = False
+        self.metrics_interval = config.get("metrics_interval", 5)
+        # config.json 修改检查间隔（秒），修改后重新加载并发布 config_reloaded 事件
+        self.config_watch_interval = config.get("config_watch_interval", 2)
+        # 插件文件变化后自动热重载该插件
+        self.plugin_watcher = None
+        # 按插件统计内存（tracemalloc，会拖慢所有内存分配，默认关闭）和统计间隔（秒）
+        self.plugin_memory_tracking = config.get("plugin_memory_tracking", False)
+        self.plugin_memory_interval = config.get("plugin_memory_interval", 60)
         try:
             from plugin_loader import plugin_loader
             self.plugin_loader = plugin_loader
             # 设置依赖 - 这里先传入 None，稍后在 start_all 中设置真实的 bots
             self.plugin_loader.set_dependencies(self, config)
         except ImportError as e:
-            print(f"{Fore.YELLOW}⚠ 插件系统不可用: {e}")
+            logger.warning("插件系统不可用: %s", e)
             self.plugin_loader = None
         
     def start_all(self):
@@ -61,7 +117,32 @@ class BotManager:
             return False
             
         self.running = True
-        plugin_loader.load_all_plugins()
+        
+        # 内存统计要在加载插件前开启，插件导入时的分配也要计入
+        if self.plugin_loader and self.plugin_memory_tracking:
+            plugin_profiler.accounting.enable_memory_tracking()
+        
+        # 先加载插件（只加载一次），机器人线程启动后的第一轮轮询就能使用插件
+        if self.plugin_loader:
+            logger.info("正在加载插件...")
+            try:
+                self.plugin_loader.set_dependencies(self, config)
+                success = self.plugin_loader.load_all_plugins()
+                if success:
+                    loaded_plugins = [p for p in self.plugin_loader.get_all_plugins() if p.instance]
+                    logger.info("已加载 %d 个插件", len(loaded_plugins))
+                    
+                    # 打印已加载的插件信息
+                    for plugin in loaded_plugins:
+                        logger.info("  - %s (v%s)", plugin.name, plugin.metadata.get('version', '1.0.0'))
+                    lazy_plugins = [p.name for p in self.plugin_loader.get_all_plugins() if p.lazy and not p.instance]
+                    if lazy_plugins:
+                        logger.info("%d 个插件将在首次触发时加载: %s", len(lazy_plugins), ", ".join(lazy_plugins))
+                else:
+                    logger.warning("插件加载过程中出现问题")
+            except Exception as e:
+                logger.error("插件加载失败: %s", e)
+        
         accounts = config.get_accounts()
         
         for i, account in enumerate(accounts):
@@ -83,49 +164,121 @@ class BotManager:
                     no_focus_hf=account.get("no_focus_hf", False),
                     poll_interval=5,
                 )
+                if self.plugin_loader:
+                    bot.set_plugin_loader(self.plugin_loader)
                 self.bots.append(bot)
                 
                 # 在新线程中启动机器人
                 thread = threading.Thread(target=bot.run, daemon=True)
                 thread.start()
                 
-        print(f"{Fore.GREEN}✓ 已启动 {len(self.bots)} 个机器人实例")
-
-        if self.plugin_loader:
-            for bot in self.bots:
-                bot.set_plugin_loader(self.plugin_loader)
-
-        if self.plugin_loader:
-            print(f"{Fore.BLUE}正在加载插件...")
+        logger.info("已启动 %d 个机器人实例", len(self.bots))
+        
+        # 通过日志管道定期向面板上报指标，并接收面板的控制命令
+        if bot_logger.is_json():
+            threading.Thread(target=self.report_metrics, daemon=True).start()
+            self.register_commands()
+            bot_control.channel.start()
+        if self.config_watch_interval > 0:
+            threading.Thread(target=self.watch_config, name="config-watch", daemon=True).start()
+        if self.plugin_loader and config.get("plugin_hot_reload", False):
+            self.plugin_watcher = plugin_watcher.PluginWatcher(
+                self.plugin_loader.plugins_dir,
+                self.plugin_loader.hot_swap,
+                debounce=float(config.get("plugin_reload_debounce", plugin_watcher.DEFAULT_DEBOUNCE))
+            )
+            self.plugin_watcher.start()
+        
+        event_bus.bus.publish(event_bus.BOT_START, {"accounts": [bot.account_name for bot in self.bots]})
+        return True
+    
+    def watch_config(self):
+        """config.json 被修改（如在面板中保存）后重新加载并发布 config_reloaded 事件"""
+        try:
+            last_mtime = os.path.getmtime(config.config_path)
+        except OSError:
+            last_mtime = None
+        while self.running:
+            time.sleep(self.config_watch_interval)
             try:
-                # 重新设置依赖，传入真实的 bots
-                self.plugin_loader.set_dependencies(self, config)
-                
-                # 加载所有插件
-                success = self.plugin_loader.load_all_plugins()
-                if success:
-                    loaded_plugins = [p for p in self.plugin_loader.get_all_plugins() if p.instance]
-                    print(f"{Fore.GREEN}✓ 已加载 {len(loaded_plugins)} 个插件")
-                    
-                    # 打印已加载的插件信息
-                    for plugin in loaded_plugins:
-                        print(f"{Fore.CYAN}  - {plugin.name} (v{plugin.metadata.get('version', '1.0.0')})")
-                else:
-                    print(f"{Fore.YELLOW}⚠ 插件加载过程中出现问题")
+                mtime = os.path.getmtime(config.config_path)
+            except OSError:
+                continue
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            try:
+                config.reload()
+                logger.info("配置文件已重新加载")
+                event_bus.bus.publish(event_bus.CONFIG_RELOADED, {"path": config.config_path})
             except Exception as e:
-                print(f"{Fore.RED}✗ 插件加载失败: {e}")
-        return True
+                logger.error("重新加载配置失败: %s", e)
+    
+    def report_metrics(self):
+        """定期输出指标快照"""
+        next_memory_sample = 0.0
+        last_load_report = None
+        while self.running:
+            if self.plugin_loader and plugin_profiler.accounting.memory_tracking and time.monotonic() >= next_memory_sample:
+                next_memory_sample = time.monotonic() + self.plugin_memory_interval
+                try:
+                    plugin_profiler.accounting.sample_memory(self.plugin_loader.plugin_paths())
+                except Exception as e:
+                    logger.error("统计插件内存失败: %s", e)
+            try:
+                bot_logger.emit_record("metrics", metrics.registry.snapshot())
+                # 插件加载报告只在变化时上报（启动、延迟加载的插件被触发、热重载）
+                if self.plugin_loader:
+                    load_report = {name: dict(entry) for name, entry in list(self.plugin_loader.load_report.items())}
+                    if load_report != last_load_report:
+                        bot_logger.emit_record("plugin_load_report", load_report)
+                        last_load_report = load_report
+            except Exception as e:
+                logger.error("上报指标失败: %s", e)
+            time.sleep(self.metrics_interval)
+    
+    def register_commands(self):
+        """注册面板可以调用的控制命令"""
+        bot_control.channel.register("profile_start", self.start_plugin_profile)
+        bot_control.channel.register("profile_stop", self.stop_plugin_profile)
+        bot_control.channel.register("profile_status", plugin_profiler.accounting.profiling)
+    
+    def start_plugin_profile(self, plugin: str) -> bool:
+        """开始对插件进行 cProfile 采集，已在采集时返回 False"""
+        if not self.plugin_loader or plugin not in self.plugin_loader.plugins:
+            raise ValueError(f"插件 {plugin} 未加载")
+        started = plugin_profiler.accounting.start_profile(plugin)
+        if started:
+            logger.info("开始采集插件 %s 的性能数据", plugin)
+        return started
+    
+    def stop_plugin_profile(self, plugin: str, sort: str = "cumulative", limit: int = plugin_profiler.DEFAULT_PROFILE_LIMIT):
+        """停止采集并返回 pstats 结果"""
+        result = plugin_profiler.accounting.stop_profile(plugin, sort, int(limit))
+        if result is None:
+            raise ValueError(f"插件 {plugin} 没有在采集性能数据")
+        logger.info("插件 %s 性能采集结束，共分析 %d 次调用", plugin, result["profiled_calls"])
+        return result
         
     def stop_all(self):
         """停止所有机器人"""
         self.running = False
+        if self.plugin_watcher:
+            self.plugin_watcher.stop()
+            self.plugin_watcher = None
+        event_bus.bus.publish(event_bus.BOT_STOP, {"accounts": [bot.account_name for bot in self.bots]})
         for bot in self.bots:
             bot.stop()
         self.bots.clear()
-        print(f"{Fore.GREEN}✓ 已停止所有机器人实例")
+        cassette.close_all()
+        logger.info("已停止所有机器人实例")
+        # 让插件处理完已排队的事件（包括 bot_stop）再卸载
+        event_bus.bus.flush(timeout=5)
         for plugin in plugin_loader.get_all_plugins():
             if plugin.instance:
                 plugin.unload()
+        # 插件卸载后关闭共享事件循环和异步连接池
+        async_runtime.runtime.shutdown()
 
 def get_bili_fingerprint():
     headers = {
@@ -134,7 +287,7 @@ def get_bili_fingerprint():
     }
 
     # 1. 获取 buvid3 和 buvid4
-    spi_url = "https://api.bilibili.com/x/frontend/finger/spi"
+    spi_url = f"{api_hosts.API}/x/frontend/finger/spi"
     resp = requests.get(spi_url, headers=headers, timeout=10)
     resp.raise_for_status()
     spi_data = resp.json()
@@ -145,7 +298,7 @@ def get_bili_fingerprint():
     buvid4 = spi_data["data"]["b_4"]
 
     # 2. 获取 b_nut（不带任何 Cookie，这样 b_nut 就是当前的 UNIX 时间戳）
-    home_url = "https://www.bilibili.com/"
+    home_url = f"{api_hosts.WWW}/"
     # 优先用 HEAD 请求，更轻量
     resp_home = requests.head(home_url, headers=headers, timeout=10)
     resp_home.raise_for_status()
@@ -169,6 +322,8 @@ def get_bili_fingerprint():
 class SimpleBilibiliReply:
     def __init__(self, account_name, sessdata, bili_jct, self_uid, DedeUserID, DedeUserID__ckMd5, sid, device_id, keywords, at_user, auto_focus, poll_interval=5, auto_reply_follow=False, follow_reply_message="感谢关注！", no_focus_hf = False):
         self.account_name = account_name
+        self.log = bot_logger.get_logger(account_name)
+        self.metrics = AccountMetrics(account_name)
         self.sessdata = sessdata
         self.bili_jct = bili_jct
         self.self_uid = self_uid
@@ -181,21 +336,7 @@ class SimpleBilibiliReply:
 
         self.plugin_loader = None
         
-        # 获取buvid
-        buvid_ = get_bili_fingerprint()
-        buvid3 = buvid_.get("buvid3")
-        buvid4 = buvid_.get("buvid4")
-        b_nut = buvid_.get("b_nut")
-        
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36",
-            "Accept": "*/*",
-            "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Origin": "https://message.bilibili.com",
-            "Referer": "https://message.bilibili.com/",
-            "Cookie": f"buvid3={buvid3}; b_nut={b_nut}; _uuid=271105662-5D1D-838F-C3AA-9FA89931AE2F71147infoc; buvid_fp=c85d7430ab74a8d9373709446c0f08f0; home_feed_column=4; browser_resolution=1280-2332; SESSDATA={sessdata}; bili_jct={bili_jct}; DedeUserID={DedeUserID}; DedeUserID__ckMd5={DedeUserID__ckMd5}; sid={sid}; theme-tip-show=SHOWED; theme-avatar-tip-show=SHOWED; bsource=search_bing; buvid4={buvid4}; bili_ticket={bili_ticket.get()}; b_lsid=E731DD32_19E6CCF5122"
-        }
+        self.headers = self._build_headers(sessdata, bili_jct, DedeUserID, DedeUserID__ckMd5, sid)
         
         # 设置自动回复关键词（账号特定 + 全局）
         self.keyword_reply = keywords
@@ -211,7 +352,44 @@ class SimpleBilibiliReply:
         self.processed_follow_ids = set()
         
         self.processed_msg_ids = set()
-        print(f"{Fore.GREEN}✓ {Fore.BLUE}[{self.account_name}] 哔哩哔哩私信自动回复机器人启动成功")
+        
+        # 回复延迟目标和慢轮询阈值（秒）
+        self.reply_slo = config.get("reply_slo_seconds", 30)
+        self.slow_poll_threshold = config.get("slow_poll_threshold", 10)
+        
+        # 接口流量录制（record_cassette 配置项或 BPMB_RECORD_CASSETTE 环境变量）
+        self.recorder = cassette.get_recorder(cassette.recorder_path(config))
+        if self.recorder:
+            self.log.info("接口流量录制已开启: %s", self.recorder.path)
+        self.log.info("哔哩哔哩私信自动回复机器人启动成功")
+    
+    def _build_headers(self, sessdata, bili_jct, DedeUserID, DedeUserID__ckMd5, sid) -> Dict[str, str]:
+        """构建请求头（需要访问接口获取 buvid 和 bili_ticket）"""
+        # 获取buvid
+        buvid_ = get_bili_fingerprint()
+        buvid3 = buvid_.get("buvid3")
+        buvid4 = buvid_.get("buvid4")
+        b_nut = buvid_.get("b_nut")
+        
+        return {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36",
+            "Accept": "*/*",
+            "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Origin": "https://message.bilibili.com",
+            "Referer": "https://message.bilibili.com/",
+            "Cookie": f"buvid3={buvid3}; b_nut={b_nut}; _uuid=271105662-5D1D-838F-C3AA-9FA89931AE2F71147infoc; buvid_fp=c85d7430ab74a8d9373709446c0f08f0; home_feed_column=4; browser_resolution=1280-2332; SESSDATA={sessdata}; bili_jct={bili_jct}; DedeUserID={DedeUserID}; DedeUserID__ckMd5={DedeUserID__ckMd5}; sid={sid}; theme-tip-show=SHOWED; theme-avatar-tip-show=SHOWED; bsource=search_bing; buvid4={buvid4}; bili_ticket={bili_ticket.get()}; b_lsid=E731DD32_19E6CCF5122"
+        }
+    
+    def _record(self, kind: str, method: str, url: str, response, params=None, data=None, started: float = 0.0):
+        """录制接口响应（未开启录制时不做任何事）"""
+        if not self.recorder:
+            return
+        try:
+            elapsed = time.perf_counter() - started if started else 0.0
+            self.recorder.record(self.account_name, kind, method, url, response, params=params, data=data, elapsed=elapsed)
+        except Exception as e:
+            self.log.debug("录制接口响应失败: %s", e)
     
     def stop(self):
         """停止机器人"""
@@ -223,7 +401,7 @@ class SimpleBilibiliReply:
 
     def get_sessions(self) -> List[Dict]:
         """获取会话列表"""
-        url = "https://api.vc.bilibili.com/session_svr/v1/session_svr/get_sessions"
+        url = f"{api_hosts.VC_API}/session_svr/v1/session_svr/get_sessions"
         params = {
             "session_type": 1,
             "group_fold": 1,
@@ -232,20 +410,26 @@ class SimpleBilibiliReply:
         }
         
         try:
+            started = time.perf_counter()
             response = requests.get(url, params=params, headers=self.headers, timeout=10)
+            self._record(cassette.KIND_SESSIONS, "GET", url, response, params=params, started=started)
             if response.status_code == 200:
                 data = response.json()
                 if data.get("code") == 0:
+                    self.metrics.last_poll.set_to_current_time()
                     return data.get("data", {}).get("session_list", [])
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] API错误: {data.get('message')}")
+                    self.log.error("API错误: %s", data.get('message'))
+            else:
+                self.log.error("获取会话列表HTTP错误: %s", response.status_code)
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 获取会话列表异常: {e}")
+            self.log.error("获取会话列表异常: %s", e)
         
+        self.metrics.poll_errors.inc()
         return []
     
     def get_focus(self) -> Optional[Dict]:
-        api = "https://api.bilibili.com/x/relation/fans"
+        api = f"{api_hosts.API}/x/relation/fans"
         params = {
             "vmid": self.self_uid,
             "pn": 1,
@@ -259,14 +443,14 @@ class SimpleBilibiliReply:
                 data = response.json()
                 if data.get("code") == 0:
                     followers = data.get("data", {}).get("list", [])
-                    print("用户已关注")
+                    self.log.debug("获取粉丝列表成功，共 %d 个", len(followers))
                     return followers
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 获取粉丝列表API错误: {data.get('message')}")
+                    self.log.error("获取粉丝列表API错误: %s", data.get('message'))
             else:
-                print(f"{Fore.RED}✗ [{self.account_name}] 获取粉丝列表HTTP错误: {response.status_code}")
+                self.log.error("获取粉丝列表HTTP错误: %s", response.status_code)
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 获取粉丝列表异常: {e}")
+            self.log.error("获取粉丝列表异常: %s", e)
         
         return None
     
@@ -288,12 +472,12 @@ class SimpleBilibiliReply:
                     recent_followers.append(follower)
             
             if recent_followers:
-                print(f"{Fore.GREEN}✓ [{self.account_name}] 发现 {len(recent_followers)} 个新关注用户")
+                self.log.info("发现 %d 个新关注用户", len(recent_followers))
             
             return recent_followers
             
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 获取最近关注用户异常: {e}")
+            self.log.error("获取最近关注用户异常: %s", e)
             return []
     
     def process_new_followers(self):
@@ -313,21 +497,27 @@ class SimpleBilibiliReply:
                 if not follower_uid or follower_uid in self.processed_follow_ids:
                     continue
                 
-                print(f"{Fore.GREEN}✓ [{self.account_name}] 发现新关注用户: {uname}({follower_uid})")
+                self.log.info("发现新关注用户: %s(%s)", uname, follower_uid)
+                event_bus.bus.publish(event_bus.NEW_FOLLOWER, {
+                    'account': self.account_name,
+                    'mid': follower_uid,
+                    'uname': uname,
+                    'mtime': follower.get("mtime", 0)
+                })
                 
                 # 发送关注回复消息
                 success = self.send_message(follower_uid, self.follow_reply_message)
                 if success:
-                    print(f"{Fore.GREEN}✓ [{self.account_name}] 已向新关注用户 {uname}({follower_uid}) 发送欢迎消息")
+                    self.log.info("已向新关注用户 %s(%s) 发送欢迎消息", uname, follower_uid)
                     self.processed_follow_ids.add(follower_uid)
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 向新关注用户 {uname}({follower_uid}) 发送消息失败")
+                    self.log.error("向新关注用户 %s(%s) 发送消息失败", uname, follower_uid)
                     
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 处理新关注用户异常: {e}")
+            self.log.error("处理新关注用户异常: %s", e)
 
     def Auto_focus(self, mid: int) -> Optional[Dict]:
-        url = "https://api.bilibili.com/x/relation/modify"
+        url = f"{api_hosts.API}/x/relation/modify"
         params = {
             "fid": mid,
             "act": 1,
@@ -343,12 +533,12 @@ class SimpleBilibiliReply:
                 else:
                     return False
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 关注失败: {e}")
+            self.log.error("关注失败: %s", e)
         
         return None
 
     def get_userName(self, mid: int) -> Optional[Dict]:
-        url = "https://api.bilibili.com/x/web-interface/card"
+        url = f"{api_hosts.API}/x/web-interface/card"
         params = {
             "mid": mid
         }
@@ -361,30 +551,33 @@ class SimpleBilibiliReply:
                 if data.get("code") == 0:
                     return data.get("data", {})
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 检索失败")
+                    self.log.error("检索失败")
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 获取失败: {e}")
+            self.log.error("获取失败: %s", e)
         
         return None
 
     def check_user_relation(self, target_uid: int) -> Optional[Dict]:
-        url = "https://api.bilibili.com/x/web-interface/relation"
+        url = f"{api_hosts.API}/x/web-interface/relation"
         params = {
             "mid": target_uid
         }
         
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
+            started = time.perf_counter()
+            with self.metrics.relation_latency.time():
+                response = requests.get(url, params=params, headers=self.headers, timeout=10)
+            self._record(cassette.KIND_RELATION, "GET", url, response, params=params, started=started)
             if response.status_code == 200:
                 data = response.json()
-                print(f"{Fore.GREEN}✓ [{self.account_name}] 关系检查API响应: {Fore.MAGENTA}{json.dumps(data, ensure_ascii=False)}")
+                self.log.debug("关系检查API响应: %s", data)
                 
                 if data.get("code") == 0:
                     return data.get("data", {})
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 关系检查API错误: {Fore.MAGENTA}{data.get('message')}")
+                    self.log.error("关系检查API错误: %s", data.get('message'))
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 检查用户关系异常: {Fore.MAGENTA}{e}")
+            self.log.error("检查用户关系异常: %s", e)
         
         return None
 
@@ -396,13 +589,13 @@ class SimpleBilibiliReply:
         relation = relation_data.get("be_relation", {})
         attribute = relation.get("attribute", 0)
         
-        print(f"{Fore.MAGENTA}[{self.account_name}] 用户 {target_uid} 对我的关注状态: attribute={attribute}")
+        self.log.debug("用户 %s 对我的关注状态: attribute=%s", target_uid, attribute)
         
         if attribute in [2, 6]:
-            print(f"{Fore.MAGENTA}[{self.account_name}] 用户 {target_uid} 已关注您")
+            self.log.info("用户 %s 已关注您", target_uid)
             return True
         else:
-            print(f"{Fore.RED}✗ [{self.account_name}] 用户 {target_uid} 未关注您")
+            self.log.warning("用户 %s 未关注您", target_uid)
             if self.no_focus_hf == True:
                 return True
             else:
@@ -447,10 +640,24 @@ class SimpleBilibiliReply:
         """发送消息"""
         # 检查是否是图片消息
         if message.startswith("[bili_image:"):
-            return self.send_image_message(receiver_id, message)
+            success = self.send_image_message(receiver_id, message)
+        else:
+            success = self.send_text_message(receiver_id, message)
         
-        # 文本消息
-        url = "https://api.vc.bilibili.com/web_im/v1/web_im/send_msg"
+        if success:
+            self.metrics.replies_sent.inc()
+        else:
+            self.metrics.send_failures.inc()
+        event_bus.bus.publish(event_bus.REPLY_SENT if success else event_bus.SEND_FAILED, {
+            'account': self.account_name,
+            'receiver_id': receiver_id,
+            'message': message
+        })
+        return success
+    
+    def send_text_message(self, receiver_id: int, message: str) -> bool:
+        """发送文本消息"""
+        url = f"{api_hosts.VC_API}/web_im/v1/web_im/send_msg"
         
         timestamp = int(time.time())
         
@@ -486,6 +693,7 @@ class SimpleBilibiliReply:
         }
         
         try:
+            started = time.perf_counter()
             response = requests.post(
                 url, 
                 params=params,
@@ -493,25 +701,26 @@ class SimpleBilibiliReply:
                 headers=self.headers, 
                 timeout=10
             )
+            self._record(cassette.KIND_SEND, "POST", url, response, params=params, data=form_data, started=started)
             
-            print(f"{Fore.GREEN}✓ [{self.account_name}] 发送消息响应状态: {Fore.MAGENTA}{response.status_code}")
+            self.log.debug("发送消息响应状态: %s", response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
-                print(f"{Fore.GREEN}✓ [{self.account_name}] 发送消息响应内容: {Fore.MAGENTA}{data}")
+                self.log.debug("发送消息响应内容: %s", data)
                 
                 if data.get("code") == 0:
-                    print(f"{Fore.GREEN}✓ [{self.account_name}] 成功发送消息给 {Fore.MAGENTA}{receiver_id}")
+                    self.log.info("成功发送消息给 %s", receiver_id)
                     return True
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 发送失败: {Fore.MAGENTA}{data.get('message')} (代码: {data.get('code')})")
+                    self.log.error("发送失败: %s (代码: %s)", data.get('message'), data.get('code'))
                     if data.get("code") in [-400, 1000]:
                         return True
             else:
-                print(f"{Fore.RED}✗ [{self.account_name}] HTTP错误: {Fore.MAGENTA}{response.status_code}{response.json().get('message')}")
+                self.log.error("HTTP错误: %s", response.status_code)
                 
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 发送消息异常: {Fore.MAGENTA}{e}")
+            self.log.error("发送消息异常: %s", e)
         
         return False
 
@@ -532,7 +741,7 @@ class SimpleBilibiliReply:
                     "size": 100
                 }
                 
-                url = "https://api.vc.bilibili.com/web_im/v1/web_im/send_msg"
+                url = f"{api_hosts.VC_API}/web_im/v1/web_im/send_msg"
                 timestamp = int(time.time())
                 
                 form_data = {
@@ -560,6 +769,7 @@ class SimpleBilibiliReply:
                     'wts': wbi.get().get("data").get("wts")
                 }
                 
+                started = time.perf_counter()
                 response = requests.post(
                     url, 
                     params=params,
@@ -567,23 +777,24 @@ class SimpleBilibiliReply:
                     headers=self.headers, 
                     timeout=10
                 )
+                self._record(cassette.KIND_SEND, "POST", url, response, params=params, data=form_data, started=started)
                 
-                print(f"{Fore.GREEN}✓ [{self.account_name}] 发送图片消息响应状态: {Fore.MAGENTA}{response.status_code}")
+                self.log.debug("发送图片消息响应状态: %s", response.status_code)
                 
                 if response.status_code == 200:
                     data = response.json()
-                    print(f"{Fore.GREEN}✓ [{self.account_name}] 发送图片消息响应内容: {Fore.MAGENTA}{data}")
+                    self.log.debug("发送图片消息响应内容: %s", data)
                     
                     if data.get("code") == 0:
-                        print(f"{Fore.GREEN}✓ [{self.account_name}] 成功发送图片给 {Fore.MAGENTA}{receiver_id}")
+                        self.log.info("成功发送图片给 %s", receiver_id)
                         return True
                     else:
-                        print(f"{Fore.RED}✗ [{self.account_name}] 发送图片失败: {Fore.MAGENTA}{data.get('message')} (代码: {data.get('code')})")
+                        self.log.error("发送图片失败: %s (代码: %s)", data.get('message'), data.get('code'))
                 else:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 发送图片HTTP错误: {Fore.MAGENTA}{response.status_code}")
+                    self.log.error("发送图片HTTP错误: %s", response.status_code)
                     
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 发送图片消息异常: {Fore.MAGENTA}{e}")
+            self.log.error("发送图片消息异常: %s", e)
         
         return False
 
@@ -592,11 +803,17 @@ class SimpleBilibiliReply:
 
     def process_messages(self):
         """处理消息"""
+        stages = self.metrics.stages
+        stages.reset()
         try:
-            sessions = self.get_sessions()
+            self.metrics.polls.inc()
+            with stages.stage("session_fetch"):
+                sessions = self.get_sessions()
             if not sessions:
                 return
             
+            # 先收集本轮所有新消息，插件可以一次处理整批消息
+            pending = []
             for session in sessions:
                 try:
                     talker_id = session.get("talker_id")
@@ -617,90 +834,180 @@ class SimpleBilibiliReply:
                     if current_time - timestamp > 300:
                         continue
                     
-                    message_text = self.extract_message_content(last_msg)
+                    with stages.stage("extract"):
+                        message_text = self.extract_message_content(last_msg)
                     if not message_text:
                         continue
                     
-                    print(f"{Fore.GREEN}✓ [{self.account_name}] 收到来自 {Fore.MAGENTA}{talker_id} {Fore.GREEN}的消息: {Fore.MAGENTA}{message_text}")
-
-                    plugin_reply = None
-                    if self.plugin_loader:
-                        plugin_reply = self.process_message_with_plugins(message_text, {
-                            'talker_id': talker_id,
-                            'sender_uid': sender_uid,
-                            'content': message_text,
-                            'timestamp': timestamp,
-                            'msg_id': msg_id
-                        })
+                    self.metrics.messages_received.inc()
+                    self.log.info("收到来自 %s 的消息: %s", talker_id, message_text, extra={"talker_id": talker_id, "msg_id": msg_id})
+                    message_data = {
+                        'talker_id': talker_id,
+                        'sender_uid': sender_uid,
+                        'content': message_text,
+                        'timestamp': timestamp,
+                        'msg_id': msg_id
+                    }
+                    event_bus.bus.publish(event_bus.MESSAGE_RECEIVED, dict(message_data, account=self.account_name))
+                    pending.append((message_data, receiver_id))
+                    
+                except Exception as e:
+                    self.log.error("处理会话异常: %s", e)
+                    continue
+            
+            if not pending:
+                return
+            
+            plugin_replies = [None] * len(pending)
+            if self.plugin_loader:
+                with stages.stage("plugin"):
+                    plugin_replies = self.process_messages_with_plugins([data for data, _ in pending])
+            
+            for (message_data, receiver_id), plugin_reply in zip(pending, plugin_replies):
+                try:
+                    talker_id = message_data['talker_id']
+                    msg_id = message_data['msg_id']
+                    timestamp = message_data['timestamp']
+                    message_text = message_data['content']
                     
                     if plugin_reply:
                         reply = plugin_reply
-                        print(f"{Fore.CYAN}  [{self.account_name}] 插件返回回复: {Fore.MAGENTA}{reply}")
+                        self.log.info("插件返回回复: %s", reply)
                     else:
                         # 否则使用原有的关键词匹配
-                        reply = self.check_keywords(message_text)
+                        with stages.stage("keyword"):
+                            reply = self.check_keywords(message_text)
 
                     if reply:
-                        if self.is_following_me(talker_id):
-                            success = self.send_message(talker_id, reply)
+                        with stages.stage("relation"):
+                            following = self.is_following_me(talker_id)
+                        
+                        if following:
+                            with stages.stage("send"):
+                                success = self.send_message(talker_id, reply)
+                            if success:
+                                self.record_reply_latency(timestamp)
                             
                             if self.auto_focus:
-                                focus = self.Auto_focus(receiver_id)
+                                with stages.stage("auto_follow"):
+                                    focus = self.Auto_focus(receiver_id)
                                 if focus == True:
-                                    print(f"{Fore.GREEN}✓ [{self.account_name}] 关注成功")
+                                    self.log.info("关注成功")
                                 else:
-                                    print(f"{Fore.RED}✗ [{self.account_name}] 关注失败，可能已关注对方")
+                                    self.log.warning("关注失败，可能已关注对方")
                             
                             if success:
                                 self.processed_msg_ids.add(msg_id)
-                                print(f"{Fore.GREEN}✓ [{self.account_name}] 已处理消息 {Fore.MAGENTA}{msg_id}")
+                                self.log.info("已处理消息 %s", msg_id)
                             else:
-                                print(f"{Fore.RED}✗ [{self.account_name}] 发送消息失败")
+                                self.log.error("发送消息失败")
                         else:
-                            print(f"{Fore.RED}✗ [{self.account_name}] 用户 {talker_id} 未关注您，不发送回复")
+                            self.log.warning("用户 %s 未关注您，不发送回复", talker_id)
                             self.processed_msg_ids.add(msg_id)
-                            self.send_message(talker_id, "你还没有点点关注哦~，白嫖可耻！")
+                            with stages.stage("send"):
+                                self.send_message(talker_id, "你还没有点点关注哦~，白嫖可耻！")
                             
                     
                 except Exception as e:
-                    print(f"{Fore.RED}✗ [{self.account_name}] 处理会话异常: {Fore.MAGENTA}{e}")
+                    self.log.error("处理会话异常: %s", e)
                     continue
                     
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 处理消息主循环异常: {Fore.MAGENTA}{e}")
+            self.log.error("处理消息主循环异常: %s", e)
+        finally:
+            self.check_slow_poll(stages)
+    
+    def record_reply_latency(self, timestamp: int):
+        """记录从消息发出到成功回复的端到端延迟"""
+        if not timestamp:
+            return
+        latency = max(time.time() - timestamp, 0)
+        self.metrics.reply_latency.observe(latency)
+        if latency > self.reply_slo:
+            self.metrics.slo_breaches.inc()
+            self.log.warning("回复延迟 %.1fs 超出目标 %ss", latency, self.reply_slo)
+    
+    def check_slow_poll(self, stages: metrics.StageTimer):
+        """处理周期超过阈值时输出各阶段耗时明细"""
+        elapsed = stages.elapsed()
+        if elapsed < self.slow_poll_threshold:
+            return
+        self.metrics.slow_polls.inc()
+        breakdown = stages.breakdown()
+        self.log.warning(
+            "慢轮询: 本轮耗时 %.2fs，各阶段耗时(ms): %s", elapsed,
+            ", ".join(f"{name}={ms}" for name, ms in breakdown.items()),
+            extra={"poll_seconds": round(elapsed, 3), "stages_ms": breakdown}
+        )
         
     def process_message_with_plugins(self, message: str, message_data: dict) -> Optional[str]:
-        """使用插件处理消息"""
+        """使用插件处理单条消息"""
+        return self.process_messages_with_plugins([message_data])[0]
+    
+    def process_messages_with_plugins(self, batch: List[dict]) -> List[Optional[str]]:
+        """使用插件处理本轮的一批消息，返回与 batch 对应的回复列表（None 表示交给关键词匹配）
+        
+        实现了 process_messages_batch 的插件每轮只调用一次，收到它的 triggers 命中的全部消息；
+        其余插件逐条调用。每条消息仍按插件加载顺序取第一个非空回复。
+        """
+        replies = [None] * len(batch)
         if not self.plugin_loader:
-            return None
+            return replies
             
         try:
-            # 获取所有已加载的插件
-            plugins = self.plugin_loader.get_all_plugins()
-            
-            for plugin in plugins:
-                if plugin.enabled and plugin.instance:
-                    # 检查插件是否有消息处理能力
-                    if hasattr(plugin.instance, 'process_message'):
-                        try:
-                            result = plugin.instance.process_message(message_data)
-                            if result:
-                                print(f"{Fore.CYAN}  [{self.account_name}] 插件 {plugin.name} 处理了消息")
-                                return result
-                        except Exception as e:
-                            print(f"{Fore.RED}✗ [{self.account_name}] 插件 {plugin.name} 处理消息失败: {e}")
+            # 分发表只包含已启用且能处理消息的插件，并按 triggers 预先过滤
+            targets = [self.plugin_loader.get_dispatch_targets(data.get('content', '')) for data in batch]
+            batch_results = self.run_batch_plugins(batch, targets)
             
-            return None
+            for i, message_data in enumerate(batch):
+                for plugin, handler in targets[i]:
+                    if plugin.name in batch_results:
+                        status, result = batch_results[plugin.name]
+                        result = result.get(i) if status == RESULT_OK else result
+                    else:
+                        # 插件在共享线程池中执行，超时或线程池繁忙时直接回退到关键词匹配
+                        status, result = self.plugin_loader.run_handler(plugin, handler, message_data)
+                    if status == RESULT_TIMEOUT:
+                        self.log.warning("插件 %s 处理超时，回退到关键词匹配", plugin.name)
+                        break
+                    if status == RESULT_BUSY:
+                        self.log.warning("插件线程池繁忙，回退到关键词匹配")
+                        break
+                    if status == RESULT_ERROR:
+                        self.log.error("插件 %s 处理消息失败: %s", plugin.name, result)
+                        continue
+                    if result:
+                        PLUGIN_HITS.labels(self.account_name, plugin.name).inc()
+                        self.log.info("插件 %s 处理了消息", plugin.name)
+                        replies[i] = result
+                        break
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 插件消息处理异常: {e}")
-            return None
+            self.log.error("插件消息处理异常: %s", e)
+        return replies
+    
+    def run_batch_plugins(self, batch: List[dict], targets: List[List[tuple]]) -> Dict[str, tuple]:
+        """每个批量插件调用一次，返回 {插件名: (结果类型, {消息下标: 回复} 或异常)}"""
+        selected = {}
+        for i, message_targets in enumerate(targets):
+            for plugin, _ in message_targets:
+                batch_handler = self.plugin_loader.get_batch_handler(plugin)
+                if batch_handler:
+                    selected.setdefault(plugin.name, (plugin, batch_handler, []))[2].append(i)
+        
+        results = {}
+        for name, (plugin, batch_handler, indexes) in selected.items():
+            status, result = self.plugin_loader.run_handler(plugin, batch_handler, [batch[i] for i in indexes])
+            if status == RESULT_OK:
+                result = self.plugin_loader.map_batch_replies(plugin, indexes, [batch[i] for i in indexes], result)
+            results[name] = (status, result)
+        return results
 
     def run(self):
         """运行监听"""
-        print(f"{Fore.GREEN}✓ [{self.account_name}] 按 Ctrl+C 可停止运行\n")
-        print(f"{Fore.GREEN}[{self.account_name}] 项目运行日志：")
+        self.log.info("按 Ctrl+C 可停止运行")
         
         self.running = True
+        self.metrics.running.set(1)
         last_follow_check = 0
         follow_check_interval = 10
         try:
@@ -713,49 +1020,50 @@ class SimpleBilibiliReply:
                 time.sleep(self.poll_interval)
                 
         except KeyboardInterrupt:
-            print(f"{Fore.GREEN}✓ [{self.account_name}] 用户手动停止程序")
+            self.log.info("用户手动停止程序")
         except Exception as e:
-            print(f"{Fore.RED}✗ [{self.account_name}] 程序运行异常: {Fore.MAGENTA}{e}")
+            self.log.error("程序运行异常: %s", e)
         finally:
             self.running = False
+            self.metrics.running.set(0)
 
 # 检查配置
 def inspect_config():
-    print(f"{Fore.BLUE}正在检查配置是否正确...")
+    logger.info("正在检查配置是否正确...")
     accounts = config.get_accounts()
     
     if not accounts:
-        print(f"{Fore.RED}✗ 未找到任何账号配置")
+        logger.error("未找到任何账号配置")
         return False
     
     enabled_accounts = [acc for acc in accounts if acc.get("enabled", True)]
     
     if not enabled_accounts:
-        print(f"{Fore.RED}✗ 没有启用的账号")
+        logger.error("没有启用的账号")
         return False
     
-    print(f"{Fore.GREEN}✓ 找到 {len(enabled_accounts)} 个启用的账号")
+    logger.info("找到 %d 个启用的账号", len(enabled_accounts))
     
     for i, account in enumerate(enabled_accounts):
         account_config = account["config"]
-        print(f"{Fore.BLUE}检查账号 {i+1}: {account.get('name', '未命名')}")
+        logger.info("检查账号 %d: %s", i+1, account.get('name', '未命名'))
         
         if not account_config.get("sessdata"):
-            print(f"{Fore.RED}✗ SESSDATA未配置")
+            logger.error("SESSDATA未配置")
             return False
         if not account_config.get("bili_jct"):
-            print(f"{Fore.RED}✗ BILI_JCT未配置")
+            logger.error("BILI_JCT未配置")
             return False
         if not account_config.get("self_uid"):
-            print(f"{Fore.RED}✗ SELF_UID未配置")
+            logger.error("SELF_UID未配置")
             return False
         if not account_config.get("device_id"):
-            print(f"{Fore.RED}✗ DEVICE_ID未配置")
+            logger.error("DEVICE_ID未配置")
             return False
         
-        print(f"{Fore.GREEN}✓ 账号配置正确")
+        logger.info("账号配置正确")
     
-    print(f"{Fore.GREEN}✓ 检查完成，开始运行\n")
+    logger.info("检查完成，开始运行")
     time.sleep(0.5)
     clean_screen()
     print(f"{Fore.GREEN}程序名称: {Fore.WHITE}哔哩哔哩私信机器人")
@@ -782,7 +1090,7 @@ if __name__ == "__main__":
                 time.sleep(1)
                 
         except KeyboardInterrupt:
-            print(f"{Fore.GREEN}✓ 用户手动停止程序")
+            logger.info("用户手动停止程序")
             bot_manager.stop_all()
     else:
-        print(f"{Fore.RED}✗ 配置错误")
\ No newline at end of file
+        logger.error("配置错误")
\ No newline at end of file
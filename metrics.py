@@ -0,0 +1,358 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 轻量级指标模块：计数器、仪表和固定分桶直方图
+#
+# 每个带标签的子指标有自己的锁，热路径上只在该锁内做一次加法，
+# 不同账号、不同指标之间不会互相竞争。
+
+# 默认的延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set_to_current_time(self):
+        self.value = time.time()
+
+class _HistogramChild:
+    __slots__ = ('_lock', 'bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> "_Timer":
+        """用作上下文管理器，记录代码块耗时"""
+        return _Timer(self.observe)
+
+class _Timer:
+    __slots__ = ('_observe', '_start', 'elapsed')
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+        self._start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        self._observe(self.elapsed)
+        return False
+
+class _Metric:
+    """带标签的指标族"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """获取指定标签值的子指标"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def replace(self, *values):
+        """用新的子指标替换指定标签值的子指标并返回，旧的子指标不再被导出"""
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        with self._lock:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values, child=None):
+        """移除指定标签值的子指标，指定 child 时只有当前子指标仍是它才移除"""
+        values = tuple(str(v) for v in values)
+        with self._lock:
+            if child is None or self._children.get(values) is child:
+                self._children.pop(values, None)
+
+    def _samples(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def collect(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'type': self.type_name,
+            'help': self.documentation,
+            'samples': self._samples()
+        }
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _label_dict(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        return [{'labels': self._label_dict(k), 'value': c.value} for k, c in self._items()]
+
+class Gauge(_Metric):
+    """可任意设置的仪表"""
+
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _samples(self):
+        return [{'labels': self._label_dict(k), 'value': c.value} for k, c in self._items()]
+
+class Histogram(_Metric):
+    """固定分桶直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self):
+        samples = []
+        for key, child in self._items():
+            with child._lock:
+                counts = list(child.counts)
+                total, count = child.sum, child.count
+            samples.append({
+                'labels': self._label_dict(key),
+                'buckets': [[bound, n] for bound, n in zip(list(self.bounds) + ['+Inf'], counts)],
+                'sum': total,
+                'count': count
+            })
+        return samples
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], List[Dict[str, Any]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str = '', labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str = '', labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str = '', labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], List[Dict[str, Any]]]):
+        """注册在快照时调用的收集函数，返回值格式与 _Metric.collect() 相同"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出所有指标的快照（可JSON序列化）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception:
+                pass
+        return {'timestamp': time.time(), 'metrics': families}
+
+class StageTimer:
+    """记录一个处理周期内各阶段的耗时
+
+    每个阶段的耗时写入直方图（最后一个标签为阶段名），同时在本周期内累计，
+    便于周期结束后输出阶段明细。
+    """
+
+    def __init__(self, histogram: Histogram, *labels: str):
+        self._histogram = histogram
+        self._labels = labels
+        self._children: Dict[str, _HistogramChild] = {}
+        self.start = time.perf_counter()
+        self.totals: Dict[str, float] = {}
+
+    def reset(self):
+        """开始新的周期"""
+        self.start = time.perf_counter()
+        self.totals = {}
+
+    def stage(self, name: str) -> _Timer:
+        """用作上下文管理器，记录一个阶段的耗时"""
+        child = self._children.get(name)
+        if child is None:
+            child = self._children[name] = self._histogram.labels(*self._labels, name)
+
+        def observe(elapsed, child=child):
+            child.observe(elapsed)
+            self.totals[name] = self.totals.get(name, 0.0) + elapsed
+
+        return _Timer(observe)
+
+    def elapsed(self) -> float:
+        """本周期已经过的时间"""
+        return time.perf_counter() - self.start
+
+    def breakdown(self) -> Dict[str, float]:
+        """本周期各阶段累计耗时（毫秒）"""
+        return {name: round(total * 1000, 1) for name, total in self.totals.items()}
+
+def _format_labels(labels: Dict[str, Any], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels.items())
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    escaped = []
+    for key, value in items:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value) -> str:
+    if value == '+Inf':
+        return '+Inf'
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def render_prometheus(snapshot: Dict[str, Any]) -> str:
+    """把快照渲染为 Prometheus 文本格式"""
+    lines = []
+    for family in snapshot.get('metrics', []):
+        name = family['name']
+        if family.get('help'):
+            lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for sample in family.get('samples', []):
+            labels = sample.get('labels', {})
+            if family['type'] == 'histogram':
+                for bound, count in _cumulative(sample['buckets']):
+                    le = _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(sample['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(sample['value'])}")
+    return '\n'.join(lines) + '\n'
+
+def histogram_quantile(quantile: float, sample: Dict[str, Any]) -> Optional[float]:
+    """根据直方图快照估算分位数（与 Prometheus histogram_quantile 相同的线性插值）"""
+    count = sample.get('count', 0)
+    if not count:
+        return None
+    rank = quantile * count
+    previous_bound, previous_count = 0.0, 0
+    for bound, cumulative in _cumulative(sample['buckets']):
+        if cumulative >= rank:
+            if bound == '+Inf':
+                return previous_bound
+            in_bucket = cumulative - previous_count
+            if in_bucket == 0:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / in_bucket
+        previous_bound, previous_count = bound, cumulative
+    return previous_bound
+
+def _cumulative(buckets):
+    total = 0
+    for bound, n in buckets:
+        total += n
+        yield bound, total
+
+# 全局指标注册表
+registry = MetricsRegistry()
@@ -33,7 +33,13 @@ class PluginCreator:
                 "license": "MIT",
                 "enabled": True,
                 "load_order": 0,
-                "dependencies": []
+                "dependencies": [],
+                "triggers": {
+                    "keywords": [],
+                    "regex": [],
+                    "prefixes": [],
+                    "all": True
+                }
             }
             
             with open(os.path.join(plugin_dir, "package.json"), 'w', encoding='utf-8') as f:
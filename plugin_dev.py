@@ -9,6 +9,25 @@ from datetime import datetime, timedelta
 import sqlite3
 import hashlib
 import os
+import asyncio
+import functools
+import heapq
+import itertools
+import pickle
+import sys
+from collections import OrderedDict
+import atexit
+import weakref
+from contextlib import contextmanager
+import async_runtime
+import metrics
+import task_scheduler
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 class PluginLogger:
     """插件专用日志记录器"""
@@ -80,122 +99,511 @@ class PluginConfig:
         return True
 
 class PluginDatabase:
-    """插件数据库管理器"""
+    """插件数据库管理器
+    
+    每个线程持有一个长连接（WAL 模式），不再每次调用都重新连接。
+    单条 execute 自动提交；批量写入用 executemany 或 transaction()；
+    不需要立即落盘的写入可以用 execute_later 交给后台线程合并提交。
+    """
+    
+    # 连接参数：WAL 允许读写并发，synchronous=NORMAL 在 WAL 下只在检查点时 fsync
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-8000",
+        "PRAGMA busy_timeout=5000",
+    )
+    # execute_later 的合并提交间隔（秒）和单次提交的最大语句数
+    FLUSH_INTERVAL = 0.5
+    FLUSH_BATCH_SIZE = 500
     
     def __init__(self, plugin_name: str):
         self.plugin_name = plugin_name
         self.db_file = f"plugins/{plugin_name}/{plugin_name}.db"
+        self._local = threading.local()
+        self._connections = []  # [(线程, 连接)]
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._flusher = None
+        self._closed = False
         self._ensure_db_file()
+        _open_stores.add(self)
     
     def _ensure_db_file(self):
         """确保数据库文件存在"""
         os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
     
-    def get_connection(self):
-        """获取数据库连接"""
-        return sqlite3.connect(self.db_file)
+    @staticmethod
+    def _is_open(conn) -> bool:
+        try:
+            conn.total_changes
+            return True
+        except sqlite3.ProgrammingError:
+            return False
     
-    def execute(self, sql: str, params: tuple = ()):
-        """执行SQL语句"""
+    def get_connection(self):
+        """获取当前线程的数据库连接（长连接，请勿关闭）"""
+        if self._closed:
+            raise RuntimeError(f"插件 {self.plugin_name} 的数据库已关闭")
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._is_open(conn):
+            return conn
+        
+        # isolation_level=None：不隐式开启事务，由 execute/transaction 显式控制
+        conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        self._local.conn = conn
+        self._local.depth = 0
+        with self._lock:
+            # 顺便关闭已退出线程留下的连接
+            alive = []
+            for thread, other in self._connections:
+                if thread.is_alive():
+                    alive.append((thread, other))
+                else:
+                    other.close()
+            alive.append((threading.current_thread(), conn))
+            self._connections = alive
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """事务上下文，正常退出时提交，异常时回滚；可以嵌套，只有最外层提交
+        
+            with self.database.transaction() as conn:
+                conn.execute("INSERT ...")
+                conn.execute("UPDATE ...")
+        """
         conn = self.get_connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        
+        # IMMEDIATE：开始时即获取写锁，避免多线程读后写升级锁时直接返回 SQLITE_BUSY
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
         try:
-            cursor = conn.cursor()
-            cursor.execute(sql, params)
-            conn.commit()
-            return cursor
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
         finally:
-            conn.close()
+            self._local.depth = 0
+    
+    def execute(self, sql: str, params: tuple = ()):
+        """执行SQL语句（不在事务中时立即提交），返回游标"""
+        return self.get_connection().execute(sql, params)
+    
+    def executemany(self, sql: str, seq_of_params) -> int:
+        """在一个事务中对多组参数执行同一条语句，返回影响的行数"""
+        with self.transaction() as conn:
+            return conn.executemany(sql, seq_of_params).rowcount
+    
+    def execute_later(self, sql: str, params: tuple = ()):
+        """写入延迟提交：语句进入队列，由后台线程每 FLUSH_INTERVAL 秒（或积累
+        FLUSH_BATCH_SIZE 条时）在一个事务中批量执行。适合日志、统计等允许
+        短暂延迟、不需要返回值的写入；读取前会先提交队列中的写入。
+        """
+        if self._closed:
+            raise RuntimeError(f"插件 {self.plugin_name} 的数据库已关闭")
+        with self._pending_cond:
+            self._pending.append((sql, params))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name=f"db-flush-{self.plugin_name}", daemon=True)
+                self._flusher.start()
+            if len(self._pending) >= self.FLUSH_BATCH_SIZE:
+                self._pending_cond.notify()
+    
+    def _flush_loop(self):
+        while not self._closed:
+            with self._pending_cond:
+                if len(self._pending) < self.FLUSH_BATCH_SIZE:
+                    self._pending_cond.wait(self.FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"插件 {self.plugin_name} 延迟写入失败: {str(e)}")
+    
+    def flush(self):
+        """立即提交 execute_later 队列中的写入"""
+        with self._write_lock:
+            with self._pending_cond:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                with self.transaction() as conn:
+                    # 连续的同一条语句合并为 executemany
+                    start = 0
+                    for end in range(1, len(pending) + 1):
+                        if end == len(pending) or pending[end][0] != pending[start][0]:
+                            conn.executemany(pending[start][0], [params for _, params in pending[start:end]])
+                            start = end
+            except BaseException:
+                # 事务已回滚，整批放回队首，保持与之后排队的写入的先后顺序
+                with self._pending_cond:
+                    self._pending[:0] = pending
+                raise
     
     def fetch_all(self, sql: str, params: tuple = ()):
         """获取所有结果"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute(sql, params)
-            return cursor.fetchall()
-        finally:
-            conn.close()
+        if self._pending:
+            self.flush()
+        return self.get_connection().execute(sql, params).fetchall()
     
     def fetch_one(self, sql: str, params: tuple = ()):
         """获取单个结果"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute(sql, params)
-            return cursor.fetchone()
-        finally:
-            conn.close()
+        if self._pending:
+            self.flush()
+        return self.get_connection().execute(sql, params).fetchone()
     
     def create_table(self, table_name: str, columns: Dict[str, str]):
         """创建表"""
         columns_sql = ', '.join([f'{name} {type}' for name, type in columns.items()])
         sql = f'CREATE TABLE IF NOT EXISTS {table_name} ({columns_sql})'
         self.execute(sql)
+    
+    def close(self):
+        """提交延迟写入并关闭所有线程的连接（插件卸载时自动调用）"""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"插件 {self.plugin_name} 延迟写入失败: {str(e)}")
+        self._closed = True
+        with self._pending_cond:
+            self._pending_cond.notify_all()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for _, conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _open_stores.discard(self)
+
+# 进程退出时提交所有数据库的延迟写入、保存所有缓存快照
+_open_stores = weakref.WeakSet()
+
+@atexit.register
+def _close_stores():
+    for store in list(_open_stores):
+        store.close()
+
+class _CacheEntry:
+    __slots__ = ("value", "expires", "size")
+
+    def __init__(self, value: Any, expires: float, size: int):
+        self.value = value
+        self.expires = expires
+        self.size = size
 
 class PluginCache:
-    """插件缓存管理器"""
+    """插件缓存管理器
     
-    def __init__(self, plugin_name: str):
+    数据保存在内存中，按最近使用顺序淘汰（LRU），超过条目数或字节数上限时淘汰最久未用的条目；
+    过期时间放在最小堆中，每次写入时顺带清理已过期的条目。读写都不访问磁盘，
+    由后台线程定期（以及插件卸载、进程退出时）把快照以 pickle 格式原子写入 cache.pickle。
+    """
+    
+    DEFAULT_MAX_ENTRIES = 10000
+    DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+    # 有修改时保存快照的间隔（秒）
+    SNAPSHOT_INTERVAL = 30
+    
+    def __init__(self, plugin_name: str, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
         self.plugin_name = plugin_name
-        self.cache_file = f"plugins/{plugin_name}/cache.json"
-        self._cache = {}
+        self.cache_file = f"plugins/{plugin_name}/cache.pickle"
+        # 旧版本的 JSON 缓存文件，没有快照时从中迁移
+        self.legacy_cache_file = f"plugins/{plugin_name}/cache.json"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[Any, _CacheEntry]" = OrderedDict()
+        self._expiry_heap = []  # [(过期时间, 序号, 键)]，条目更新或删除后旧记录在弹出时跳过
+        self._counter = itertools.count()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._closed = False
+        self._snapshot_thread = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
         self._load_cache()
+        _open_stores.add(self)
+    
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        try:
+            return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return sys.getsizeof(value)
     
     def _load_cache(self):
-        """加载缓存"""
+        """加载快照（或迁移旧版 cache.json）"""
+        items = {}
         try:
             if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self._cache = json.load(f)
-        except:
-            self._cache = {}
+                with open(self.cache_file, 'rb') as f:
+                    items = pickle.load(f)
+            elif os.path.exists(self.legacy_cache_file):
+                with open(self.legacy_cache_file, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                items = {k: (v.get('value'), v.get('expires', 0)) for k, v in legacy.items() if isinstance(v, dict)}
+                self._dirty = bool(items)
+        except Exception as e:
+            logging.error(f"插件 {self.plugin_name} 缓存加载失败: {str(e)}")
+            items = {}
+        
+        now = time.time()
+        for key, (value, expires) in items.items():
+            if not expires or expires > now:
+                self._store(key, value, expires or 0)
+        if self._dirty:
+            self._ensure_snapshot_thread()
+    
+    def _store(self, key: Any, value: Any, expires: float):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            logging.warning(f"插件 {self.plugin_name} 缓存项 {key} 大小 {size} 字节超过上限，未缓存")
+            self._remove(key)
+            return
+        self._remove(key)
+        self._cache[key] = _CacheEntry(value, expires, size)
+        self._bytes += size
+        if expires:
+            heapq.heappush(self._expiry_heap, (expires, next(self._counter), key))
+        while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+    
+    def _remove(self, key: Any) -> bool:
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        return True
     
-    def _save_cache(self):
-        """保存缓存"""
+    def purge_expired(self) -> int:
+        """清理已过期的条目，返回清理数量"""
+        now = time.time()
+        purged = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires, _, key = heapq.heappop(heap)
+                entry = self._cache.get(key)
+                # 条目已被覆盖或删除时堆中的记录已失效
+                if entry is not None and entry.expires == expires:
+                    self._remove(key)
+                    purged += 1
+            # 失效记录过多时重建堆
+            if len(heap) > 2 * len(self._cache) + 64:
+                self._expiry_heap = [(e.expires, next(self._counter), k) for k, e in self._cache.items() if e.expires]
+                heapq.heapify(self._expiry_heap)
+            if purged:
+                self.expirations += purged
+                self._dirty = True
+        return purged
+    
+    def _mark_dirty(self):
+        self._dirty = True
+        self._ensure_snapshot_thread()
+    
+    def _ensure_snapshot_thread(self):
+        if self._snapshot_thread is None and not self._closed:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name=f"cache-snapshot-{self.plugin_name}", daemon=True)
+            self._snapshot_thread.start()
+    
+    def _snapshot_loop(self):
+        while not self._closed:
+            time.sleep(self.SNAPSHOT_INTERVAL)
+            self.purge_expired()
+            if self._dirty and not self._closed:
+                self.save()
+    
+    def save(self) -> bool:
+        """立即保存快照（先写临时文件再替换，写入过程中崩溃不会损坏旧快照）"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            items = {}
+            for key, entry in self._cache.items():
+                items[key] = (entry.value, entry.expires)
+            self._dirty = False
+        try:
+            data = pickle.dumps(items, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # 有不能序列化的值时只保存能序列化的部分
+            picklable = {}
+            for key, item in items.items():
+                try:
+                    pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+                    picklable[key] = item
+                except Exception:
+                    pass
+            data = pickle.dumps(picklable, pickle.HIGHEST_PROTOCOL)
         try:
             os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self._cache, f, indent=2, ensure_ascii=False)
-        except:
-            pass
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, self.cache_file)
+            return True
+        except OSError as e:
+            self._dirty = True
+            logging.error(f"插件 {self.plugin_name} 缓存保存失败: {str(e)}")
+            return False
     
     def get(self, key: str, default=None):
         """获取缓存值"""
-        item = self._cache.get(key)
-        if item and 'expires' in item and item['expires'] < time.time():
-            del self._cache[key]
-            self._save_cache()
-            return default
-        return item.get('value', default) if item else default
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry.expires and entry.expires <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self._dirty = True
+                self.misses += 1
+                return default
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry.value
     
     def set(self, key: str, value: Any, ttl: int = 0):
-        """设置缓存值"""
-        item = {'value': value}
-        if ttl > 0:
-            item['expires'] = time.time() + ttl
-        self._cache[key] = item
-        self._save_cache()
+        """设置缓存值，ttl 为过期秒数（0 表示不过期）"""
+        expires = time.time() + ttl if ttl > 0 else 0
+        with self._lock:
+            if self._expiry_heap and self._expiry_heap[0][0] <= time.time():
+                self.purge_expired()
+            self._store(key, value, expires)
+        self._mark_dirty()
     
     def delete(self, key: str):
         """删除缓存项"""
-        if key in self._cache:
-            del self._cache[key]
-            self._save_cache()
+        with self._lock:
+            removed = self._remove(key)
+        if removed:
+            self._mark_dirty()
     
     def clear(self):
         """清空缓存"""
-        self._cache = {}
-        self._save_cache()
+        with self._lock:
+            self._cache.clear()
+            self._expiry_heap = []
+            self._bytes = 0
+        self._mark_dirty()
+    
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __len__(self) -> int:
+        return len(self._cache)
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+    
+    def close(self, save: bool = True):
+        """保存快照并停止后台线程（插件卸载时自动调用）
+        
+        save 为 False 时不写快照，用于热重载：快照已在交接前保存，之后由新实例负责。
+        """
+        if self._closed:
+            return
+        if save:
+            self.purge_expired()
+            self.save()
+        self._closed = True
+        _open_stores.discard(self)
+
+_MISSING = object()
+
+PLUGIN_HTTP_REQUESTS = metrics.registry.counter("bot_plugin_http_requests_total", "插件HTTP请求数", ["plugin", "method", "status"])
+PLUGIN_HTTP_LATENCY = metrics.registry.histogram("bot_plugin_http_seconds", "插件HTTP请求耗时（含重试）", ["plugin"])
+PLUGIN_HTTP_RETRIES = metrics.registry.counter("bot_plugin_http_retries_total", "插件HTTP请求重试次数", ["plugin"])
+PLUGIN_HTTP_CACHE = metrics.registry.counter("bot_plugin_http_cache_total", "插件HTTP缓存结果（hit/revalidated/miss）", ["plugin", "result"])
 
 class PluginHTTPClient:
-    """插件HTTP客户端"""
+    """插件HTTP客户端
+    
+    所有插件共用一个连接池，每个主机同时最多 PER_HOST_LIMIT 个请求。
+    timeout 是整个调用（含排队和重试）的截止时间；幂等请求（GET、HEAD 等）在
+    连接失败、超时或返回 429/5xx 时按指数退避重试。传入 cache=True 的 GET 请求
+    会按 Cache-Control / ETag / Last-Modified 缓存响应：
+    
+        resp = self.http.get(url, params={"id": 1}, cache=True)
+    """
+    
+    DEFAULT_TIMEOUT = 10
+    POOL_SIZE = 100
+    PER_HOST_LIMIT = 10
+    MAX_RETRIES = 2
+    BACKOFF = 0.3
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+    CACHE_SIZE = 256
+    
+    _session = None
+    _host_limits: Dict[str, threading.BoundedSemaphore] = {}
+    _lock = threading.Lock()
     
     def __init__(self, plugin_name: str):
         self.plugin_name = plugin_name
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': f'BilibiliBot-Plugin-{plugin_name}/1.0.0'
-        })
+        self.headers = {'User-Agent': f'BilibiliBot-Plugin-{plugin_name}/1.0.0'}
+        self._cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    @classmethod
+    def get_shared_session(cls) -> requests.Session:
+        """进程内共享的 requests 会话"""
+        with cls._lock:
+            if cls._session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=cls.POOL_SIZE, pool_maxsize=cls.POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._session = session
+            return cls._session
+    
+    @property
+    def session(self) -> requests.Session:
+        """共享会话（所有插件共用，请不要修改其 headers 或 cookies，改用 self.headers）"""
+        return self.get_shared_session()
+    
+    @classmethod
+    def _host_limit(cls, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        semaphore = cls._host_limits.get(host)
+        if semaphore is None:
+            with cls._lock:
+                semaphore = cls._host_limits.setdefault(host, threading.BoundedSemaphore(cls.PER_HOST_LIMIT))
+        return semaphore
     
     def get(self, url: str, **kwargs):
         """GET请求"""
@@ -205,58 +613,286 @@ class PluginHTTPClient:
         """POST请求"""
         return self._request('POST', url, **kwargs)
     
-    def _request(self, method: str, url: str, **kwargs):
+    def _request(self, method: str, url: str, timeout: Optional[float] = None, retries: Optional[int] = None,
+                 cache: bool = False, **kwargs):
         """发送请求"""
+        method = method.upper()
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
+        started = time.perf_counter()
+        deadline = time.monotonic() + (timeout or self.DEFAULT_TIMEOUT)
+        cache_key = None
+        cached = None
         try:
-            response = self.session.request(method, url, timeout=30, **kwargs)
+            if cache and method == 'GET':
+                cache_key = self._cache_key(url, kwargs.get('params'), headers)
+                cached = self._cache_lookup(cache_key)
+                if cached is not None and cached['expires'] > time.monotonic():
+                    PLUGIN_HTTP_CACHE.labels(self.plugin_name, 'hit').inc()
+                    return cached['response']
+                if cached is not None:
+                    if cached['etag']:
+                        headers['If-None-Match'] = cached['etag']
+                    if cached['last_modified']:
+                        headers['If-Modified-Since'] = cached['last_modified']
+            
+            response = self._send(method, url, headers, deadline, retries, kwargs)
+            
+            if cache_key is not None:
+                if response.status_code == 304 and cached is not None:
+                    PLUGIN_HTTP_CACHE.labels(self.plugin_name, 'revalidated').inc()
+                    self._cache_store(cache_key, cached['response'], response.headers)
+                    return cached['response']
+                PLUGIN_HTTP_CACHE.labels(self.plugin_name, 'miss').inc()
+                if response.status_code == 200:
+                    self._cache_store(cache_key, response, response.headers)
             response.raise_for_status()
             return response
         except requests.RequestException as e:
             logging.error(f"插件 {self.plugin_name} HTTP请求失败: {str(e)}")
             raise
+        finally:
+            PLUGIN_HTTP_LATENCY.labels(self.plugin_name).observe(time.perf_counter() - started)
+    
+    def _send(self, method: str, url: str, headers: Dict[str, str], deadline: float, retries: Optional[int], kwargs: Dict[str, Any]):
+        """在截止时间内发送请求，幂等请求失败时重试"""
+        max_retries = self.MAX_RETRIES if retries is None else retries
+        if method not in self.IDEMPOTENT_METHODS:
+            max_retries = 0
+        semaphore = self._host_limit(url)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not semaphore.acquire(timeout=remaining):
+                PLUGIN_HTTP_REQUESTS.labels(self.plugin_name, method, 'timeout').inc()
+                raise requests.Timeout(f"请求 {url} 超过截止时间")
+            try:
+                response = self.session.request(method, url, headers=headers,
+                                                timeout=max(0.001, deadline - time.monotonic()), **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                PLUGIN_HTTP_REQUESTS.labels(self.plugin_name, method, 'error').inc()
+                if attempt >= max_retries:
+                    raise
+                response = None
+            finally:
+                semaphore.release()
+            
+            if response is not None:
+                PLUGIN_HTTP_REQUESTS.labels(self.plugin_name, method, str(response.status_code)).inc()
+                if response.status_code not in self.RETRY_STATUSES or attempt >= max_retries:
+                    return response
+            
+            delay = self.BACKOFF * (2 ** attempt)
+            if response is not None:
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            if time.monotonic() + delay >= deadline:
+                # 来不及再试一次，返回最后的响应或抛出超时
+                if response is not None:
+                    return response
+                raise requests.Timeout(f"请求 {url} 超过截止时间")
+            time.sleep(delay)
+            attempt += 1
+            PLUGIN_HTTP_RETRIES.labels(self.plugin_name).inc()
+    
+    @staticmethod
+    def _cache_key(url: str, params: Any, headers: Dict[str, str]) -> tuple:
+        if isinstance(params, dict):
+            params = tuple(sorted((str(k), str(v)) for k, v in params.items()))
+        elif isinstance(params, (list, tuple)):
+            params = tuple((str(k), str(v)) for k, v in params)
+        else:
+            params = str(params) if params else None
+        return (url, params, headers.get('Authorization'), headers.get('Cookie'))
+    
+    def _cache_lookup(self, key: tuple) -> Optional[dict]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+    
+    def _cache_store(self, key: tuple, response, headers):
+        """按响应头缓存：no-store 不缓存，max-age 内直接返回，有 ETag/Last-Modified 时过期后条件请求"""
+        cache_control = {}
+        for item in (headers.get('Cache-Control') or '').lower().split(','):
+            name, _, value = item.strip().partition('=')
+            if name:
+                cache_control[name] = value.strip('"')
+        if 'no-store' in cache_control:
+            return
+        max_age = 0
+        if 'no-cache' not in cache_control:
+            age = cache_control.get('s-maxage') or cache_control.get('max-age') or ''
+            max_age = int(age) if age.isdigit() else 0
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if max_age <= 0 and not etag and not last_modified:
+            return
+        with self._cache_lock:
+            self._cache[key] = {
+                'response': response,
+                'expires': time.monotonic() + max_age,
+                'etag': etag,
+                'last_modified': last_modified,
+            }
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    def clear_cache(self):
+        """清空HTTP缓存"""
+        with self._cache_lock:
+            self._cache.clear()
+
+class AsyncHTTPResponse:
+    """异步HTTP请求的响应（响应体已完整读取）"""
+    
+    def __init__(self, status: int, headers: Dict[str, str], content: bytes, url: str, encoding: Optional[str] = None):
+        self.status = status
+        self.status_code = status
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.encoding = encoding or 'utf-8'
+    
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+    
+    def json(self):
+        return json.loads(self.content)
+    
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise requests.HTTPError(f"HTTP {self.status}: {self.url}")
+
+class PluginAsyncHTTPClient:
+    """插件异步HTTP客户端
+    
+    所有插件共用一个连接池，在共享事件循环中执行。安装了 aiohttp 时使用 aiohttp，
+    否则在事件循环的线程池中执行 requests 请求，接口相同：
+    
+        async def handle(self, message_data):
+            a, b = await asyncio.gather(self.ahttp.get(url_a), self.ahttp.get(url_b))
+            return a.json()["data"]
+    """
+    
+    DEFAULT_TIMEOUT = 10
+    POOL_SIZE = 100
+    
+    _session = None
+    
+    def __init__(self, plugin_name: str):
+        self.plugin_name = plugin_name
+        self.headers = {'User-Agent': f'BilibiliBot-Plugin-{plugin_name}/1.0.0'}
+    
+    @classmethod
+    async def _get_aiohttp_session(cls):
+        # 只在事件循环线程中调用，无需加锁
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(limit=cls.POOL_SIZE, ttl_dns_cache=300)
+            cls._session = aiohttp.ClientSession(connector=connector)
+            async_runtime.runtime.add_shutdown_callback(cls._close)
+        return cls._session
+    
+    @classmethod
+    def _get_requests_session(cls) -> requests.Session:
+        # 没有 aiohttp 时与同步客户端共用连接池
+        return PluginHTTPClient.get_shared_session()
+    
+    @classmethod
+    async def _close(cls):
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+    
+    async def get(self, url: str, **kwargs) -> AsyncHTTPResponse:
+        """GET请求"""
+        return await self.request('GET', url, **kwargs)
+    
+    async def post(self, url: str, **kwargs) -> AsyncHTTPResponse:
+        """POST请求"""
+        return await self.request('POST', url, **kwargs)
+    
+    async def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> AsyncHTTPResponse:
+        """发送请求，timeout 为整个请求（含读取响应体）的截止时间"""
+        timeout = timeout or self.DEFAULT_TIMEOUT
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            if aiohttp is not None:
+                response = await asyncio.wait_for(self._aiohttp_request(method, url, headers, kwargs), timeout)
+            else:
+                loop = asyncio.get_running_loop()
+                call = functools.partial(self._get_requests_session().request, method, url,
+                                         headers=headers, timeout=timeout, **kwargs)
+                resp = await asyncio.wait_for(loop.run_in_executor(None, call), timeout)
+                response = AsyncHTTPResponse(resp.status_code, dict(resp.headers), resp.content, resp.url, resp.encoding)
+            status = str(response.status)
+            response.raise_for_status()
+            return response
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                status = 'timeout'
+            logging.error(f"插件 {self.plugin_name} 异步HTTP请求失败: {url} - {type(e).__name__} {str(e)}")
+            raise
+        finally:
+            PLUGIN_HTTP_REQUESTS.labels(self.plugin_name, method.upper(), status).inc()
+            PLUGIN_HTTP_LATENCY.labels(self.plugin_name).observe(time.perf_counter() - started)
+    
+    async def _aiohttp_request(self, method: str, url: str, headers: Dict[str, str], kwargs: Dict[str, Any]) -> AsyncHTTPResponse:
+        session = await self._get_aiohttp_session()
+        async with session.request(method, url, headers=headers, **kwargs) as resp:
+            content = await resp.read()
+            return AsyncHTTPResponse(resp.status, dict(resp.headers), content, str(resp.url), resp.charset)
 
 class PluginScheduler:
-    """插件任务调度器"""
+    """插件任务调度器
+    
+    任务由全局的 task_scheduler 统一调度，不再为每个任务创建线程。
+    所有方法都返回 TaskHandle，可以用 handle.cancel() 取消；插件卸载时自动取消全部任务。
+    misfire 为错过执行时间（机器人繁忙、上一次还没执行完）时的处理方式：
+    "coalesce"（默认）合并为一次补执行，"skip" 超过 misfire_grace 秒则跳过本次。
+    """
     
     def __init__(self, plugin_name: str):
         self.plugin_name = plugin_name
-        self.timers = []
     
-    def schedule_interval(self, interval: int, func: Callable, *args, **kwargs):
-        """定时执行任务"""
-        def wrapper():
-            while True:
-                try:
-                    func(*args, **kwargs)
-                except Exception as e:
-                    logging.error(f"插件 {self.plugin_name} 定时任务执行失败: {str(e)}")
-                time.sleep(interval)
-        
-        thread = threading.Thread(target=wrapper, daemon=True)
-        thread.start()
-        self.timers.append(thread)
-        return thread
-    
-    def schedule_once(self, delay: int, func: Callable, *args, **kwargs):
-        """延迟执行任务"""
-        def wrapper():
-            time.sleep(delay)
-            try:
-                func(*args, **kwargs)
-            except Exception as e:
-                logging.error(f"插件 {self.plugin_name} 延迟任务执行失败: {str(e)}")
-        
-        thread = threading.Thread(target=wrapper, daemon=True)
-        thread.start()
-        self.timers.append(thread)
-        return thread
-    
-    def stop_all(self):
-        """停止所有任务"""
-        for timer in self.timers:
-            if timer.is_alive():
-                # 无法直接停止线程，但可以设置标志位
-                pass
+    @property
+    def timers(self) -> List[task_scheduler.TaskHandle]:
+        """当前有效的任务"""
+        return task_scheduler.scheduler.tasks(self.plugin_name)
+    
+    def _schedule(self, func: Callable, args: tuple, kwargs: dict, next_run: float, **options) -> task_scheduler.TaskHandle:
+        handle = task_scheduler.TaskHandle(task_scheduler.scheduler, self.plugin_name, func, args, kwargs, next_run, **options)
+        return task_scheduler.scheduler.schedule(handle)
+    
+    def schedule_interval(self, interval: float, func: Callable, *args, misfire: str = task_scheduler.MISFIRE_COALESCE,
+                          misfire_grace: float = task_scheduler.DEFAULT_MISFIRE_GRACE, **kwargs) -> task_scheduler.TaskHandle:
+        """定时执行任务：立即执行一次，之后每 interval 秒执行一次（func 可以是 async def）"""
+        return self._schedule(func, args, kwargs, time.time(), interval=interval,
+                              misfire=misfire, misfire_grace=misfire_grace)
+    
+    def schedule_once(self, delay: float, func: Callable, *args, misfire: str = task_scheduler.MISFIRE_COALESCE,
+                      misfire_grace: float = task_scheduler.DEFAULT_MISFIRE_GRACE, **kwargs) -> task_scheduler.TaskHandle:
+        """延迟 delay 秒执行一次任务"""
+        return self._schedule(func, args, kwargs, time.time() + delay,
+                              misfire=misfire, misfire_grace=misfire_grace)
+    
+    def schedule_cron(self, expression: str, func: Callable, *args, misfire: str = task_scheduler.MISFIRE_COALESCE,
+                      misfire_grace: float = task_scheduler.DEFAULT_MISFIRE_GRACE, **kwargs) -> task_scheduler.TaskHandle:
+        """按 cron 表达式（分 时 日 月 周）执行任务，例如 "0 8 * * 1-5" 为工作日每天8点"""
+        cron = task_scheduler.CronExpression(expression)
+        return self._schedule(func, args, kwargs, cron.next_after(time.time()), cron=cron,
+                              misfire=misfire, misfire_grace=misfire_grace)
+    
+    def stop_all(self) -> int:
+        """取消所有任务，返回取消的数量"""
+        return task_scheduler.scheduler.cancel_owner(self.plugin_name)
 
 class PluginUtils:
     """插件工具类"""
@@ -310,8 +946,14 @@ class PluginBase(ABC):
         self.logger = PluginLogger(self.name)
         self.config = PluginConfig(self.name, config_manager)
         self.database = PluginDatabase(self.name)
-        self.cache = PluginCache(self.name)
+        cache_config = self.plugin_config.get('cache') or {}
+        self.cache = PluginCache(
+            self.name,
+            max_entries=cache_config.get('max_entries', PluginCache.DEFAULT_MAX_ENTRIES),
+            max_bytes=cache_config.get('max_bytes', PluginCache.DEFAULT_MAX_BYTES)
+        )
         self.http = PluginHTTPClient(self.name)
+        self.ahttp = PluginAsyncHTTPClient(self.name)
         self.scheduler = PluginScheduler(self.name)
         self.utils = PluginUtils()
         
@@ -322,6 +964,9 @@ class PluginBase(ABC):
         self.api_routes = {}
         self.metrics = {}
         
+        # 异步处理函数的截止时间（秒）
+        self.async_timeout = self.plugin_config.get('timeout', async_runtime.DEFAULT_TIMEOUT)
+        
         self.logger.info(f"插件工具类初始化完成")
     
     @abstractmethod
@@ -334,14 +979,18 @@ class PluginBase(ABC):
         """插件卸载时调用"""
         pass
     
+    def run_async(self, value: Any, timeout: Optional[float] = None) -> Any:
+        """在共享事件循环中运行协程并等待结果；传入普通值时原样返回"""
+        return async_runtime.runtime.resolve(value, self.async_timeout if timeout is None else timeout)
+    
     # 消息处理相关方法
     def register_message_handler(self, handler: Callable):
-        """注册消息处理器"""
+        """注册消息处理器（可以是 async def）"""
         self.message_handlers.append(handler)
         self.logger.info(f"注册消息处理器: {handler.__name__}")
     
     def register_command(self, command: str, handler: Callable, description: str = ""):
-        """注册命令处理器"""
+        """注册命令处理器（可以是 async def）"""
         self.command_handlers[command] = {
             'handler': handler,
             'description': description
@@ -360,7 +1009,7 @@ class PluginBase(ABC):
             
             if command in self.command_handlers:
                 try:
-                    return self.command_handlers[command]['handler'](message_data, args)
+                    return self.run_async(self.command_handlers[command]['handler'](message_data, args))
                 except Exception as e:
                     self.logger.error(f"命令处理失败: {command} - {str(e)}")
                     return f"命令执行失败: {str(e)}"
@@ -368,7 +1017,7 @@ class PluginBase(ABC):
         # 检查消息处理器
         for handler in self.message_handlers:
             try:
-                result = handler(message_data)
+                result = self.run_async(handler(message_data))
                 if result:
                     return result
             except Exception as e:
@@ -376,9 +1025,18 @@ class PluginBase(ABC):
         
         return None
     
+    def process_messages_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """批量处理一个轮询周期内的全部新消息，返回与 messages 一一对应的回复列表
+        
+        默认逐条调用 process_message。记录、统计、存储类插件可以重写此方法（可以是 async def），
+        在一次数据库事务或一次 HTTP 请求中处理整批消息；重写后机器人每轮只调用一次，
+        不再调用 process_message。也可以返回 {msg_id: 回复} 字典，没有回复的消息返回 None。
+        """
+        return [self.process_message(message_data) for message_data in messages]
+    
     # 事件处理相关方法
     def register_event_handler(self, event_type: str, handler: Callable):
-        """注册事件处理器"""
+        """注册事件处理器（可以是 async def）"""
         if event_type not in self.event_handlers:
             self.event_handlers[event_type] = []
         self.event_handlers[event_type].append(handler)
@@ -389,7 +1047,7 @@ class PluginBase(ABC):
         if event_type in self.event_handlers:
             for handler in self.event_handlers[event_type]:
                 try:
-                    handler(data)
+                    self.run_async(handler(data))
                 except Exception as e:
                     self.logger.error(f"事件处理失败: {event_type} - {handler.__name__} - {str(e)}")
     
@@ -1,12 +1,419 @@
 import os
+import re
 import json
+import importlib.abc
+import importlib.machinery
 import importlib.util
+import copy
 import sys
 import logging
 from typing import Dict, List, Any, Optional
 import requests
 import threading
+import time
+import tracemalloc
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
+import metrics
+import async_runtime
+import event_bus
+import plugin_dev
+import plugin_profiler
+import task_scheduler
+
+# 插件消息处理的默认限制，可在 config.json 中覆盖
+DEFAULT_PLUGIN_TIMEOUT = 5      # plugin_timeout: 单次 process_message 的最长等待秒数（package.json 的 timeout 优先）
+DEFAULT_PLUGIN_WORKERS = 8      # plugin_workers: 共享线程池大小
+DEFAULT_DEMOTE_AFTER = 3        # plugin_demote_after: 连续超时多少次后降级
+DEFAULT_DEMOTE_SECONDS = 300    # plugin_demote_seconds: 降级时长，到期后重新参与分发
+DEFAULT_LAZY_LOAD = False       # plugin_lazy_load: 声明了 triggers 或 events 的插件默认延迟加载（package.json 的 lazy 优先）
+DEFAULT_LOAD_REPORT = True      # plugin_load_report: 启动时用 tracemalloc 统计每个插件加载占用的内存
+DEFAULT_LOAD_WORKERS = 4        # plugin_load_workers: 启动时并行加载同一批（互不依赖的）插件的线程数
+DEFAULT_DRAIN_TIMEOUT = 30      # plugin_drain_timeout: 热重载时等待旧实例处理完进行中调用的最长秒数
+
+# 插件执行结果
+RESULT_OK = "ok"
+RESULT_ERROR = "error"
+RESULT_TIMEOUT = "timeout"
+RESULT_BUSY = "busy"            # 线程池已满或任务在截止时间前未能开始执行
+
+# 插件加载状态（加载报告）
+LOAD_LOADED = "loaded"
+LOAD_LAZY = "lazy"              # 等待首个匹配的消息或事件
+LOAD_DISABLED = "disabled"
+LOAD_FAILED = "failed"
+
+PLUGIN_CALLS = metrics.registry.counter("bot_plugin_calls_total", "插件消息处理调用次数", ["plugin", "result"])
+PLUGIN_LATENCY = metrics.registry.histogram("bot_plugin_seconds", "插件消息处理耗时（含超时后仍在运行的部分）", ["plugin"])
+PLUGIN_DEMOTIONS = metrics.registry.counter("bot_plugin_demotions_total", "插件因连续超时被降级的次数", ["plugin"])
+PLUGIN_LOAD_SECONDS = metrics.registry.gauge("bot_plugin_load_seconds", "插件导入、实例化和 on_load 的耗时", ["plugin"])
+PLUGIN_RELOADS = metrics.registry.counter("bot_plugin_hot_reloads_total", "插件文件变化后的热重载次数（ok/failed）", ["plugin", "result"])
+PLUGIN_LOAD_MEMORY = metrics.registry.gauge("bot_plugin_load_memory_bytes", "插件加载后新增的 Python 内存（tracemalloc 统计）", ["plugin"])
+
+class PluginWorkerPool:
+    """执行插件消息处理的共享线程池
+
+    使用守护线程和有界队列：超时的插件调用会继续占用一个线程直到返回，
+    但不会阻止进程退出，队列满时直接拒绝新任务而不是无限堆积。
+    """
+
+    def __init__(self, workers: int = DEFAULT_PLUGIN_WORKERS, queue_size: Optional[int] = None):
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=queue_size or self.workers * 4)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_threads(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"plugin-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, *args) -> Future:
+        """提交任务，队列已满时抛出 queue.Full"""
+        self._ensure_threads()
+        future = Future()
+        self._queue.put_nowait((future, fn, args))
+        return future
+
+    def _worker(self):
+        while True:
+            future, fn, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+class PluginTriggers:
+    """package.json 中声明的消息触发条件
+
+    "triggers": {
+        "keywords": ["天气", "weather"],   # 消息包含任一关键词（不区分大小写）
+        "regex": ["^查询\\d+$"],            # 任一正则 search 命中
+        "prefixes": ["!", "/"],            # 消息以任一前缀开头
+        "all": false                       # 接收所有消息
+    }
+    未声明 triggers（或 "triggers": "all"）的插件接收所有消息，与旧版本行为一致。
+    """
+
+    def __init__(self, declaration: Any = None):
+        if declaration is None or declaration == "all":
+            declaration = {"all": True}
+        if not isinstance(declaration, dict):
+            declaration = {}
+        self.keywords = [str(k).lower() for k in declaration.get("keywords", []) if str(k)]
+        self.prefixes = [str(p) for p in declaration.get("prefixes", []) if str(p)]
+        self.regex = None
+        patterns = [str(r) for r in declaration.get("regex", []) if str(r)]
+        if patterns:
+            self.regex = re.compile("|".join(f"(?:{r})" for r in patterns))
+        self.all = bool(declaration.get("all", False)) or not (self.keywords or self.prefixes or self.regex)
+    
+    @classmethod
+    def none(cls) -> "PluginTriggers":
+        """不匹配任何消息（只声明了 events 的延迟加载插件在加载前使用）"""
+        triggers = cls({})
+        triggers.all = False
+        return triggers
+
+def _get_batch_handler(instance):
+    """插件自己实现的 process_messages_batch；未实现或沿用 PluginBase 默认实现（逐条处理）时返回 None"""
+    handler = getattr(instance, 'process_messages_batch', None)
+    if not callable(handler):
+        return None
+    if getattr(handler, '__func__', None) is getattr(plugin_dev.PluginBase, 'process_messages_batch', None):
+        return None
+    return handler
+
+class DispatchTable:
+    """按加载顺序排列的插件消息分发表
+
+    所有插件的关键词合并为一个按长度降序排列的正则（零宽前瞻，在每个位置取最长关键词），
+    每个关键词预先合并了以其前缀为关键词的插件，一次扫描即可得到全部候选插件。
+    表在插件加载、卸载、启停时整体重建，分发时只读，无需加锁。
+    尚未加载的延迟加载插件按 package.json 的 triggers 参与匹配，处理方法为 None。
+    """
+
+    def __init__(self, plugins: List["Plugin"]):
+        # (插件, 消息处理方法)
+        self.entries = []
+        # 等待首次触发的延迟加载插件数
+        self.lazy_count = 0
+        # 插件名 -> 批量处理方法（只包含自己实现了 process_messages_batch 的插件）
+        self.batch_handlers = {}
+        self.always = set()
+        self.regex_entries = []
+        keyword_targets: Dict[str, set] = {}
+        prefix_targets: Dict[str, set] = {}
+
+        now = time.monotonic()
+        for plugin in plugins:
+            if not plugin.enabled or plugin.demoted_until > now:
+                continue
+            if plugin.instance:
+                handler = getattr(plugin.instance, 'process_message', None)
+                if not callable(handler):
+                    continue
+            elif plugin.lazy:
+                # 首次命中时由 PluginLoader 加载插件
+                handler = None
+                self.lazy_count += 1
+            else:
+                continue
+            index = len(self.entries)
+            self.entries.append((plugin, handler))
+            batch_handler = _get_batch_handler(plugin.instance) if plugin.instance else None
+            if batch_handler:
+                self.batch_handlers[plugin.name] = batch_handler
+            triggers = plugin.triggers
+            if triggers.all:
+                self.always.add(index)
+                continue
+            for keyword in triggers.keywords:
+                keyword_targets.setdefault(keyword, set()).add(index)
+            for prefix in triggers.prefixes:
+                prefix_targets.setdefault(prefix, set()).add(index)
+            if triggers.regex:
+                self.regex_entries.append((index, triggers.regex))
+
+        # 前缀闭包：命中 "abc" 时，关键词为 "a"、"ab" 的插件同样命中
+        self.keyword_targets = {}
+        for keyword in keyword_targets:
+            targets = set()
+            for end in range(1, len(keyword) + 1):
+                targets |= keyword_targets.get(keyword[:end], set())
+            self.keyword_targets[keyword] = frozenset(targets)
+
+        self.keyword_pattern = None
+        if keyword_targets:
+            alternatives = "|".join(re.escape(k) for k in sorted(keyword_targets, key=len, reverse=True))
+            self.keyword_pattern = re.compile(f"(?=({alternatives}))", re.DOTALL)
+
+        self.prefix_targets = prefix_targets
+        self.prefix_tuple = tuple(prefix_targets)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, message: str) -> List[tuple]:
+        """返回可能处理该消息的 (插件, 处理方法)，保持加载顺序"""
+        if len(self.always) == len(self.entries):
+            return self.entries
+
+        selected = set(self.always)
+        if message:
+            if self.keyword_pattern is not None:
+                lower_message = message.lower()
+                for found in self.keyword_pattern.finditer(lower_message):
+                    selected |= self.keyword_targets[found.group(1)]
+            if self.prefix_tuple and message.startswith(self.prefix_tuple):
+                for prefix, targets in self.prefix_targets.items():
+                    if message.startswith(prefix):
+                        selected |= targets
+            for index, pattern in self.regex_entries:
+                if index not in selected and pattern.search(message):
+                    selected.add(index)
+
+        if not selected:
+            return []
+        return [self.entries[i] for i in sorted(selected)]
+
+class ManifestIndex:
+    """插件 package.json 的缓存索引
+    
+    按文件的 mtime 和大小判断是否需要重新解析，插件加载器和面板共用，
+    列出插件、排序、加载时都不再重复读取 JSON。返回的元数据是副本，可以随意修改。
+    """
+    
+    def __init__(self, plugins_dir: str):
+        self.plugins_dir = plugins_dir
+        # 插件名 -> (mtime_ns, size, 元数据或 None, 解析错误)
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def _package_json(self, name: str) -> str:
+        return os.path.join(self.plugins_dir, name, "package.json")
+    
+    def _load(self, name: str) -> Optional[tuple]:
+        """读取（或从缓存返回）一个插件的清单，插件不存在时返回 None"""
+        path = self._package_json(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(name, None)
+            return None
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = (stat.st_mtime_ns, stat.st_size, json.load(f), None)
+        except (OSError, ValueError) as e:
+            entry = (stat.st_mtime_ns, stat.st_size, None, str(e))
+        with self._lock:
+            self._entries[name] = entry
+        return entry
+    
+    def names(self) -> List[str]:
+        """所有包含 package.json 和 main.py 的插件目录"""
+        if not os.path.isdir(self.plugins_dir):
+            return []
+        names = []
+        with os.scandir(self.plugins_dir) as entries:
+            for item in entries:
+                # .staging、.rollback 等以 . 开头的目录不是插件
+                if not item.is_dir() or item.name.startswith('.'):
+                    continue
+                if os.path.exists(os.path.join(item.path, "package.json")) and os.path.exists(os.path.join(item.path, "main.py")):
+                    names.append(item.name)
+        with self._lock:
+            for name in set(self._entries) - set(names):
+                del self._entries[name]
+        return names
+    
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """插件的元数据副本，不存在或 JSON 无效时返回 None"""
+        entry = self._load(name)
+        if entry is None or entry[2] is None:
+            return None
+        return copy.deepcopy(entry[2])
+    
+    def error(self, name: str) -> Optional[str]:
+        """package.json 的解析错误"""
+        entry = self._load(name)
+        return entry[3] if entry else None
+    
+    def scan(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        """{插件名: 元数据副本}，JSON 无效的插件值为 None"""
+        return {name: self.get(name) for name in self.names()}
+    
+    def write(self, name: str, metadata: Dict[str, Any]):
+        """保存 package.json 并更新缓存"""
+        path = self._package_json(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=4, ensure_ascii=False)
+        stat = os.stat(path)
+        with self._lock:
+            self._entries[name] = (stat.st_mtime_ns, stat.st_size, copy.deepcopy(metadata), None)
+    
+    def invalidate(self, name: Optional[str] = None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+def plugin_dependencies(metadata: Dict[str, Any]) -> List[str]:
+    """package.json 的 "dependencies"：依赖的插件名列表（也接受 {"name": ...} 形式）"""
+    dependencies = []
+    for item in metadata.get('dependencies') or []:
+        name = item.get('name') if isinstance(item, dict) else item
+        if isinstance(name, str) and name and name not in dependencies:
+            dependencies.append(name)
+    return dependencies
+
+def plan_load_waves(manifests: Dict[str, Optional[Dict[str, Any]]]) -> tuple:
+    """按依赖关系把插件分成若干批（Kahn 拓扑排序），同一批的插件互不依赖
+    
+    返回 (批次列表, {插件名: 无法加载的原因})。缺少依赖、依赖的 package.json 无效、
+    处于循环依赖中的插件不会出现在批次中；依赖它们的插件在加载时快速失败。
+    每批内按 load_order、插件名排序。
+    """
+    errors: Dict[str, str] = {}
+    graph: Dict[str, List[str]] = {}
+    for name, metadata in manifests.items():
+        if metadata is None:
+            errors[name] = "package.json 无效"
+            continue
+        graph[name] = plugin_dependencies(metadata)
+    for name, dependencies in graph.items():
+        missing = [d for d in dependencies if d not in manifests]
+        if missing:
+            errors[name] = f"缺少依赖插件: {', '.join(missing)}"
+    
+    nodes = {name for name in graph if name not in errors}
+    indegree = {name: sum(1 for d in graph[name] if d in nodes) for name in nodes}
+    dependents: Dict[str, List[str]] = {name: [] for name in nodes}
+    for name in nodes:
+        for dependency in graph[name]:
+            if dependency in nodes:
+                dependents[dependency].append(name)
+    
+    def order(name):
+        return ((manifests[name] or {}).get('load_order', 0), name)
+    
+    waves = []
+    ready = sorted((n for n in nodes if indegree[n] == 0), key=order)
+    while ready:
+        waves.append(ready)
+        following = []
+        for name in ready:
+            for dependent in dependents[name]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    following.append(dependent)
+        ready = sorted(following, key=order)
+    
+    # 入度没有归零的插件处于循环中（或依赖循环中的插件）
+    blocked = {n for n in nodes if indegree[n] > 0}
+    for name in sorted(blocked):
+        cycle = _find_cycle(name, graph, blocked)
+        if cycle:
+            errors[name] = f"循环依赖: {' -> '.join(cycle)}"
+        else:
+            waiting = [d for d in graph[name] if d in blocked]
+            errors[name] = f"依赖插件无法加载: {', '.join(waiting)}"
+    return waves, errors
+
+def _find_cycle(start: str, graph: Dict[str, List[str]], nodes: set) -> Optional[List[str]]:
+    """从 start 出发回到 start 的依赖路径"""
+    stack = [(start, [start])]
+    visited = set()
+    while stack:
+        name, path = stack.pop()
+        for dependency in graph.get(name, []):
+            if dependency == start:
+                return path + [start]
+            if dependency in nodes and dependency not in visited:
+                visited.add(dependency)
+                stack.append((dependency, path + [dependency]))
+    return None
+
+class PluginPathFinder(importlib.abc.MetaPathFinder):
+    """让插件能导入自己目录中的模块，而不把插件目录加入 sys.path
+    
+    挂在 sys.meta_path 末尾，只在标准库和已安装的包都找不到时才查找插件目录，
+    其他模块的导入不会因为插件数量增加而变慢。
+    """
+    
+    def __init__(self):
+        self.paths: List[str] = []
+    
+    def add(self, path: str):
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            self.paths.append(path)
+    
+    def remove(self, path: str):
+        path = os.path.abspath(path)
+        if path in self.paths:
+            self.paths.remove(path)
+    
+    def find_spec(self, fullname, path=None, target=None):
+        # 只处理顶层模块，子模块由父包的 __path__ 负责
+        if path is not None or not self.paths:
+            return None
+        return importlib.machinery.PathFinder.find_spec(fullname, list(self.paths))
+
+plugin_path_finder = PluginPathFinder()
+sys.meta_path.append(plugin_path_finder)
 
 class Plugin:
     def __init__(self, name: str, path: str, metadata: Dict[str, Any]):
@@ -17,13 +424,63 @@ class Plugin:
         self.module = None
         self.instance = None
         self.load_order = metadata.get('load_order', 0)
+        # 延迟加载：首个匹配的消息或事件到达时才调用 activator(插件) 加载
+        self.lazy = False
+        self.activator = None
+        self.triggers = self._parse_triggers()
+        # 连续超时次数和降级截止时间（time.monotonic()）
+        self.consecutive_timeouts = 0
+        self.demoted_until = 0.0
+        # 事件总线订阅，插件卸载时取消
+        self.subscription = None
+        # 最近一次加载的耗时（秒）和新增内存（字节，未统计时为 None）
+        self.load_seconds = None
+        self.load_memory = None
+        # 进行中的调用数（消息处理和事件），热重载时旧实例等它归零后再卸载
+        self.inflight = 0
+        self._inflight_cond = threading.Condition()
+        # 加载时插件代码的状态，热重载时判断是否真的有变化
+        self.source_stamp = ()
+    
+    def begin_call(self):
+        with self._inflight_cond:
+            self.inflight += 1
+    
+    def end_call(self):
+        with self._inflight_cond:
+            self.inflight -= 1
+            if self.inflight <= 0:
+                self._inflight_cond.notify_all()
+    
+    def drain(self, timeout: float) -> bool:
+        """等待进行中的调用结束，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        with self._inflight_cond:
+            while self.inflight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._inflight_cond.wait(remaining)
+        return True
+    
+    def _parse_triggers(self) -> PluginTriggers:
+        if self.lazy and self.instance is None and 'triggers' not in self.metadata and self.metadata.get('events'):
+            # 只声明了 events 的延迟加载插件不参与消息分发，只由声明的事件激活
+            return PluginTriggers.none()
+        try:
+            return PluginTriggers(self.metadata.get('triggers'))
+        except re.error as e:
+            # 正则写错时退化为接收所有消息，由插件自己判断
+            logging.error(f"插件 {self.name} 的 triggers 正则无效: {str(e)}")
+            return PluginTriggers("all")
     
     def load(self, bot_manager=None, config_manager=None):
         """加载插件"""
+        if self.metadata.get('isolation') == 'process':
+            return self._load_isolated(config_manager)
         try:
-            # 确保插件目录在 Python 路径中
-            if self.path not in sys.path:
-                sys.path.insert(0, self.path)
+            # 插件可以导入自己目录中的模块
+            plugin_path_finder.add(self.path)
             
             spec = importlib.util.spec_from_file_location(
                 f"plugins.{self.name}", 
@@ -62,7 +519,8 @@ class Plugin:
                     except Exception as e:
                         logging.error(f"插件 {self.name} 初始化失败: {str(e)}")
                         return False
-                        
+                
+                self._subscribe_events()
                 return True
             else:
                 logging.error(f"插件 {self.name} 没有找到 Plugin 类")
@@ -74,17 +532,57 @@ class Plugin:
             logging.error(traceback.format_exc())
             return False
     
-    def unload(self):
-        """卸载插件"""
+    def _load_isolated(self, config_manager=None):
+        """在独立的工作进程中加载插件，instance 为转发调用的代理对象"""
+        import plugin_worker
         try:
+            timeout = self.metadata.get('timeout')
+            if timeout is None and config_manager is not None:
+                timeout = config_manager.get("plugin_timeout", DEFAULT_PLUGIN_TIMEOUT)
+            host = plugin_worker.ProcessPluginHost(self.name, self.path, self.metadata)
+            if not host.start():
+                host.shutdown(timeout=0)
+                logging.error(f"插件 {self.name} 的工作进程全部启动失败")
+                return False
+            self.instance = plugin_worker.ProcessPluginProxy(host, float(timeout or DEFAULT_PLUGIN_TIMEOUT))
+            self._subscribe_events()
+            logging.info(f"插件 {self.name} 已在 {len(host.workers)} 个工作进程中加载")
+            return True
+        except Exception as e:
+            logging.error(f"加载插件 {self.name} 失败: {str(e)}")
+            return False
+    
+    def unload(self, handover: bool = False):
+        """卸载插件
+        
+        handover 为 True 表示热重载时卸载旧实例：同名的新实例已经接管，
+        不再按插件名取消定时任务，也不移除插件目录的导入路径。
+        """
+        try:
+            if self.subscription:
+                self.subscription.close()
+                self.subscription = None
             if self.instance and hasattr(self.instance, 'on_unload'):
                 self.instance.on_unload()
             
-            # 从sys.modules中移除
+            # 提交插件数据库的延迟写入并关闭连接，保存缓存快照
+            # （热重载时快照已在交接前保存，新实例接管后不能再被旧实例覆盖）
+            database = getattr(self.instance, 'database', None)
+            if isinstance(database, plugin_dev.PluginDatabase):
+                database.close()
+            cache = getattr(self.instance, 'cache', None)
+            if isinstance(cache, plugin_dev.PluginCache):
+                cache.close(save=not handover)
+            if not handover:
+                # 取消插件的全部定时任务
+                task_scheduler.scheduler.cancel_owner(self.name)
+                plugin_path_finder.remove(self.path)
+            
+            # 从sys.modules中移除（只移除自己的模块，热重载后该名字可能已属于新实例）
             module_name = f"plugins.{self.name}"
-            if module_name in sys.modules:
+            if self.module is not None and sys.modules.get(module_name) is self.module:
                 del sys.modules[module_name]
-                
+            
             self.module = None
             self.instance = None
             logging.info(f"插件 {self.name} 卸载成功")
@@ -93,6 +591,46 @@ class Plugin:
             logging.error(f"卸载插件 {self.name} 失败: {str(e)}")
             return False
     
+    def _subscribe_events(self):
+        """把插件的 emit_event 订阅到核心事件总线
+        
+        订阅的事件类型：package.json 的 "events" 列表优先，其次是插件通过
+        register_event_handler 注册过的事件；都没有时不订阅，也不占用投递线程。
+        尚未加载的延迟加载插件只订阅 "events" 中声明的事件，加载后沿用同一个订阅。
+        """
+        if self.subscription is not None:
+            return
+        event_types = self.metadata.get('events')
+        if self.instance is None:
+            if not self.lazy:
+                return
+        elif not callable(getattr(self.instance, 'emit_event', None)):
+            return
+        elif event_types is None:
+            handlers = getattr(self.instance, 'event_handlers', None)
+            event_types = list(handlers) if isinstance(handlers, dict) else [event_bus.ALL_EVENTS]
+        if not event_types:
+            return
+        self.subscription = event_bus.bus.subscribe(
+            f"plugin.{self.name}",
+            self._deliver_event,
+            event_types,
+            int(self.metadata.get('event_queue_size', event_bus.DEFAULT_QUEUE_SIZE))
+        )
+    
+    def _deliver_event(self, event: event_bus.Event):
+        instance = self.instance
+        if instance is None and self.activator is not None:
+            instance = self.activator(self)
+        emit = getattr(instance, 'emit_event', None)
+        if callable(emit):
+            self.begin_call()
+            try:
+                with plugin_profiler.accounting.measure(self.name, plugin_profiler.SOURCE_EVENT):
+                    emit(event.type, event.data)
+            finally:
+                self.end_call()
+    
     def reload(self):
         """重新加载插件"""
         self.unload()
@@ -102,12 +640,176 @@ class PluginLoader:
     def __init__(self, plugins_dir: str = "plugins"):
         self.plugins_dir = plugins_dir
         self.plugins: Dict[str, Plugin] = {}
+        self.manifests = ManifestIndex(plugins_dir)
         self.bot_manager = None
         self.config_manager = None
+        self.dispatch_table = DispatchTable([])
+        self.worker_pool = None
+        self._readmit_at = 0.0
+        self._state_lock = threading.Lock()
+        # 延迟加载插件的首次加载锁
+        self._activate_lock = threading.RLock()
+        # 插件名 -> {"status", "seconds", "memory_bytes"}，启动时和延迟加载时更新
+        self.load_report: Dict[str, Dict[str, Any]] = {}
         
         # 创建插件目录
         os.makedirs(plugins_dir, exist_ok=True)
     
+    def rebuild_dispatch_table(self):
+        """重建消息分发表（插件加载、卸载、启停、降级后调用）"""
+        plugins = list(self.plugins.values())
+        demoted = [p.demoted_until for p in plugins if p.demoted_until > time.monotonic()]
+        self._readmit_at = min(demoted) if demoted else 0.0
+        self.dispatch_table = DispatchTable(plugins)
+    
+    def get_dispatch_targets(self, message: str) -> List[tuple]:
+        """获取可能处理该消息的 (插件, 处理方法) 列表"""
+        if self._readmit_at and time.monotonic() >= self._readmit_at:
+            # 有插件降级到期，重新加入分发表
+            self.rebuild_dispatch_table()
+        targets = self.dispatch_table.match(message)
+        if self.dispatch_table.lazy_count:
+            targets = self._activate_targets(targets)
+        return targets
+    
+    def _activate_targets(self, targets: List[tuple]) -> List[tuple]:
+        """加载命中的延迟加载插件，换上真正的处理方法"""
+        if all(handler is not None for _, handler in targets):
+            return targets
+        resolved = []
+        for plugin, handler in targets:
+            if handler is None:
+                handler = getattr(self.activate_plugin(plugin), 'process_message', None)
+                if not callable(handler):
+                    continue
+            resolved.append((plugin, handler))
+        return resolved
+    
+    def activate_plugin(self, plugin: "Plugin"):
+        """加载延迟加载的插件（首个匹配的消息或事件到达时调用），返回插件实例，加载失败时返回 None"""
+        if plugin.instance is not None:
+            return plugin.instance
+        with self._activate_lock:
+            if plugin.instance is not None:
+                return plugin.instance
+            if not (plugin.lazy and plugin.enabled) or self.plugins.get(plugin.name) is not plugin:
+                return None
+            logging.info(f"插件 {plugin.name} 首次被触发，开始加载")
+            if not self._load_measured(plugin, plugin.lazy):
+                # 不再参与分发，避免每条消息都重试；可在面板中重新启用
+                plugin.unload()
+                plugin.lazy = False
+            # 加载后按正常规则分发消息（只声明了 events 的插件加载前不接收消息）
+            plugin.triggers = plugin._parse_triggers()
+            self.rebuild_dispatch_table()
+            return plugin.instance
+    
+    def get_batch_handler(self, plugin: "Plugin"):
+        """插件的批量处理方法，不支持批量处理时返回 None"""
+        return self.dispatch_table.batch_handlers.get(plugin.name)
+    
+    @staticmethod
+    def map_batch_replies(plugin: "Plugin", indexes: List[int], messages: List[dict], result) -> Dict[int, Any]:
+        """把 process_messages_batch 的返回值整理为 {下标: 回复}
+        
+        返回值可以是与 messages 一一对应的列表，也可以是 {msg_id: 回复} 的字典。
+        """
+        if not result:
+            return {}
+        if isinstance(result, dict):
+            return {i: result.get(m.get('msg_id')) for i, m in zip(indexes, messages)}
+        if isinstance(result, (list, tuple)):
+            if len(result) != len(messages):
+                logging.warning(f"插件 {plugin.name} 批量处理返回了 {len(result)} 条回复，应为 {len(messages)} 条")
+            return dict(zip(indexes, result))
+        logging.warning(f"插件 {plugin.name} 批量处理的返回值类型无效: {type(result).__name__}")
+        return {}
+    
+    def _config_value(self, key: str, default):
+        if self.config_manager is None:
+            return default
+        return self.config_manager.get(key, default)
+    
+    def get_plugin_timeout(self, plugin: "Plugin") -> float:
+        """插件单次消息处理的超时时间：package.json 的 timeout 优先，其次是 config.json 的 plugin_timeout"""
+        timeout = plugin.metadata.get('timeout')
+        if timeout is None:
+            timeout = self._config_value("plugin_timeout", DEFAULT_PLUGIN_TIMEOUT)
+        return float(timeout)
+    
+    def _get_worker_pool(self) -> PluginWorkerPool:
+        if self.worker_pool is None:
+            with self._state_lock:
+                if self.worker_pool is None:
+                    self.worker_pool = PluginWorkerPool(int(self._config_value("plugin_workers", DEFAULT_PLUGIN_WORKERS)))
+        return self.worker_pool
+    
+    def run_handler(self, plugin: "Plugin", handler, message_data):
+        """在共享线程池中执行插件消息处理，返回 (结果类型, 返回值或异常)
+        
+        message_data 为单条消息，批量处理方法则传入消息列表，超时时间相同。
+        超过插件的超时时间后立即返回 RESULT_TIMEOUT，插件调用在后台继续运行，结果被丢弃。
+        """
+        timeout = self.get_plugin_timeout(plugin)
+        started = time.perf_counter()
+        plugin.begin_call()
+        try:
+            future = self._get_worker_pool().submit(self._invoke_handler, plugin.name, handler, message_data, timeout)
+        except queue.Full:
+            plugin.end_call()
+            PLUGIN_CALLS.labels(plugin.name, RESULT_BUSY).inc()
+            return RESULT_BUSY, None
+        
+        def finished(_):
+            PLUGIN_LATENCY.labels(plugin.name).observe(time.perf_counter() - started)
+            plugin.end_call()
+        
+        future.add_done_callback(finished)
+        
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                # 任务还在排队，说明是线程池繁忙，不计入插件超时
+                PLUGIN_CALLS.labels(plugin.name, RESULT_BUSY).inc()
+                return RESULT_BUSY, None
+            PLUGIN_CALLS.labels(plugin.name, RESULT_TIMEOUT).inc()
+            self._record_timeout(plugin, timeout)
+            return RESULT_TIMEOUT, None
+        except Exception as e:
+            PLUGIN_CALLS.labels(plugin.name, RESULT_ERROR).inc()
+            self._reset_timeouts(plugin)
+            return RESULT_ERROR, e
+        
+        PLUGIN_CALLS.labels(plugin.name, RESULT_OK).inc()
+        self._reset_timeouts(plugin)
+        return RESULT_OK, result
+    
+    @staticmethod
+    def _invoke_handler(plugin_name: str, handler, message_data: dict, timeout: float):
+        """调用插件处理方法，async def 实现的 process_message 在共享事件循环中运行"""
+        with plugin_profiler.accounting.measure(plugin_name, plugin_profiler.SOURCE_MESSAGE):
+            return async_runtime.runtime.resolve(handler(message_data), timeout)
+    
+    def _reset_timeouts(self, plugin: "Plugin"):
+        if plugin.consecutive_timeouts:
+            with self._state_lock:
+                plugin.consecutive_timeouts = 0
+    
+    def _record_timeout(self, plugin: "Plugin", timeout: float):
+        """记录一次超时，连续超时达到阈值后降级插件"""
+        demote_after = int(self._config_value("plugin_demote_after", DEFAULT_DEMOTE_AFTER))
+        with self._state_lock:
+            plugin.consecutive_timeouts += 1
+            if demote_after <= 0 or plugin.consecutive_timeouts < demote_after:
+                return
+            demote_seconds = float(self._config_value("plugin_demote_seconds", DEFAULT_DEMOTE_SECONDS))
+            plugin.consecutive_timeouts = 0
+            plugin.demoted_until = time.monotonic() + demote_seconds
+        PLUGIN_DEMOTIONS.labels(plugin.name).inc()
+        logging.warning(f"插件 {plugin.name} 连续 {demote_after} 次处理超时（{timeout}s），降级 {demote_seconds:.0f} 秒")
+        self.rebuild_dispatch_table()
+    
     def set_dependencies(self, bot_manager, config_manager):
         """设置依赖项"""
         self.bot_manager = bot_manager
@@ -115,78 +817,225 @@ class PluginLoader:
     
     def discover_plugins(self) -> List[str]:
         """发现所有插件"""
-        plugins = []
-        if not os.path.exists(self.plugins_dir):
-            return plugins
-            
-        for item in os.listdir(self.plugins_dir):
-            plugin_path = os.path.join(self.plugins_dir, item)
-            if os.path.isdir(plugin_path):
-                package_json = os.path.join(plugin_path, "package.json")
-                main_py = os.path.join(plugin_path, "main.py")
-                
-                if os.path.exists(package_json) and os.path.exists(main_py):
-                    plugins.append(item)
-        
-        return plugins
+        return self.manifests.names()
     
-    def load_plugin(self, plugin_name: str) -> bool:
-        """加载单个插件"""
+    def load_plugin(self, plugin_name: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """加载单个插件（已加载的插件不会重复加载）"""
         try:
-            plugin_path = os.path.join(self.plugins_dir, plugin_name)
-            package_json_path = os.path.join(plugin_path, "package.json")
+            existing = self.plugins.get(plugin_name)
+            if existing is not None and (existing.instance or not existing.enabled):
+                return True
             
-            with open(package_json_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+            if metadata is None:
+                metadata = self.manifests.get(plugin_name)
+            if metadata is None:
+                logging.error(f"加载插件 {plugin_name} 时出错: {self.manifests.error(plugin_name) or 'package.json 不存在'}")
+                return False
             
-            plugin = Plugin(plugin_name, plugin_path, metadata)
+            if metadata.get('enabled', True):
+                unavailable = [d for d in plugin_dependencies(metadata) if not self._dependency_ready(d)]
+                if unavailable:
+                    logging.error(f"加载插件 {plugin_name} 失败: 依赖插件未加载: {', '.join(unavailable)}")
+                    self._report_failure(plugin_name, f"依赖插件未加载: {', '.join(unavailable)}")
+                    return False
             
-            # 只有启用的插件才加载
-            if plugin.enabled:
-                success = plugin.load(self.bot_manager, self.config_manager)
-                if success:
-                    self.plugins[plugin_name] = plugin
-                    return True
-            else:
-                self.plugins[plugin_name] = plugin
-                return True
-                
-            return False
+            plugin = self._prepare_plugin(plugin_name, metadata)
+            if plugin is None:
+                return False
+            self.plugins[plugin_name] = plugin
+            self.rebuild_dispatch_table()
+            return True
             
         except Exception as e:
             logging.error(f"加载插件 {plugin_name} 时出错: {str(e)}")
             return False
     
+    def _dependency_ready(self, name: str) -> bool:
+        """依赖的插件已加载（延迟加载的依赖会在这里被加载）"""
+        plugin = self.plugins.get(name)
+        if plugin is None or not plugin.enabled:
+            return False
+        return plugin.instance is not None or self.activate_plugin(plugin) is not None
+    
+    def _prepare_plugin(self, plugin_name: str, metadata: Dict[str, Any], allow_lazy: bool = True) -> Optional[Plugin]:
+        """创建插件对象并按状态加载（尚未登记到 self.plugins），加载失败时返回 None"""
+        plugin = self._create_plugin(plugin_name, metadata)
+        return plugin if self._start_plugin(plugin, allow_lazy) else None
+    
+    def _create_plugin(self, plugin_name: str, metadata: Dict[str, Any]) -> Plugin:
+        plugin_path = os.path.join(self.plugins_dir, plugin_name)
+        plugin = Plugin(plugin_name, plugin_path, metadata)
+        plugin.source_stamp = self._source_stamp(plugin_path)
+        return plugin
+    
+    def _start_plugin(self, plugin: Plugin, allow_lazy: bool = True) -> bool:
+        """按状态加载插件，返回是否成功"""
+        # 只有启用的插件才加载
+        if not plugin.enabled:
+            self._report(plugin, LOAD_DISABLED)
+            return True
+        if allow_lazy and self._is_lazy(plugin.metadata):
+            # 延迟加载：先按声明的 triggers 和 events 登记，首次命中时再导入
+            plugin.lazy = True
+            plugin.triggers = plugin._parse_triggers()
+            plugin.activator = self.activate_plugin
+            plugin._subscribe_events()
+            self._report(plugin, LOAD_LAZY)
+            return True
+        return self._load_measured(plugin)
+    
+    def _is_lazy(self, metadata: Dict[str, Any]) -> bool:
+        """package.json 的 "lazy" 优先；未声明时，声明了 triggers 或 events 的插件按 plugin_lazy_load 决定"""
+        if metadata.get('isolation') == 'process':
+            return bool(metadata.get('lazy', False))
+        if 'lazy' in metadata:
+            return bool(metadata['lazy'])
+        if 'triggers' not in metadata and 'events' not in metadata:
+            return False
+        return bool(self._config_value("plugin_lazy_load", DEFAULT_LAZY_LOAD))
+    
+    def _load_measured(self, plugin: Plugin, lazy: bool = False) -> bool:
+        """加载插件并记录耗时和内存（tracemalloc 正在跟踪时）"""
+        tracing = tracemalloc.is_tracing()
+        memory_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        started = time.perf_counter()
+        success = plugin.load(self.bot_manager, self.config_manager)
+        plugin.load_seconds = time.perf_counter() - started
+        plugin.load_memory = max(0, tracemalloc.get_traced_memory()[0] - memory_before) if tracing else None
+        PLUGIN_LOAD_SECONDS.labels(plugin.name).set(plugin.load_seconds)
+        if plugin.load_memory is not None:
+            PLUGIN_LOAD_MEMORY.labels(plugin.name).set(plugin.load_memory)
+        self._report(plugin, LOAD_LOADED if success else LOAD_FAILED, lazy)
+        return success
+    
+    def _report(self, plugin: Plugin, status: str, lazy: bool = False):
+        self.load_report[plugin.name] = {
+            "status": status,
+            "lazy": lazy or status == LOAD_LAZY,
+            "seconds": None if plugin.load_seconds is None else round(plugin.load_seconds, 4),
+            "memory_bytes": plugin.load_memory,
+            "error": None,
+        }
+    
+    def _report_failure(self, plugin_name: str, error: str):
+        self.load_report[plugin_name] = {
+            "status": LOAD_FAILED, "lazy": False, "seconds": None, "memory_bytes": None, "error": error
+        }
+    
     def load_all_plugins(self) -> bool:
-        """加载所有插件"""
-        plugin_names = self.discover_plugins()
+        """按依赖关系分批加载所有插件，同一批的插件并行加载，并输出每个插件的加载耗时和内存
         
-        # 按加载顺序排序
-        plugins_with_order = []
-        for name in plugin_names:
-            try:
-                plugin_path = os.path.join(self.plugins_dir, name)
-                package_json_path = os.path.join(plugin_path, "package.json")
-                
-                with open(package_json_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
-                load_order = metadata.get('load_order', 0)
-                plugins_with_order.append((name, load_order))
-            except:
-                plugins_with_order.append((name, 0))
-        
-        # 按加载顺序排序
-        plugins_with_order.sort(key=lambda x: x[1])
+        依赖加载失败（或缺少依赖、循环依赖）的插件直接标记为失败，不会被导入。
+        被其他插件依赖的插件不会延迟加载。
+        """
+        manifests = self.manifests.scan()
+        waves, errors = plan_load_waves(manifests)
+        required = {d for metadata in manifests.values() if metadata for d in plugin_dependencies(metadata)}
+        workers = max(1, int(self._config_value("plugin_load_workers", DEFAULT_LOAD_WORKERS)))
         
+        # 只在启动加载期间跟踪内存分配，避免 tracemalloc 拖慢消息处理；
+        # 并行加载时按调用栈把内存归到插件目录，需要保留多层栈帧
+        start_tracing = (bool(self._config_value("plugin_load_report", DEFAULT_LOAD_REPORT))
+                         and not tracemalloc.is_tracing())
+        if start_tracing:
+            tracemalloc.start(16)
+        started = time.perf_counter()
         success_count = 0
-        for name, _ in plugins_with_order:
-            if self.load_plugin(name):
-                success_count += 1
+        # 插件名 -> 失败原因（包括因依赖失败而跳过的）
+        failed: Dict[str, str] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plugin-load") as executor:
+                for wave in waves:
+                    batch = []
+                    for name in wave:
+                        metadata = manifests[name]
+                        if metadata.get('enabled', True):
+                            dependencies = plugin_dependencies(metadata)
+                            broken = [d for d in dependencies if d in failed or d in errors]
+                            if broken:
+                                failed[name] = f"依赖插件加载失败: {', '.join(broken)}"
+                                continue
+                            disabled = [d for d in dependencies if not manifests[d].get('enabled', True)]
+                            if disabled:
+                                failed[name] = f"依赖插件未启用: {', '.join(disabled)}"
+                                continue
+                        existing = self.plugins.get(name)
+                        if existing is not None and (existing.instance or not existing.enabled):
+                            success_count += 1
+                            continue
+                        batch.append(name)
+                    futures = [
+                        (name, executor.submit(self._prepare_plugin, name, manifests[name], name not in required))
+                        for name in batch
+                    ]
+                    # 按批内顺序登记，分发表中的顺序与加载顺序一致
+                    for name, future in futures:
+                        try:
+                            plugin = future.result()
+                        except Exception as e:
+                            logging.error(f"加载插件 {name} 时出错: {str(e)}")
+                            plugin = None
+                        if plugin is None:
+                            failed[name] = self.load_report.get(name, {}).get("error") or "加载失败"
+                            continue
+                        self.plugins[name] = plugin
+                        success_count += 1
+                    self.rebuild_dispatch_table()
+            if tracemalloc.is_tracing():
+                self._attribute_memory(tracemalloc.take_snapshot())
+        finally:
+            if start_tracing:
+                tracemalloc.stop()
         
-        logging.info(f"插件加载完成: {success_count}/{len(plugin_names)} 个插件加载成功")
+        for name, error in list(errors.items()) + list(failed.items()):
+            metadata = manifests.get(name)
+            if metadata is not None and not metadata.get('enabled', True):
+                # 禁用的插件照常登记，之后可以在面板中启用
+                if name not in self.plugins:
+                    self.plugins[name] = self._prepare_plugin(name, metadata)
+                continue
+            logging.error(f"插件 {name} 未加载: {error}")
+            report = self.load_report.get(name)
+            if report is not None and report["status"] == LOAD_FAILED:
+                report["error"] = report.get("error") or error
+            else:
+                self._report_failure(name, error)
+        self.rebuild_dispatch_table()
+        
+        lazy_count = sum(1 for p in self.plugins.values() if p.lazy and not p.instance)
+        logging.info(f"插件加载完成: {success_count}/{len(manifests)} 个插件加载成功"
+                     f"（其中 {lazy_count} 个延迟加载，共 {len(waves)} 批），耗时 {time.perf_counter() - started:.3f}s")
+        self.log_load_report(list(manifests))
         return success_count > 0
     
+    def _attribute_memory(self, snapshot: "tracemalloc.Snapshot"):
+        """把加载期间仍然存活的内存按调用栈归到各插件目录（并行加载时无法用前后差值统计）"""
+        loaded = [plugin for plugin in self.plugins.values() if plugin.instance is not None]
+        totals = plugin_profiler.attribute_memory(snapshot, {plugin.name: plugin.path for plugin in loaded})
+        for plugin in loaded:
+            plugin.load_memory = totals[plugin.name]
+            PLUGIN_LOAD_MEMORY.labels(plugin.name).set(plugin.load_memory)
+            if plugin.name in self.load_report:
+                self.load_report[plugin.name]["memory_bytes"] = plugin.load_memory
+        # 加载失败的插件：前后差值包含了同时加载的其他插件，不可信
+        for name, report in self.load_report.items():
+            if name not in totals:
+                report["memory_bytes"] = None
+    
+    def log_load_report(self, names: Optional[List[str]] = None):
+        """按加载耗时从高到低输出加载报告"""
+        rows = [(name, self.load_report[name]) for name in (names or list(self.load_report)) if name in self.load_report]
+        if not rows:
+            return
+        rows.sort(key=lambda row: row[1]["seconds"] or 0, reverse=True)
+        width = max(len(name) for name, _ in rows)
+        logging.info("插件加载报告:")
+        for name, item in rows:
+            seconds = "-" if item["seconds"] is None else f"{item['seconds'] * 1000:.1f}ms"
+            memory = "-" if item["memory_bytes"] is None else f"{item['memory_bytes'] / 1024:.1f}KB"
+            error = f"  {item['error']}" if item.get("error") else ""
+            logging.info(f"  {name:<{width}}  {item['status']:<8}  {seconds:>10}  {memory:>10}{error}")
+    
     def unload_plugin(self, plugin_name: str) -> bool:
         """卸载插件"""
         if plugin_name in self.plugins:
@@ -194,16 +1043,169 @@ class PluginLoader:
             success = plugin.unload()
             if success:
                 del self.plugins[plugin_name]
+                self.rebuild_dispatch_table()
             return success
         return False
     
     def reload_plugin(self, plugin_name: str) -> bool:
         """重新加载插件"""
         if plugin_name in self.plugins:
-            return self.plugins[plugin_name].reload()
+            with self._activate_lock:
+                plugin = self.plugins[plugin_name]
+                plugin.unload()
+                # 使用最新的 package.json
+                metadata = self.manifests.get(plugin_name)
+                if metadata is not None:
+                    plugin.metadata = metadata
+                    plugin.enabled = metadata.get('enabled', True)
+                # 与启动时相同：按最新的状态决定是否延迟加载，并记录加载耗时和内存
+                plugin.lazy = False
+                plugin.activator = None
+                plugin.triggers = plugin._parse_triggers()
+                plugin.source_stamp = self._source_stamp(plugin.path)
+                success = self._start_plugin(plugin)
+                self.rebuild_dispatch_table()
+                return success
         else:
             return self.load_plugin(plugin_name)
     
+    def hot_swap(self, plugin_name: str) -> bool:
+        """插件目录中的文件变化后，用新模块和新实例替换该插件
+        
+        新实例加载成功后才替换，此后的消息和事件交给新实例；旧实例在后台等待
+        进行中的调用结束后卸载。新实例加载失败时旧实例继续工作。其他插件不受影响。
+        """
+        with self._activate_lock:
+            old = self.plugins.get(plugin_name)
+            plugin_path = os.path.join(self.plugins_dir, plugin_name)
+            if not os.path.isdir(plugin_path):
+                if old is None:
+                    return False
+                logging.info(f"插件 {plugin_name} 的目录已被删除，卸载插件")
+                return self.unload_plugin(plugin_name)
+            
+            metadata = self.manifests.get(plugin_name)
+            if metadata is None:
+                logging.error(f"插件 {plugin_name} 热重载失败: {self.manifests.error(plugin_name) or 'package.json 不存在'}")
+                PLUGIN_RELOADS.labels(plugin_name, "failed").inc()
+                return False
+            if old is None:
+                # 新安装的插件
+                return self.load_plugin(plugin_name, metadata)
+            if metadata == old.metadata and self._source_stamp(plugin_path) == old.source_stamp:
+                # 例如面板启用插件时改写了 package.json，但内容和代码都没有变化
+                return True
+            if old.instance is None and not old.enabled and not metadata.get('enabled', True):
+                # 禁用的插件只更新元数据
+                old.metadata = metadata
+                old.triggers = old._parse_triggers()
+                return True
+            
+            logging.info(f"检测到插件 {plugin_name} 的文件变化，正在热重载")
+            old_tasks = task_scheduler.scheduler.tasks(plugin_name)
+            self._handover_state(old)
+            old_modules = self._forget_plugin_modules(plugin_path)
+            new = self._create_plugin(plugin_name, metadata)
+            if not self._start_plugin(new):
+                # 清理加载了一半的新实例，恢复旧模块，旧实例继续工作
+                self._discard_candidate(new, old_tasks)
+                self._forget_plugin_modules(plugin_path)
+                sys.modules.update(old_modules)
+                PLUGIN_RELOADS.labels(plugin_name, "failed").inc()
+                logging.error(f"插件 {plugin_name} 新版本加载失败，继续使用旧版本")
+                return False
+            
+            self.plugins[plugin_name] = new
+            self.rebuild_dispatch_table()
+            # 新实例已接管：停止旧实例的定时任务和事件订阅，进行中的调用结束后卸载
+            for handle in old_tasks:
+                handle.cancel()
+            if old.subscription:
+                old.subscription.close()
+                old.subscription = None
+            PLUGIN_RELOADS.labels(plugin_name, "ok").inc()
+        
+        if old.instance is not None:
+            threading.Thread(target=self._retire, args=(old,), name=f"plugin-retire-{plugin_name}", daemon=True).start()
+        logging.info(f"插件 {plugin_name} 热重载完成")
+        return True
+    
+    @staticmethod
+    def _source_stamp(plugin_path: str) -> tuple:
+        """插件目录下所有 .py 文件的 (相对路径, mtime_ns, 大小)，用于判断代码是否变化"""
+        stamp = []
+        for dirpath, dirnames, filenames in os.walk(plugin_path):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d != '__pycache__']
+            for filename in filenames:
+                if filename.endswith('.py'):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    stamp.append((os.path.relpath(path, plugin_path), stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(stamp))
+    
+    @staticmethod
+    def _handover_state(plugin: Plugin):
+        """新实例加载前先落盘旧实例的数据库延迟写入和缓存快照，让新实例读到最新数据"""
+        database = getattr(plugin.instance, 'database', None)
+        if isinstance(database, plugin_dev.PluginDatabase):
+            try:
+                database.flush()
+            except Exception as e:
+                logging.error(f"插件 {plugin.name} 延迟写入失败: {str(e)}")
+        cache = getattr(plugin.instance, 'cache', None)
+        if isinstance(cache, plugin_dev.PluginCache):
+            cache.save()
+    
+    @staticmethod
+    def _discard_candidate(plugin: Plugin, old_tasks: List[task_scheduler.TaskHandle]):
+        """热重载失败时清理新实例：只取消它注册的定时任务（旧实例的保留），关闭数据库和缓存
+        
+        缓存不写快照，避免覆盖旧实例的数据。
+        """
+        keep = set(old_tasks)
+        for handle in task_scheduler.scheduler.tasks(plugin.name):
+            if handle not in keep:
+                handle.cancel()
+        if plugin.subscription:
+            plugin.subscription.close()
+            plugin.subscription = None
+        database = getattr(plugin.instance, 'database', None)
+        if isinstance(database, plugin_dev.PluginDatabase):
+            try:
+                database.close()
+            except Exception as e:
+                logging.error(f"插件 {plugin.name} 新实例的数据库关闭失败: {str(e)}")
+        cache = getattr(plugin.instance, 'cache', None)
+        if isinstance(cache, plugin_dev.PluginCache):
+            cache.close(save=False)
+        plugin.instance = None
+        plugin.module = None
+    
+    @staticmethod
+    def _forget_plugin_modules(plugin_path: str) -> Dict[str, Any]:
+        """从 sys.modules 中移除插件目录下的模块，使其重新导入，返回被移除的模块"""
+        prefix = os.path.abspath(plugin_path) + os.sep
+        removed = {}
+        for name, module in list(sys.modules.items()):
+            filename = getattr(module, '__file__', None)
+            if filename and os.path.abspath(filename).startswith(prefix):
+                removed[name] = sys.modules.pop(name)
+        return removed
+    
+    def _retire(self, plugin: Plugin):
+        """等待旧实例处理完进行中的调用后卸载"""
+        timeout = float(self._config_value("plugin_drain_timeout", DEFAULT_DRAIN_TIMEOUT))
+        if not plugin.drain(timeout):
+            logging.warning(f"插件 {plugin.name} 旧实例仍有 {plugin.inflight} 个调用未结束，强制卸载")
+        plugin.unload(handover=True)
+    
+    def plugin_paths(self) -> Dict[str, str]:
+        """已加载插件的 {插件名: 插件目录}，用于按插件统计内存"""
+        return {name: plugin.path for name, plugin in self.plugins.items() if plugin.instance is not None}
+    
     def get_plugin(self, plugin_name: str) -> Optional[Plugin]:
         """获取插件实例"""
         return self.plugins.get(plugin_name)
@@ -216,17 +1218,10 @@ class PluginLoader:
         """启用插件"""
         try:
             # 首先确保插件配置文件中启用状态正确
-            plugin_path = os.path.join(self.plugins_dir, plugin_name)
-            package_json_path = os.path.join(plugin_path, "package.json")
-            
-            if os.path.exists(package_json_path):
-                with open(package_json_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
+            metadata = self.manifests.get(plugin_name)
+            if metadata is not None:
                 metadata['enabled'] = True
-                
-                with open(package_json_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=4, ensure_ascii=False)
+                self.manifests.write(plugin_name, metadata)
             
             # 如果插件已经在内存中，更新状态
             if plugin_name in self.plugins:
@@ -234,9 +1229,13 @@ class PluginLoader:
                 plugin.enabled = True
                 plugin.metadata['enabled'] = True
                 
-                # 如果插件未加载，加载它
+                # 如果插件未加载，按启动时的流程加载它（可能延迟加载）
                 if not plugin.instance:
-                    return plugin.load(self.bot_manager, self.config_manager)
+                    with self._activate_lock:
+                        success = self._start_plugin(plugin)
+                        self.rebuild_dispatch_table()
+                    return success
+                self.rebuild_dispatch_table()
                 return True
             else:
                 # 如果插件不在内存中，加载它
@@ -262,6 +1261,7 @@ class PluginLoader:
                 # 更新状态
                 plugin.enabled = False
                 plugin.metadata['enabled'] = False
+                self.rebuild_dispatch_table()
                 
                 # 保存配置
                 return self.save_plugin_metadata(plugin)
@@ -276,23 +1276,14 @@ class PluginLoader:
     def _disable_plugin_from_filesystem(self, plugin_name: str) -> bool:
         """从文件系统禁用插件"""
         try:
-            plugin_path = os.path.join(self.plugins_dir, plugin_name)
-            package_json_path = os.path.join(plugin_path, "package.json")
-            
-            if not os.path.exists(package_json_path):
+            metadata = self.manifests.get(plugin_name)
+            if metadata is None:
                 logging.error(f"插件 {plugin_name} 的 package.json 不存在")
                 return False
             
-            # 读取当前配置
-            with open(package_json_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
-            # 更新启用状态
+            # 更新启用状态并保存
             metadata['enabled'] = False
-            
-            # 保存配置
-            with open(package_json_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=4, ensure_ascii=False)
+            self.manifests.write(plugin_name, metadata)
             
             logging.info(f"已从文件系统禁用插件: {plugin_name}")
             return True
@@ -304,9 +1295,7 @@ class PluginLoader:
     def save_plugin_metadata(self, plugin: Plugin) -> bool:
         """保存插件元数据"""
         try:
-            package_json_path = os.path.join(plugin.path, "package.json")
-            with open(package_json_path, 'w', encoding='utf-8') as f:
-                json.dump(plugin.metadata, f, indent=4, ensure_ascii=False)
+            self.manifests.write(plugin.name, plugin.metadata)
             return True
         except Exception as e:
             logging.error(f"保存插件 {plugin.name} 元数据失败: {str(e)}")
@@ -1,126 +1,609 @@
 import os
+import ctypes
+import ctypes.util
+import hashlib
 import json
 import requests
 import zipfile
 import tempfile
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 import logging
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+import api_hosts
 from plugin_loader import plugin_loader
 
+# 插件市场缓存
+SEARCH_TTL = 600            # 搜索结果的有效期（秒），过期后带 ETag 重新验证
+MANIFEST_TTL = 3600         # 仓库 package.json 的有效期（秒）
+MANIFEST_WORKERS = 8        # 并发获取 package.json 的线程数
+SEARCH_TIMEOUT = 10
+MANIFEST_TIMEOUT = 5
+MARKET_CACHE_FILE = "plugin_market_cache.json"
+
+# 插件安装包缓存：按 sha256 保存下载的压缩包，重新安装时带 ETag 验证，未变化时不再下载
+PACKAGE_CACHE_DIR = "plugin_packages"
+PACKAGE_KEEP = 3            # 每个仓库保留的压缩包数（正在使用和可回滚的版本不会被清理）
+DOWNLOAD_TIMEOUT = 30
+COPY_CHUNK = 64 * 1024
+
+# plugins/ 下的临时目录，以 . 开头，不会被当作插件加载或触发热重载
+STAGING_DIR = ".staging"        # 解压中的新版本
+ROLLBACK_DIR = ".rollback"      # 每个插件被替换下来的上一个版本
+
+# 搜索结果来源
+SOURCE_NETWORK = "network"      # 刚从 GitHub 获取（或 304 重新验证）
+SOURCE_CACHE = "cache"          # 缓存未过期，没有发出请求
+SOURCE_OFFLINE = "offline"      # 离线模式或网络不可用，使用最后一次的缓存
+
+class MarketCache:
+    """插件市场的本地缓存：搜索结果和各仓库的 package.json
+    
+    每条记录保存获取时间和 ETag，过期后发送条件请求，304 时只刷新时间。
+    全部记录保存在一个 JSON 文件中（先写临时文件再替换），网络不可用时作为离线索引。
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {"searches": {}, "manifests": {}}
+        self._dirty = False
+        self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for kind in self._data:
+                if isinstance(data.get(kind), dict):
+                    self._data[kind] = data[kind]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"插件市场缓存无法读取，将重新获取: {str(e)}")
+    
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """{"fetched": 时间戳, "etag": ETag, "value": 内容}，没有缓存时返回 None"""
+        with self._lock:
+            return self._data[kind].get(key)
+    
+    def put(self, kind: str, key: str, value: Any, etag: Optional[str] = None):
+        with self._lock:
+            self._data[kind][key] = {"fetched": time.time(), "etag": etag, "value": value}
+            self._dirty = True
+    
+    def touch(self, kind: str, key: str):
+        """重新验证通过（304），刷新获取时间"""
+        with self._lock:
+            entry = self._data[kind].get(key)
+            if entry is not None:
+                entry["fetched"] = time.time()
+                self._dirty = True
+    
+    @staticmethod
+    def is_fresh(entry: Optional[Dict[str, Any]], ttl: float) -> bool:
+        return entry is not None and time.time() - entry.get("fetched", 0) < ttl
+    
+    def values(self, kind: str) -> List[Any]:
+        with self._lock:
+            return [entry.get("value") for entry in self._data[kind].values()]
+    
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._data, ensure_ascii=False)
+            self._dirty = False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"保存插件市场缓存失败: {str(e)}")
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_RENAME_EXCHANGE = 2
+_AT_FDCWD = -100
+
+def exchange_paths(first: str, second: str) -> bool:
+    """原子地交换两个路径（Linux renameat2 RENAME_EXCHANGE），系统或文件系统不支持时返回 False"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):
+        return False
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    if renameat2(_AT_FDCWD, os.fsencode(first), _AT_FDCWD, os.fsencode(second), _RENAME_EXCHANGE) == 0:
+        return True
+    errno = ctypes.get_errno()
+    # ENOSYS / EINVAL：内核或文件系统不支持，由调用方退回两次 rename
+    if errno in (38, 22):
+        return False
+    raise OSError(errno, os.strerror(errno), first)
+
+class PackageCache:
+    """按内容寻址的插件安装包缓存
+    
+    压缩包保存为 <目录>/sha256/<摘要>.zip，边下载边计算摘要，使用前重新校验。
+    index.json 记录每个仓库下载过的压缩包（新的在前，带 ETag），以及每个插件
+    当前安装和可回滚的版本。
+    """
+    
+    def __init__(self, root: str = PACKAGE_CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._index = {"repos": {}, "installed": {}, "rollback": {}}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key in self._index:
+                if isinstance(data.get(key), dict):
+                    self._index[key] = data[key]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"插件安装包缓存索引无法读取: {str(e)}")
+    
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, "sha256", f"{digest}.zip")
+    
+    def verify(self, digest: str) -> bool:
+        """缓存中是否有完整的该压缩包"""
+        path = self.path(digest)
+        if not os.path.exists(path):
+            return False
+        if file_sha256(path) != digest:
+            logging.error(f"插件安装包 {digest[:12]} 校验失败，已删除")
+            os.remove(path)
+            return False
+        return True
+    
+    def latest(self, repo: str) -> Optional[Dict[str, Any]]:
+        """仓库最近一次下载的压缩包记录 {"sha256", "etag", "size", "fetched"}"""
+        with self._lock:
+            entries = self._index["repos"].get(repo) or []
+            return dict(entries[0]) if entries else None
+    
+    def store(self, repo: str, chunks, etag: Optional[str] = None) -> str:
+        """边写入边计算摘要，返回压缩包的 sha256"""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.root, "sha256"), exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, self.path(digest.hexdigest()))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        entry = {"sha256": digest.hexdigest(), "etag": etag, "size": size, "fetched": time.time()}
+        with self._lock:
+            entries = [e for e in self._index["repos"].get(repo, []) if e.get("sha256") != entry["sha256"]]
+            self._index["repos"][repo] = [entry] + entries
+        self._prune(repo)
+        self.save()
+        return entry["sha256"]
+    
+    def touch(self, repo: str):
+        """ETag 验证通过，刷新最近一次下载的时间"""
+        with self._lock:
+            entries = self._index["repos"].get(repo)
+            if entries:
+                entries[0]["fetched"] = time.time()
+        self.save()
+    
+    def _prune(self, repo: str):
+        """每个仓库只保留最近的 PACKAGE_KEEP 个压缩包，正在使用和可回滚的版本除外"""
+        with self._lock:
+            in_use = {record.get("sha256") for kind in ("installed", "rollback")
+                      for record in self._index[kind].values()}
+            entries = self._index["repos"].get(repo, [])
+            kept = []
+            removed = []
+            for entry in entries:
+                if len(kept) < PACKAGE_KEEP or entry.get("sha256") in in_use:
+                    kept.append(entry)
+                else:
+                    removed.append(entry["sha256"])
+            self._index["repos"][repo] = kept
+        for digest in removed:
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+    
+    def record(self, kind: str, plugin_name: str) -> Optional[Dict[str, Any]]:
+        """插件当前安装（installed）或可回滚（rollback）的版本 {"repo", "sha256", "installed"}"""
+        with self._lock:
+            record = self._index[kind].get(plugin_name)
+            return dict(record) if record else None
+    
+    def installed(self, plugin_name: str, repo: str, digest: str):
+        """新版本安装完成，原来的版本成为可回滚的版本"""
+        with self._lock:
+            previous = self._index["installed"].get(plugin_name)
+            self._index["installed"][plugin_name] = {"repo": repo, "sha256": digest, "installed": time.time()}
+            if previous:
+                self._index["rollback"][plugin_name] = previous
+            else:
+                self._index["rollback"].pop(plugin_name, None)
+        self.save()
+    
+    def swapped(self, plugin_name: str):
+        """回滚完成，交换当前版本和可回滚版本的记录"""
+        with self._lock:
+            current = self._index["installed"].pop(plugin_name, None)
+            previous = self._index["rollback"].pop(plugin_name, None)
+            if previous:
+                self._index["installed"][plugin_name] = previous
+            if current:
+                self._index["rollback"][plugin_name] = current
+        self.save()
+    
+    def forget(self, plugin_name: str):
+        with self._lock:
+            self._index["installed"].pop(plugin_name, None)
+            self._index["rollback"].pop(plugin_name, None)
+        self.save()
+    
+    def save(self):
+        with self._lock:
+            payload = json.dumps(self._index, ensure_ascii=False, indent=2)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logging.error(f"保存插件安装包缓存索引失败: {str(e)}")
+
 class PluginManager:
-    def __init__(self, plugins_dir: str = "plugins"):
+    def __init__(self, plugins_dir: str = "plugins", api_base: Optional[str] = None,
+                 raw_base: Optional[str] = None, download_base: Optional[str] = None,
+                 cache_file: str = MARKET_CACHE_FILE, package_dir: str = PACKAGE_CACHE_DIR):
         self.plugins_dir = plugins_dir
-        self.github_base_url = "https://api.github.com/repos"
+        # GitHub 接口地址，可以指向本地模拟服务（见 api_hosts.py 和 bench/fake_github.py）
+        self.api_base = (api_base or api_hosts.GITHUB_API).rstrip("/")
+        self.raw_base = (raw_base or api_hosts.GITHUB_RAW).rstrip("/")
+        self.download_base = (download_base or api_hosts.GITHUB).rstrip("/")
+        self.github_base_url = f"{self.api_base}/repos"
+        self.cache = MarketCache(cache_file)
+        self.packages = PackageCache(package_dir)
+        self._install_lock = threading.Lock()
+        
+        # 并发获取 package.json 共用一个连接池
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MANIFEST_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         
         # 创建插件目录
         os.makedirs(plugins_dir, exist_ok=True)
     
-    def search_plugins(self, keyword: str = "") -> List[Dict[str, Any]]:
+    def search_plugins(self, keyword: str = "", offline: bool = False, refresh: bool = False) -> List[Dict[str, Any]]:
         """从GitHub搜索插件"""
+        return self.search(keyword, offline, refresh)[0]
+    
+    def search(self, keyword: str = "", offline: bool = False, refresh: bool = False) -> tuple:
+        """搜索插件，返回 (插件列表, 来源)
+        
+        搜索结果和各仓库的 package.json 都会缓存：未过期时直接使用，过期后带 ETag 重新验证；
+        package.json 由线程池并发获取。offline 为 True 或网络不可用时使用最后一次的缓存，
+        从未搜索过的关键词在所有缓存的仓库中按名称筛选。refresh 为 True 时忽略有效期。
+        """
+        entry = self.cache.get("searches", keyword)
+        source = SOURCE_CACHE
+        if offline:
+            repos, source = self._offline_repos(keyword, entry), SOURCE_OFFLINE
+        elif entry is not None and not refresh and MarketCache.is_fresh(entry, SEARCH_TTL):
+            repos = entry["value"]
+        else:
+            try:
+                repos, source = self._fetch_search(keyword, entry), SOURCE_NETWORK
+            except Exception as e:
+                logging.error(f"搜索插件时出错，使用缓存的结果: {str(e)}")
+                repos, source = self._offline_repos(keyword, entry), SOURCE_OFFLINE
+        
+        offline_manifests = source == SOURCE_OFFLINE
+        with ThreadPoolExecutor(max_workers=MANIFEST_WORKERS, thread_name_prefix="plugin-market") as executor:
+            manifests = list(executor.map(
+                lambda repo: self.get_plugin_package_info(repo['full_name'], offline=offline_manifests, refresh=refresh),
+                repos
+            ))
+        self.cache.save()
+        
+        plugins = []
+        for repo, package_info in zip(repos, manifests):
+            plugin_info = dict(repo)
+            if package_info:
+                plugin_info.update(package_info)
+            plugins.append(plugin_info)
+        return plugins, source
+    
+    def _fetch_search(self, keyword: str, entry: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """请求 GitHub 搜索接口（有缓存时发送条件请求），失败时抛出异常"""
+        # 这里可以扩展为从多个源搜索
+        # 目前只搜索GitHub上以bilibot_开头、_plugins结尾的仓库
+        params = {
+            'q': f'bilibot_plugins_{keyword} in:name fork:true',
+            'sort': 'stars',
+            'order': 'desc'
+        }
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers['If-None-Match'] = entry["etag"]
+        
+        response = self.session.get(f"{self.api_base}/search/repositories", params=params,
+                                    headers=headers, timeout=SEARCH_TIMEOUT)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch("searches", keyword)
+            return entry["value"]
+        if response.status_code != 200:
+            raise RuntimeError(f"搜索插件失败: {response.status_code}")
+        
+        repos = []
+        for repo in response.json().get('items', []):
+            repos.append({
+                'name': repo['name'],
+                'full_name': repo['full_name'],
+                'description': repo['description'],
+                'html_url': repo['html_url'],
+                'clone_url': repo['clone_url'],
+                'stars': repo['stargazers_count'],
+                'forks': repo['forks_count'],
+                'updated_at': repo['updated_at'],
+                'author': repo['owner']['login']
+            })
+        self.cache.put("searches", keyword, repos, response.headers.get('ETag'))
+        return repos
+    
+    def _offline_repos(self, keyword: str, entry: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """离线时的搜索结果：该关键词最后一次的结果，没有时在所有缓存的仓库中按名称筛选"""
+        if entry is not None:
+            return entry["value"]
+        keyword = keyword.lower()
+        repos = {}
+        for items in self.cache.values("searches"):
+            for repo in items or []:
+                if keyword in repo.get('name', '').lower():
+                    repos.setdefault(repo['full_name'], repo)
+        return sorted(repos.values(), key=lambda repo: repo.get('stars', 0), reverse=True)
+    
+    def get_plugin_package_info(self, repo_full_name: str, offline: bool = False,
+                                refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """获取插件的package.json信息（带缓存，仓库没有 package.json 的结果同样缓存）"""
+        entry = self.cache.get("manifests", repo_full_name)
+        if entry is not None and (offline or (not refresh and MarketCache.is_fresh(entry, MANIFEST_TTL))):
+            return entry["value"]
+        if offline:
+            return None
+        
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers['If-None-Match'] = entry["etag"]
         try:
-            # 这里可以扩展为从多个源搜索
-            # 目前只搜索GitHub上以bilibot_开头、_plugins结尾的仓库
-            search_url = f"https://api.github.com/search/repositories"
-            params = {
-                'q': f'bilibot_plugins_{keyword} in:name fork:true',
-                'sort': 'stars',
-                'order': 'desc'
-            }
-            
-            response = requests.get(search_url, params=params, timeout=10)
+            package_url = f"{self.raw_base}/{repo_full_name}/main/package.json"
+            response = self.session.get(package_url, headers=headers, timeout=MANIFEST_TIMEOUT)
+            if response.status_code == 304 and entry is not None:
+                self.cache.touch("manifests", repo_full_name)
+                return entry["value"]
             if response.status_code == 200:
-                data = response.json()
-                plugins = []
-                
-                for repo in data.get('items', []):
-                    plugin_info = {
-                        'name': repo['name'],
-                        'full_name': repo['full_name'],
-                        'description': repo['description'],
-                        'html_url': repo['html_url'],
-                        'clone_url': repo['clone_url'],
-                        'stars': repo['stargazers_count'],
-                        'forks': repo['forks_count'],
-                        'updated_at': repo['updated_at'],
-                        'author': repo['owner']['login']
-                    }
-                    
-                    # 尝试获取package.json信息
-                    package_info = self.get_plugin_package_info(repo['full_name'])
-                    if package_info:
-                        plugin_info.update(package_info)
-                    
-                    plugins.append(plugin_info)
-                
-                return plugins
-            else:
-                logging.error(f"搜索插件失败: {response.status_code}")
-                return []
+                try:
+                    value = response.json()
+                except ValueError:
+                    value = None
+                self.cache.put("manifests", repo_full_name, value, response.headers.get('ETag'))
+                return value
+            if response.status_code == 404:
+                self.cache.put("manifests", repo_full_name, None)
+                return None
+        except requests.RequestException:
+            pass
+        # 请求失败时使用过期的缓存
+        return entry["value"] if entry is not None else None
+    
+    def download_plugin(self, repo_full_name: str, plugin_name: str, sha256: Optional[str] = None) -> bool:
+        """下载并安装插件
+        
+        压缩包先保存到安装包缓存（未变化时不重新下载，网络不可用时使用缓存），解压到
+        plugins/.staging 中检查后再整体替换插件目录；原来的版本移到 plugins/.rollback，
+        可以用 rollback_plugin 恢复。sha256 用于指定压缩包的摘要，不一致时拒绝安装。
+        """
+        try:
+            digest = self._fetch_archive(repo_full_name, sha256)
+            if digest is None:
+                return False
+            
+            staging_dir = self._extract_archive(digest, plugin_name)
+            try:
+                # 检查必要的文件
+                if not (os.path.exists(os.path.join(staging_dir, "package.json")) and 
+                        os.path.exists(os.path.join(staging_dir, "main.py"))):
+                    logging.error("插件缺少必要的文件 (package.json 或 main.py)")
+                    return False
+                self._swap_in(plugin_name, staging_dir)
+            finally:
+                if os.path.exists(staging_dir):
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+            
+            self.packages.installed(plugin_name, repo_full_name, digest)
+            plugin_loader.manifests.invalidate(plugin_name)
+            logging.info(f"插件 {plugin_name} 下载安装成功 (sha256 {digest[:12]})")
+            return True
                 
         except Exception as e:
-            logging.error(f"搜索插件时出错: {str(e)}")
-            return []
+            logging.error(f"下载插件时出错: {str(e)}")
+            return False
     
-    def get_plugin_package_info(self, repo_full_name: str) -> Optional[Dict[str, Any]]:
-        """获取插件的package.json信息"""
+    def _fetch_archive(self, repo_full_name: str, sha256: Optional[str] = None) -> Optional[str]:
+        """取得仓库的压缩包，返回其在安装包缓存中的 sha256"""
+        if sha256 and self.packages.verify(sha256):
+            return sha256
+        
+        cached = self.packages.latest(repo_full_name)
+        if cached is not None and not self.packages.verify(cached["sha256"]):
+            cached = None
+        headers = {}
+        if cached is not None and cached.get("etag"):
+            headers['If-None-Match'] = cached["etag"]
+        
+        zip_url = f"{self.download_base}/{repo_full_name}/archive/refs/heads/main.zip"
         try:
-            package_url = f"https://raw.githubusercontent.com/{repo_full_name}/main/package.json"
-            response = requests.get(package_url, timeout=5)
-            if response.status_code == 200:
-                return response.json()
-        except:
-            pass
-        return None
+            with self.session.get(zip_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 304 and cached is not None:
+                    self.packages.touch(repo_full_name)
+                    digest = cached["sha256"]
+                elif response.status_code == 200:
+                    digest = self.packages.store(repo_full_name, response.iter_content(chunk_size=COPY_CHUNK),
+                                                 response.headers.get('ETag'))
+                else:
+                    logging.error(f"下载插件失败: {response.status_code}")
+                    return None
+        except requests.RequestException as e:
+            if cached is None:
+                raise
+            logging.warning(f"下载插件失败，使用缓存的安装包: {str(e)}")
+            digest = cached["sha256"]
+        
+        if sha256 and digest != sha256:
+            logging.error(f"插件安装包校验失败: 期望 sha256 {sha256}，实际为 {digest}")
+            return None
+        return digest
     
-    def download_plugin(self, repo_full_name: str, plugin_name: str) -> bool:
-        """下载并安装插件"""
+    def _extract_archive(self, digest: str, plugin_name: str) -> str:
+        """把压缩包逐个文件解压到 plugins/.staging 下的新目录，返回该目录
+        
+        GitHub 的源码压缩包所有文件位于 <仓库名>-main/ 目录下，解压时去掉这一层。
+        """
+        staging_root = os.path.join(self.plugins_dir, STAGING_DIR)
+        os.makedirs(staging_root, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=f"{plugin_name}-", dir=staging_root)
         try:
-            # 下载ZIP文件
-            zip_url = f"https://github.com/{repo_full_name}/archive/refs/heads/main.zip"
-            response = requests.get(zip_url, stream=True, timeout=30)
+            with zipfile.ZipFile(self.packages.path(digest), 'r') as zip_ref:
+                members = zip_ref.infolist()
+                tops = {m.filename.split('/', 1)[0] for m in members}
+                strip = len(tops) == 1 and all('/' in m.filename for m in members)
+                for member in members:
+                    name = member.filename.split('/', 1)[1] if strip else member.filename
+                    parts = [p for p in name.split('/') if p not in ('', '.')]
+                    if not parts:
+                        continue
+                    if '..' in parts or os.path.isabs(name) or ':' in parts[0]:
+                        raise ValueError(f"压缩包包含不安全的路径: {member.filename}")
+                    target = os.path.join(staging_dir, *parts)
+                    if member.is_dir():
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with zip_ref.open(member) as src, open(target, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, COPY_CHUNK)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        return staging_dir
+    
+    def _swap_in(self, plugin_name: str, new_dir: str):
+        """用 new_dir 替换插件目录，原来的目录成为可回滚的版本"""
+        plugin_dir = os.path.join(self.plugins_dir, plugin_name)
+        rollback_root = os.path.join(self.plugins_dir, ROLLBACK_DIR)
+        rollback_dir = os.path.join(rollback_root, plugin_name)
+        with self._install_lock:
+            if not os.path.exists(plugin_dir):
+                os.rename(new_dir, plugin_dir)
+                return
             
-            if response.status_code == 200:
-                # 创建临时目录
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    zip_path = os.path.join(temp_dir, f"{plugin_name}.zip")
-                    
-                    # 保存ZIP文件
-                    with open(zip_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    
-                    # 解压ZIP文件
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                    
-                    # 找到解压后的目录
-                    extracted_dir = os.path.join(temp_dir, f"{repo_full_name.split('/')[1]}-main")
-                    
-                    # 检查必要的文件
-                    if not (os.path.exists(os.path.join(extracted_dir, "package.json")) and 
-                            os.path.exists(os.path.join(extracted_dir, "main.py"))):
-                        logging.error("插件缺少必要的文件 (package.json 或 main.py)")
-                        return False
-                    
-                    # 复制到插件目录
-                    plugin_dir = os.path.join(self.plugins_dir, plugin_name)
-                    if os.path.exists(plugin_dir):
-                        shutil.rmtree(plugin_dir)
-                    
-                    shutil.copytree(extracted_dir, plugin_dir)
-                    
-                    logging.info(f"插件 {plugin_name} 下载安装成功")
-                    return True
-            else:
-                logging.error(f"下载插件失败: {response.status_code}")
-                print(18)
-                return False
+            os.makedirs(rollback_root, exist_ok=True)
+            # 更早的版本先移到临时目录，替换成功后再删除
+            discarded = None
+            if os.path.exists(rollback_dir):
+                discarded = os.path.join(os.path.dirname(new_dir), f"{plugin_name}-old-{time.time_ns()}")
+                os.rename(rollback_dir, discarded)
+            
+            try:
+                if exchange_paths(new_dir, plugin_dir):
+                    # 交换后 new_dir 中是原来的版本
+                    try:
+                        os.rename(new_dir, rollback_dir)
+                    except OSError:
+                        exchange_paths(new_dir, plugin_dir)
+                        raise
+                else:
+                    os.rename(plugin_dir, rollback_dir)
+                    try:
+                        os.rename(new_dir, plugin_dir)
+                    except OSError:
+                        os.rename(rollback_dir, plugin_dir)
+                        raise
+            except OSError:
+                # 替换失败：插件目录保持原样，恢复更早的版本
+                if discarded is not None:
+                    os.rename(discarded, rollback_dir)
+                raise
+            
+            if discarded is not None:
+                shutil.rmtree(discarded, ignore_errors=True)
+    
+    def rollback_plugin(self, plugin_name: str) -> bool:
+        """恢复插件被替换前的版本（不需要网络），再次调用可以恢复回来"""
+        try:
+            plugin_dir = os.path.join(self.plugins_dir, plugin_name)
+            rollback_dir = os.path.join(self.plugins_dir, ROLLBACK_DIR, plugin_name)
+            with self._install_lock:
+                if not os.path.isdir(rollback_dir):
+                    logging.error(f"插件 {plugin_name} 没有可回滚的版本")
+                    return False
                 
+                if not os.path.exists(plugin_dir):
+                    os.rename(rollback_dir, plugin_dir)
+                elif not exchange_paths(rollback_dir, plugin_dir):
+                    staging_root = os.path.join(self.plugins_dir, STAGING_DIR)
+                    os.makedirs(staging_root, exist_ok=True)
+                    current = os.path.join(staging_root, f"{plugin_name}-current-{time.time_ns()}")
+                    os.rename(plugin_dir, current)
+                    try:
+                        os.rename(rollback_dir, plugin_dir)
+                    except OSError:
+                        os.rename(current, plugin_dir)
+                        raise
+                    try:
+                        os.rename(current, rollback_dir)
+                    except OSError:
+                        # 恢复原状：当前版本放回插件目录，可回滚的版本放回 .rollback
+                        os.rename(plugin_dir, rollback_dir)
+                        os.rename(current, plugin_dir)
+                        raise
+            
+            self.packages.swapped(plugin_name)
+            plugin_loader.manifests.invalidate(plugin_name)
+            logging.info(f"插件 {plugin_name} 已回滚到上一个版本")
+            return True
         except Exception as e:
-            logging.error(f"下载插件时出错: {str(e)}")
-            print(19)
+            logging.error(f"回滚插件时出错: {str(e)}")
             return False
     
     def delete_plugin(self, plugin_name: str) -> bool:
@@ -130,8 +613,10 @@ class PluginManager:
             if os.path.exists(plugin_dir):
                 # 先卸载插件
                 plugin_loader.unload_plugin(plugin_name)
-                # 删除目录
+                # 删除目录（包括可回滚的版本）
                 shutil.rmtree(plugin_dir)
+                shutil.rmtree(os.path.join(self.plugins_dir, ROLLBACK_DIR, plugin_name), ignore_errors=True)
+                self.packages.forget(plugin_name)
                 logging.info(f"插件 {plugin_name} 删除成功")
                 return True
             else:
@@ -144,25 +629,11 @@ class PluginManager:
     def get_installed_plugins(self) -> List[Dict[str, Any]]:
         """获取已安装的插件列表"""
         plugins = []
-        plugin_names = plugin_loader.discover_plugins()
         
-        for plugin_name in plugin_names:
-            try:
-                plugin_path = os.path.join(self.plugins_dir, plugin_name)
-                package_json_path = os.path.join(plugin_path, "package.json")
-                
-                with open(package_json_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
-                plugin_info = {
-                    'name': plugin_name,
-                    'enabled': metadata.get('enabled', True),
-                    'metadata': metadata,
-                    'loaded': plugin_name in plugin_loader.plugins and plugin_loader.plugins[plugin_name].instance is not None
-                }
-                plugins.append(plugin_info)
-            except Exception as e:
-                logging.error(f"获取插件 {plugin_name} 信息失败: {str(e)}")
+        # 清单由插件加载器缓存，package.json 未修改时不会重新读取
+        for plugin_name, metadata in plugin_loader.manifests.scan().items():
+            if metadata is None:
+                logging.error(f"获取插件 {plugin_name} 信息失败: {plugin_loader.manifests.error(plugin_name)}")
                 # 添加一个基础信息
                 plugins.append({
                     'name': plugin_name,
@@ -170,28 +641,50 @@ class PluginManager:
                     'metadata': {'name': plugin_name, 'version': 'unknown'},
                     'loaded': False
                 })
+                continue
+            
+            plugins.append({
+                'name': plugin_name,
+                'enabled': metadata.get('enabled', True),
+                'metadata': metadata,
+                'loaded': self._is_loaded(plugin_name),
+                'lazy': self._is_lazy(plugin_name),
+                'rollback_available': self.has_rollback(plugin_name)
+            })
         
         return plugins
     
+    def has_rollback(self, plugin_name: str) -> bool:
+        return os.path.isdir(os.path.join(self.plugins_dir, ROLLBACK_DIR, plugin_name))
+    
+    @staticmethod
+    def _is_loaded(plugin_name: str) -> bool:
+        plugin = plugin_loader.plugins.get(plugin_name)
+        return plugin is not None and plugin.instance is not None
+    
+    @staticmethod
+    def _is_lazy(plugin_name: str) -> bool:
+        """是否为尚未被触发加载的延迟加载插件"""
+        plugin = plugin_loader.plugins.get(plugin_name)
+        return plugin is not None and plugin.lazy and plugin.instance is None
+    
     def get_plugin_info(self, plugin_name: str) -> Optional[Dict[str, Any]]:
         """获取插件详细信息"""
-        try:
-            plugin_path = os.path.join(self.plugins_dir, plugin_name)
-            package_json_path = os.path.join(plugin_path, "package.json")
-            
-            with open(package_json_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
-            return {
-                'name': plugin_name,
-                'enabled': metadata.get('enabled', True),
-                'metadata': metadata,
-                'loaded': plugin_name in plugin_loader.plugins and plugin_loader.plugins[plugin_name].instance is not None,
-                'path': plugin_path
-            }
-        except Exception as e:
-            logging.error(f"获取插件 {plugin_name} 信息失败: {str(e)}")
+        metadata = plugin_loader.manifests.get(plugin_name)
+        if metadata is None:
+            logging.error(f"获取插件 {plugin_name} 信息失败: {plugin_loader.manifests.error(plugin_name) or 'package.json 不存在'}")
             return None
+        
+        return {
+            'name': plugin_name,
+            'enabled': metadata.get('enabled', True),
+            'metadata': metadata,
+            'loaded': self._is_loaded(plugin_name),
+            'lazy': self._is_lazy(plugin_name),
+            'package': self.packages.record("installed", plugin_name),
+            'rollback': self.packages.record("rollback", plugin_name) if self.has_rollback(plugin_name) else None,
+            'path': os.path.join(self.plugins_dir, plugin_name)
+        }
     
     def update_plugin(self, plugin_name: str) -> bool:
         """更新插件"""
@@ -206,17 +699,19 @@ class PluginManager:
                 logging.error(f"插件 {plugin_name} 没有配置仓库地址")
                 return False
             
-            # 删除旧版本并重新下载
-            if self.delete_plugin(plugin_name):
-                # 从仓库地址提取repo_full_name
-                if repo_full_name.startswith('https://github.com/'):
-                    repo_full_name = repo_full_name[19:]  # 移除 'https://github.com/'
-                    if repo_full_name.endswith('.git'):
-                        repo_full_name = repo_full_name[:-4]
-                
-                return self.download_plugin(repo_full_name, plugin_name)
+            # 从仓库地址提取repo_full_name
+            if repo_full_name.startswith('https://github.com/'):
+                repo_full_name = repo_full_name[19:]  # 移除 'https://github.com/'
+                if repo_full_name.endswith('.git'):
+                    repo_full_name = repo_full_name[:-4]
             
-            return False
+            # 新版本下载解压成功后才替换，失败时旧版本保持不变
+            if not self.download_plugin(repo_full_name, plugin_name):
+                return False
+            # 已加载的插件换用新版本的代码
+            if plugin_name in plugin_loader.plugins:
+                return plugin_loader.reload_plugin(plugin_name)
+            return True
             
         except Exception as e:
             logging.error(f"更新插件时出错: {str(e)}")
@@ -0,0 +1,213 @@
+import base64
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import metrics
+
+# 插件资源统计和按需性能分析
+#
+# 插件的消息处理、事件处理和定时任务都通过 accounting.measure() 执行，按插件统计
+# 调用次数、运行时间、CPU 时间（当前线程的 thread_time）和异常。开启内存统计后，
+# 定期用 tracemalloc 快照把仍然存活的内存按调用栈归到各插件目录。
+# 面板可以对单个插件开启 cProfile 采集，停止时返回 pstats 结果，不需要重启机器人。
+#
+# async def 实现的处理函数在共享事件循环线程中运行，CPU 时间只统计到等待的线程；
+# 进程隔离插件的 CPU 和内存在工作进程中，这里只能统计到调用耗时。
+
+SOURCE_MESSAGE = "message"
+SOURCE_EVENT = "event"
+SOURCE_TASK = "task"
+
+# 内存统计需要的栈帧数：插件调用标准库或第三方库分配的内存也要能找到插件的栈帧
+MEMORY_TRACE_FRAMES = 16
+# pstats 文本结果默认输出的函数数
+DEFAULT_PROFILE_LIMIT = 50
+
+PLUGIN_INVOCATIONS = metrics.registry.counter("bot_plugin_invocations_total", "插件代码调用次数", ["plugin", "source"])
+PLUGIN_WALL = metrics.registry.counter("bot_plugin_wall_seconds_total", "插件代码累计运行时间", ["plugin", "source"])
+PLUGIN_CPU = metrics.registry.counter("bot_plugin_cpu_seconds_total", "插件代码累计CPU时间（调用线程）", ["plugin", "source"])
+PLUGIN_EXCEPTIONS = metrics.registry.counter("bot_plugin_exceptions_total", "插件代码抛出的异常数", ["plugin", "source", "exception"])
+PLUGIN_MEMORY = metrics.registry.gauge("bot_plugin_memory_bytes", "插件代码分配且仍存活的内存（tracemalloc）", ["plugin"])
+PLUGIN_MEMORY_DELTA = metrics.registry.gauge("bot_plugin_memory_delta_bytes", "与上一次内存统计相比的变化", ["plugin"])
+
+# 所有采集共用：同一时刻整个进程只启用一个 cProfile
+# （3.12 起 cProfile 基于 sys.monitoring，同时只能有一个分析器处于启用状态）
+_PROFILE_LOCK = threading.Lock()
+
+def attribute_memory(snapshot: "tracemalloc.Snapshot", paths: Dict[str, str]) -> Dict[str, int]:
+    """把快照中的内存按调用栈归到插件目录，paths 为 {插件名: 插件目录}
+
+    一次分配归到调用栈中离分配点最近的插件栈帧所在的插件。
+    """
+    # 栈帧中的文件名与加载时使用的路径一致（相对或绝对），两种形式都要匹配
+    prefixes = {}
+    for name, path in paths.items():
+        prefixes[os.path.join(path, "")] = name
+        prefixes[os.path.join(os.path.abspath(path), "")] = name
+    totals = {name: 0 for name in paths}
+    if not prefixes:
+        return totals
+    prefix_tuple = tuple(prefixes)
+    for trace in snapshot.traces:
+        for frame in trace.traceback:
+            if not frame.filename.startswith(prefix_tuple):
+                continue
+            for prefix, name in prefixes.items():
+                if frame.filename.startswith(prefix):
+                    totals[name] += trace.size
+                    break
+            break
+    return totals
+
+class ProfileCapture:
+    """一个插件的 cProfile 采集
+
+    整个进程同一时刻只启用一个 Profile，插件被并发调用（或同时采集多个插件）时
+    只分析其中一个调用，其余调用照常执行并计入 skipped_calls（相当于采样）。
+    Python 3.12 及以上的 cProfile 基于进程级的 sys.monitoring，启用期间其他线程
+    的调用也会被记录，结果中可能出现同时运行的其他插件或机器人自身的函数。
+    """
+
+    def __init__(self, plugin: str):
+        self.plugin = plugin
+        self.profile = cProfile.Profile()
+        self.started = time.time()
+        self.profiled_calls = 0
+        self.skipped_calls = 0
+
+    def acquire(self) -> bool:
+        """尝试为本次调用启用分析器，不能启用时返回 False，调用照常执行"""
+        # 当前线程已有其他分析器（如调试器）时不启用
+        if sys.getprofile() is not None or not _PROFILE_LOCK.acquire(blocking=False):
+            self.skipped_calls += 1
+            return False
+        try:
+            self.profile.enable()
+        except ValueError:
+            # 其他分析工具已占用 sys.monitoring（3.12+）
+            _PROFILE_LOCK.release()
+            self.skipped_calls += 1
+            return False
+        self.profiled_calls += 1
+        return True
+
+    def release(self):
+        self.profile.disable()
+        _PROFILE_LOCK.release()
+
+    def result(self, sort: str = "cumulative", limit: int = DEFAULT_PROFILE_LIMIT) -> Dict[str, Any]:
+        """pstats 文本结果和原始数据（base64 编码的 marshal，可用 pstats.Stats 或 snakeviz 打开）"""
+        with _PROFILE_LOCK:
+            self.profile.create_stats()
+            stats_data = dict(self.profile.stats)
+        result = {
+            "plugin": self.plugin,
+            "started": self.started,
+            "seconds": round(time.time() - self.started, 3),
+            "profiled_calls": self.profiled_calls,
+            "skipped_calls": self.skipped_calls,
+            "stats": "",
+            "raw": base64.b64encode(marshal.dumps(stats_data)).decode("ascii"),
+        }
+        if stats_data:
+            out = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=out)
+            stats.strip_dirs().sort_stats(sort).print_stats(limit)
+            result["stats"] = out.getvalue()
+        return result
+
+class PluginAccounting:
+    """按插件统计资源占用，管理 cProfile 采集"""
+
+    def __init__(self):
+        self._captures: Dict[str, ProfileCapture] = {}
+        self._lock = threading.Lock()
+        self._memory: Dict[str, int] = {}
+        self.memory_tracking = False
+
+    @contextmanager
+    def measure(self, plugin: str, source: str):
+        """统计一次插件调用；该插件正在采集时在 cProfile 下执行"""
+        capture = self._captures.get(plugin)
+        profiling = capture is not None and capture.acquire()
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            yield
+        except Exception as e:
+            PLUGIN_EXCEPTIONS.labels(plugin, source, type(e).__name__).inc()
+            raise
+        finally:
+            if profiling:
+                capture.release()
+            PLUGIN_CPU.labels(plugin, source).inc(max(0.0, time.thread_time() - cpu_started))
+            PLUGIN_WALL.labels(plugin, source).inc(time.perf_counter() - started)
+            PLUGIN_INVOCATIONS.labels(plugin, source).inc()
+
+    # 性能分析
+
+    def start_profile(self, plugin: str) -> bool:
+        """开始采集，已在采集时返回 False"""
+        with self._lock:
+            if plugin in self._captures:
+                return False
+            self._captures[plugin] = ProfileCapture(plugin)
+        return True
+
+    def stop_profile(self, plugin: str, sort: str = "cumulative",
+                     limit: int = DEFAULT_PROFILE_LIMIT) -> Optional[Dict[str, Any]]:
+        """停止采集并返回结果，没有在采集时返回 None"""
+        with self._lock:
+            capture = self._captures.pop(plugin, None)
+        if capture is None:
+            return None
+        return capture.result(sort, limit)
+
+    def profiling(self) -> List[Dict[str, Any]]:
+        """正在采集的插件"""
+        with self._lock:
+            captures = list(self._captures.values())
+        return [{
+            "plugin": c.plugin,
+            "seconds": round(time.time() - c.started, 3),
+            "profiled_calls": c.profiled_calls,
+            "skipped_calls": c.skipped_calls,
+        } for c in captures]
+
+    # 内存统计
+
+    def enable_memory_tracking(self):
+        """开始跟踪内存分配（会让所有内存分配变慢，只在需要时开启）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        self.memory_tracking = True
+
+    def disable_memory_tracking(self):
+        if self.memory_tracking and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory_tracking = False
+
+    def sample_memory(self, paths: Dict[str, str]) -> Dict[str, int]:
+        """统计各插件仍然存活的内存并更新指标，paths 为 {插件名: 插件目录}"""
+        if not (self.memory_tracking and tracemalloc.is_tracing()):
+            return {}
+        totals = attribute_memory(tracemalloc.take_snapshot(), paths)
+        for name, size in totals.items():
+            PLUGIN_MEMORY.labels(name).set(size)
+            PLUGIN_MEMORY_DELTA.labels(name).set(size - self._memory.get(name, size))
+        for name in set(self._memory) - set(totals):
+            PLUGIN_MEMORY.remove(name)
+            PLUGIN_MEMORY_DELTA.remove(name)
+        self._memory = totals
+        return totals
+
+# 全局插件资源统计
+accounting = PluginAccounting()
@@ -0,0 +1,243 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+# 插件目录监视
+#
+# 监视 plugins/<插件名>/ 下的代码（*.py）和 package.json，发生变化的插件在
+# 防抖时间内没有新的修改后回调一次（通常是 PluginLoader.hot_swap）。
+# Linux 上使用 inotify（通过 ctypes 调用，无需额外依赖），其他系统或 inotify
+# 不可用时退化为定时比较文件的 mtime 和大小。插件自己写入的数据文件
+# （数据库、缓存快照、config.json 等）不会触发重新加载。
+
+# 最后一次修改后等待多久再重新加载（秒），编辑器保存、解压安装包通常会连续写多个文件
+DEFAULT_DEBOUNCE = 0.5
+# 轮询模式下检查文件的间隔（秒）
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify 事件掩码（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+def is_watched_file(filename: str) -> bool:
+    """会触发重新加载的文件：插件代码和清单"""
+    return filename.endswith(".py") or filename == "package.json"
+
+def _skip_dir(dirname: str) -> bool:
+    return dirname.startswith(".") or dirname == "__pycache__"
+
+class _InotifyBackend:
+    """基于 inotify 的递归监视"""
+
+    def __init__(self, plugins_dir: str):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.fd = fd
+        self.plugins_dir = os.path.abspath(plugins_dir)
+        # 监视描述符 -> 目录
+        self._watches: Dict[int, str] = {}
+        self._add_tree(self.plugins_dir)
+
+    def _add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            # 目录在添加前已被删除时忽略
+            if errno != 2:
+                logging.warning(f"无法监视目录 {path}: {os.strerror(errno)}")
+            return
+        self._watches[wd] = path
+
+    def _add_tree(self, root: str):
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not _skip_dir(d)]
+            self._add_watch(dirpath)
+
+    def _plugin_name(self, path: str) -> Optional[str]:
+        relative = os.path.relpath(path, self.plugins_dir)
+        if relative == "." or relative.startswith(".."):
+            return None
+        return relative.split(os.sep, 1)[0]
+
+    def poll(self, timeout: float) -> Set[str]:
+        """等待最多 timeout 秒，返回有变化的插件名"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            filename = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            directory = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if directory is None:
+                continue
+            path = os.path.join(directory, filename) if filename else directory
+            name = self._plugin_name(path)
+            if mask & IN_ISDIR:
+                if _skip_dir(filename):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目录（包括新安装的插件）也要监视，其中已有的文件视为变化
+                    self._add_tree(path)
+                if name:
+                    changed.add(name)
+                continue
+            if mask & IN_DELETE_SELF:
+                if name:
+                    changed.add(name)
+                continue
+            if name and is_watched_file(filename):
+                changed.add(name)
+        return changed
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+class _PollingBackend:
+    """定时比较文件 mtime 和大小"""
+
+    def __init__(self, plugins_dir: str, interval: float = DEFAULT_POLL_INTERVAL):
+        self.plugins_dir = plugins_dir
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Dict[str, Tuple[int, int]]]:
+        """{插件名: {文件路径: (mtime_ns, 大小)}}"""
+        snapshot = {}
+        try:
+            entries = [e for e in os.scandir(self.plugins_dir) if e.is_dir() and not _skip_dir(e.name)]
+        except OSError:
+            return snapshot
+        for entry in entries:
+            files = {}
+            for dirpath, dirnames, filenames in os.walk(entry.path):
+                dirnames[:] = [d for d in dirnames if not _skip_dir(d)]
+                for filename in filenames:
+                    if not is_watched_file(filename):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+            snapshot[entry.name] = files
+        return snapshot
+
+    def poll(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {name for name in set(snapshot) | set(self._snapshot)
+                   if snapshot.get(name) != self._snapshot.get(name)}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+class PluginWatcher:
+    """监视插件目录，防抖后对发生变化的插件调用 callback(插件名)"""
+
+    def __init__(self, plugins_dir: str, callback: Callable[[str], object],
+                 debounce: float = DEFAULT_DEBOUNCE, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 use_inotify: bool = True):
+        self.plugins_dir = plugins_dir
+        self.callback = callback
+        self.debounce = max(0.0, debounce)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.backend_name = None
+        self._backend = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _create_backend(self):
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                backend = _InotifyBackend(self.plugins_dir)
+                self.backend_name = "inotify"
+                return backend
+            except (OSError, AttributeError) as e:
+                logging.warning(f"inotify 不可用，改用轮询监视插件目录: {str(e)}")
+        self.backend_name = "polling"
+        return _PollingBackend(self.plugins_dir, self.poll_interval)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._backend = self._create_backend()
+        self._thread = threading.Thread(target=self._run, name="plugin-watcher", daemon=True)
+        self._thread.start()
+        logging.info(f"插件热重载已开启（{self.backend_name}），监视目录: {self.plugins_dir}")
+
+    def stop(self, timeout: float = 2):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+    def _run(self):
+        # 插件名 -> 最后一次变化的时间（time.monotonic()）
+        pending: Dict[str, float] = {}
+        while not self._stopped.is_set():
+            if pending:
+                timeout = max(0.0, min(pending.values()) + self.debounce - time.monotonic())
+            else:
+                timeout = self.poll_interval
+            try:
+                changed = self._backend.poll(timeout)
+            except Exception as e:
+                logging.error(f"监视插件目录失败: {str(e)}")
+                self._stopped.wait(self.poll_interval)
+                continue
+            now = time.monotonic()
+            for name in changed:
+                pending[name] = now
+            for name, changed_at in list(pending.items()):
+                if now - changed_at < self.debounce or self._stopped.is_set():
+                    continue
+                del pending[name]
+                try:
+                    self.callback(name)
+                except Exception as e:
+                    logging.error(f"重新加载插件 {name} 失败: {str(e)}")
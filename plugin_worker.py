@@ -0,0 +1,306 @@
+import importlib.util
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+import metrics
+
+# 进程隔离插件
+#
+# package.json 中声明 "isolation": "process" 的插件不会在机器人进程中执行，
+# 而是在独立的工作进程中加载，通过管道转发 process_message、事件和指标收集：
+#
+#   "isolation": "process",
+#   "workers": 2,                                     # 工作进程数，默认1
+#   "limits": {"memory_mb": 512, "cpu_seconds": 600}  # 可选，仅类Unix系统有效
+#
+# 工作进程崩溃、超时或超出资源限制后会被自动重启。插件在工作进程中拿不到
+# bot_manager 和 config_manager，发送消息等需要机器人对象的功能不可用。
+#
+# 工作进程以 spawn 方式启动，会重新导入主模块，入口脚本必须使用
+# if __name__ == "__main__": 保护启动代码（index.py 已满足）。
+
+# 工作进程启动（加载插件并执行 on_load）的最长等待时间（秒）
+WORKER_START_TIMEOUT = 30
+# 工作进程连续启动失败后的重试间隔上限（秒）
+MAX_RESTART_BACKOFF = 60
+
+WORKER_RESTARTS = metrics.registry.counter("bot_plugin_worker_restarts_total", "插件工作进程重启次数", ["plugin", "reason"])
+WORKERS_ALIVE = metrics.registry.gauge("bot_plugin_workers_alive", "存活的插件工作进程数", ["plugin"])
+
+class PluginWorkerError(Exception):
+    """工作进程调用失败"""
+
+class PluginWorkerTimeout(PluginWorkerError):
+    """工作进程调用超时（工作进程会被重启）"""
+
+class PluginWorkerBusy(PluginWorkerError):
+    """没有空闲的工作进程"""
+
+def _apply_limits(limits: Dict[str, Any]):
+    """设置工作进程的资源限制"""
+    try:
+        import resource
+    except ImportError:
+        return
+    memory_mb = limits.get("memory_mb")
+    if memory_mb:
+        size = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    cpu_seconds = limits.get("cpu_seconds")
+    if cpu_seconds:
+        # 超过软限制时收到 SIGXCPU 退出，由主进程重启
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds) + 5))
+
+def _worker_main(conn, name: str, path: str, metadata: Dict[str, Any], limits: Dict[str, Any]):
+    """工作进程入口：加载插件，循环处理主进程的调用请求"""
+    import bot_logger
+    bot_logger.setup()
+    log = logging.getLogger(f"plugin.{name}")
+
+    try:
+        _apply_limits(limits)
+        if path not in sys.path:
+            sys.path.append(path)
+        spec = importlib.util.spec_from_file_location(f"plugins.{name}", os.path.join(path, "main.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[f"plugins.{name}"] = module
+        spec.loader.exec_module(module)
+        instance = module.Plugin(bot_manager=None, config_manager=None, plugin_config=metadata)
+        if hasattr(instance, "on_load"):
+            instance.on_load()
+    except BaseException as e:
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            method, args = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break
+        if method == "shutdown":
+            try:
+                if hasattr(instance, "on_unload"):
+                    instance.on_unload()
+            except Exception as e:
+                log.error(f"插件 {name} 卸载失败: {str(e)}")
+            conn.send((True, None))
+            break
+        try:
+            handler = getattr(instance, method, None)
+            result = handler(*args) if callable(handler) else None
+            conn.send((True, result))
+        except Exception as e:
+            log.debug(traceback.format_exc())
+            try:
+                conn.send((False, f"{type(e).__name__}: {e}"))
+            except Exception:
+                # 返回值无法序列化等情况
+                conn.send((False, "返回值无法传回主进程"))
+
+class _Worker:
+    """一个工作进程及其管道"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.busy = False
+        self.failures = 0
+        self.next_start = 0.0
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def stop(self, timeout: float = 2):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(1)
+        self.process = None
+        self.conn = None
+
+class ProcessPluginHost:
+    """管理一个插件的工作进程池"""
+
+    def __init__(self, name: str, path: str, metadata: Dict[str, Any]):
+        self.name = name
+        self.path = os.path.abspath(path)
+        self.metadata = metadata
+        self.limits = metadata.get("limits") or {}
+        self.workers = [_Worker(i) for i in range(max(1, int(metadata.get("workers", 1))))]
+        self._context = multiprocessing.get_context("spawn")
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def start(self) -> bool:
+        """启动全部工作进程，至少一个启动成功时返回 True"""
+        started = sum(1 for worker in self.workers if self._start_worker(worker))
+        return started > 0
+
+    def _start_worker(self, worker: _Worker) -> bool:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.name, self.path, self.metadata, self.limits),
+            name=f"plugin-{self.name}-{worker.index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+
+        status, detail = "failed", "启动超时"
+        try:
+            if parent_conn.poll(WORKER_START_TIMEOUT):
+                status, detail = parent_conn.recv()
+        except (EOFError, OSError) as e:
+            detail = f"工作进程退出: {e}"
+
+        if status != "ready":
+            logging.error(f"插件 {self.name} 工作进程 {worker.index} 启动失败: {detail}")
+            worker.stop(timeout=0)
+            worker.failures += 1
+            worker.next_start = time.monotonic() + min(2 ** worker.failures, MAX_RESTART_BACKOFF)
+            self._update_alive()
+            return False
+
+        worker.failures = 0
+        logging.info(f"插件 {self.name} 工作进程 {worker.index} 已启动 (pid {detail})")
+        self._update_alive()
+        return True
+
+    def _restart_worker(self, worker: _Worker, reason: str):
+        WORKER_RESTARTS.labels(self.name, reason).inc()
+        logging.warning(f"插件 {self.name} 工作进程 {worker.index} {reason}，正在重启")
+        worker.stop(timeout=0)
+        if not self._closed:
+            self._start_worker(worker)
+
+    def _update_alive(self):
+        WORKERS_ALIVE.labels(self.name).set(sum(1 for w in self.workers if w.alive()))
+
+    def _acquire(self, timeout: Optional[float], worker: Optional[_Worker] = None) -> Optional[_Worker]:
+        """占用一个空闲工作进程（或指定的工作进程）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                # 优先使用存活的工作进程
+                candidates = [worker] if worker else sorted(self.workers, key=lambda w: not w.alive())
+                for candidate in candidates:
+                    if not candidate.busy:
+                        candidate.busy = True
+                        return candidate
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        return None
+
+    def _release(self, worker: _Worker):
+        with self._cond:
+            worker.busy = False
+            self._cond.notify_all()
+
+    def _call_worker(self, worker: _Worker, method: str, args: tuple, timeout: Optional[float]):
+        if not worker.alive():
+            if time.monotonic() < worker.next_start:
+                raise PluginWorkerError("工作进程不可用，等待重启")
+            self._restart_worker(worker, "exited")
+            if not worker.alive():
+                raise PluginWorkerError("工作进程重启失败")
+
+        try:
+            worker.conn.send((method, args))
+            if not worker.conn.poll(timeout):
+                self._restart_worker(worker, "timeout")
+                raise PluginWorkerTimeout(f"{method} 超过 {timeout}s 未返回")
+            ok, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self._restart_worker(worker, "crashed")
+            raise PluginWorkerError(f"工作进程异常退出: {e}")
+
+        if not ok:
+            raise PluginWorkerError(payload)
+        return payload
+
+    def call(self, method: str, *args, timeout: Optional[float] = None):
+        """在任一空闲工作进程中调用插件方法"""
+        worker = self._acquire(timeout)
+        if worker is None:
+            raise PluginWorkerBusy(f"插件 {self.name} 没有空闲的工作进程")
+        try:
+            return self._call_worker(worker, method, args, timeout)
+        finally:
+            self._release(worker)
+
+    def broadcast(self, method: str, *args, timeout: Optional[float] = None) -> List[Any]:
+        """在每个工作进程中调用插件方法（用于事件，各工作进程的插件状态相互独立）"""
+        results = []
+        for worker in self.workers:
+            if self._acquire(timeout, worker) is None:
+                continue
+            try:
+                results.append(self._call_worker(worker, method, args, timeout))
+            except PluginWorkerError as e:
+                logging.error(f"插件 {self.name} 工作进程 {worker.index} 处理 {method} 失败: {str(e)}")
+            finally:
+                self._release(worker)
+        return results
+
+    def shutdown(self, timeout: float = 5):
+        """通知工作进程执行 on_unload 后退出"""
+        for worker in self.workers:
+            if self._acquire(timeout, worker) is None:
+                continue
+            try:
+                if worker.alive():
+                    worker.conn.send(("shutdown", ()))
+                    if worker.conn.poll(timeout):
+                        worker.conn.recv()
+            except (EOFError, OSError):
+                pass
+            finally:
+                worker.stop()
+                self._release(worker)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._update_alive()
+
+class ProcessPluginProxy:
+    """放在 Plugin.instance 上的代理对象，接口与进程内插件实例一致"""
+
+    def __init__(self, host: ProcessPluginHost, timeout: Optional[float] = None):
+        self.host = host
+        self.name = host.name
+        self.timeout = timeout
+
+    def process_message(self, message_data: Dict[str, Any]) -> Optional[str]:
+        return self.host.call("process_message", message_data, timeout=self.timeout)
+
+    def emit_event(self, event_type: str, data: Any = None):
+        self.host.broadcast("emit_event", event_type, data, timeout=self.timeout)
+
+    def collect_metrics(self) -> Dict[str, Any]:
+        return self.host.call("collect_metrics", timeout=self.timeout) or {}
+
+    def create_dashboard_data(self) -> Dict[str, Any]:
+        return self.host.call("create_dashboard_data", timeout=self.timeout) or {}
+
+    def handle_api_request(self, path: str, method: str, data: Any = None) -> Any:
+        return self.host.call("handle_api_request", path, method, data, timeout=self.timeout)
+
+    def on_unload(self):
+        self.host.shutdown()
@@ -2,6 +2,8 @@ let layuiForm = null;
 // 插件商店功能
 let currentPluginSearchKeyword = '';
 let installedPlugins = [];
+let profilingPlugins = new Set();
+let lastPluginProfile = null;
 let onlinePlugins = [];
 
 // 配置marked选项（如果还没有配置的话）
@@ -120,6 +122,18 @@ function updateInstalledPluginsList() {
                             class="px-3 py-1 text-sm bg-blue-600 hover:bg-blue-700 text-white rounded transition">
                         重载
                     </button>
+                    ${plugin.loaded ? `
+                    <button onclick="togglePluginProfile('${plugin.name}')" 
+                            class="px-3 py-1 text-sm ${profilingPlugins.has(plugin.name) ? 'bg-purple-700 hover:bg-purple-800' : 'bg-purple-600 hover:bg-purple-700'} text-white rounded transition">
+                        ${profilingPlugins.has(plugin.name) ? '<i class="fa fa-circle text-red-300 mr-1"></i>停止分析' : '性能分析'}
+                    </button>
+                    ` : ''}
+                    ${plugin.rollback_available ? `
+                    <button onclick="rollbackPlugin('${plugin.name}')" 
+                            class="px-3 py-1 text-sm bg-gray-600 hover:bg-gray-700 text-white rounded transition">
+                        回滚
+                    </button>
+                    ` : ''}
                     <button onclick="uninstallPlugin('${plugin.name}')" 
                             class="px-3 py-1 text-sm bg-red-600 hover:bg-red-700 text-white rounded transition">
                         卸载
@@ -146,6 +160,9 @@ function updateInstalledPluginsList() {
                 </div>
             </div>
             
+            ${plugin.stats ? renderPluginStats(plugin.stats) : ''}
+            ${plugin.load_report ? renderPluginLoadReport(plugin.load_report) : ''}
+            
             ${plugin.metadata.dependencies && plugin.metadata.dependencies.length > 0 ? `
             <div class="mt-3 pt-3 border-t border-gray-200">
                 <h5 class="text-sm font-medium text-gray-700 mb-2">依赖:</h5>
@@ -160,6 +177,119 @@ function updateInstalledPluginsList() {
     `).join('');
 }
 
+// 插件运行统计
+function renderPluginStats(stats) {
+    const formatBytes = bytes => {
+        if (bytes === null || bytes === undefined) return '-';
+        const sign = bytes < 0 ? '-' : '';
+        bytes = Math.abs(bytes);
+        if (bytes >= 1024 * 1024) return `${sign}${(bytes / 1024 / 1024).toFixed(1)} MB`;
+        return `${sign}${(bytes / 1024).toFixed(1)} KB`;
+    };
+    const items = [
+        ['调用次数', stats.calls],
+        ['平均耗时', stats.avg_ms !== null ? `${stats.avg_ms} ms` : '-'],
+        ['累计耗时', `${stats.wall_seconds} s`],
+        ['CPU时间', `${stats.cpu_seconds} s`],
+        ['异常', stats.exceptions],
+        ['超时', stats.timeouts],
+        ['内存', formatBytes(stats.memory_bytes)],
+        ['内存变化', formatBytes(stats.memory_delta_bytes)]
+    ];
+    return `
+            <div class="mt-3 pt-3 border-t border-gray-200">
+                <div class="grid grid-cols-2 md:grid-cols-4 gap-2 text-sm">
+                    ${items.map(([label, value]) => `
+                        <div>
+                            <span class="text-gray-600">${label}:</span>
+                            <span class="ml-1 font-medium">${value}</span>
+                        </div>
+                    `).join('')}
+                </div>
+            </div>
+    `;
+}
+
+// 插件加载报告（机器人启动时的加载耗时和内存）
+function renderPluginLoadReport(report) {
+    const statusText = { loaded: '已加载', lazy: '等待首次触发', disabled: '已禁用', failed: '加载失败' };
+    const parts = [statusText[report.status] || report.status];
+    if (report.seconds !== null && report.seconds !== undefined) {
+        parts.push(`耗时 ${(report.seconds * 1000).toFixed(1)} ms`);
+    }
+    if (report.memory_bytes !== null && report.memory_bytes !== undefined) {
+        parts.push(`内存 ${(report.memory_bytes / 1024).toFixed(1)} KB`);
+    }
+    if (report.error) {
+        parts.push(report.error);
+    }
+    return `
+            <div class="mt-2 text-xs text-gray-500">
+                加载: ${parts.join(' · ')}
+            </div>
+    `;
+}
+
+// 开始/停止插件性能分析
+function togglePluginProfile(pluginName) {
+    const action = profilingPlugins.has(pluginName) ? 'stop' : 'start';
+    fetch('/api/plugins/profile', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ plugin_name: pluginName, action: action })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            showNotification(data.message, 'error');
+            // 例如机器人重启后采集已不存在
+            if (action === 'stop') profilingPlugins.delete(pluginName);
+            updateInstalledPluginsList();
+            return;
+        }
+        if (data.profiling) {
+            profilingPlugins.add(pluginName);
+            showNotification(data.message, 'success');
+        } else {
+            profilingPlugins.delete(pluginName);
+            showPluginProfileModal(data.profile);
+        }
+        updateInstalledPluginsList();
+    })
+    .catch(error => {
+        console.error('插件性能分析失败:', error);
+        showNotification('插件性能分析失败', 'error');
+    });
+}
+
+function showPluginProfileModal(profile) {
+    lastPluginProfile = profile;
+    document.getElementById('plugin-profile-title').textContent = `性能分析结果 - ${profile.plugin}`;
+    document.getElementById('plugin-profile-summary').textContent =
+        `采集 ${profile.seconds} 秒，分析 ${profile.profiled_calls} 次调用，跳过 ${profile.skipped_calls} 次并发调用`;
+    document.getElementById('plugin-profile-stats').textContent = profile.stats || '采集期间插件没有被调用';
+    document.getElementById('plugin-profile-modal').classList.remove('hidden');
+}
+
+function hidePluginProfileModal() {
+    document.getElementById('plugin-profile-modal').classList.add('hidden');
+}
+
+// 下载原始数据，可用 python -m pstats 或 snakeviz 打开
+function downloadPluginProfile() {
+    if (!lastPluginProfile) return;
+    const binary = atob(lastPluginProfile.raw);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    const link = document.createElement('a');
+    link.href = URL.createObjectURL(new Blob([bytes], { type: 'application/octet-stream' }));
+    link.download = `${lastPluginProfile.plugin}.prof`;
+    link.click();
+    setTimeout(() => URL.revokeObjectURL(link.href), 1000);
+}
+
 // 搜索插件
 function searchPlugins() {
     const keyword = document.getElementById('plugin-search').value;
@@ -187,6 +317,7 @@ function searchPlugins() {
             if (data.success) {
                 onlinePlugins = data.plugins;
                 updateOnlinePluginsList();
+                notifyMarketSource(data.source);
             } else {
                 showNotification('搜索插件失败', 'error');
                 document.getElementById('online-plugins-list').innerHTML = `
@@ -202,6 +333,13 @@ function searchPlugins() {
         });
 }
 
+// 插件市场不可用时提示正在显示本地缓存
+function notifyMarketSource(source) {
+    if (source === 'offline') {
+        showNotification('无法连接插件市场，显示的是本地缓存的结果', 'warning');
+    }
+}
+
 // 更新在线插件列表
 function updateOnlinePluginsList() {
     const container = document.getElementById('online-plugins-list');
@@ -292,6 +430,7 @@ function getPluginList() {
             if (data.success) {
                 onlinePlugins = data.plugins;
                 updateOnlinePluginsList();
+                notifyMarketSource(data.source);
             } else {
                 showNotification('获取插件失败', 'error');
                 document.getElementById('online-plugins-list').innerHTML = `
@@ -413,6 +552,32 @@ function reloadPlugin(pluginName) {
     });
 }
 
+// 回滚插件到上一个版本
+function rollbackPlugin(pluginName) {
+    layer.confirm(`确定要把插件 "${pluginName}" 回滚到上一个版本吗？再次回滚可以恢复当前版本。`, {
+        icon: 3,
+        title: '确认回滚'
+    }, function(index) {
+        fetch('/api/plugins/rollback', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ plugin_name: pluginName })
+        })
+        .then(response => response.json())
+        .then(data => {
+            showNotification(data.message, data.success ? 'success' : 'error');
+            if (data.success) {
+                loadInstalledPlugins();
+            }
+        })
+        .catch(error => {
+            console.error('回滚插件失败:', error);
+            showNotification('回滚插件失败', 'error');
+        });
+        layer.close(index);
+    });
+}
+
 // 格式化日期
 function formatDate(dateString) {
     if (!dateString) return '未知';
@@ -522,6 +687,8 @@ function showSection(sectionId) {
 function startLogPolling() {
     if (window.logInterval) clearInterval(window.logInterval);
     fetchLogs();
+    // 实时事件流可用时由推送更新日志，不再轮询
+    if (eventStreamConnected) return;
     window.logInterval = setInterval(fetchLogs, 2000);
 }
 
@@ -3052,51 +3219,101 @@ if (editAccountForm) {
     });
 }
 
+// 实时事件流（SSE）
+const MAX_STREAM_LOGS = 500;
+let eventStream = null;
+let eventStreamConnected = false;
+
+function initEventStream() {
+    if (!window.EventSource) {
+        startFallbackPolling();
+        return;
+    }
+    
+    eventStream = new EventSource('/api/stream');
+    
+    eventStream.onopen = function() {
+        eventStreamConnected = true;
+        stopFallbackPolling();
+        if (window.logInterval) {
+            clearInterval(window.logInterval);
+            window.logInterval = null;
+        }
+    };
+    
+    eventStream.onerror = function() {
+        // 连接断开时退回轮询，EventSource 会自动重连
+        if (eventStreamConnected) {
+            eventStreamConnected = false;
+            startFallbackPolling();
+        }
+    };
+    
+    eventStream.addEventListener('log', function(e) {
+        currentLogs.push(JSON.parse(e.data));
+        if (currentLogs.length > MAX_STREAM_LOGS) {
+            currentLogs = currentLogs.slice(-MAX_STREAM_LOGS);
+        }
+        if (isSectionVisible('logs')) renderLogs();
+    });
+    
+    eventStream.addEventListener('cleared', function() {
+        currentLogs = [];
+        if (isSectionVisible('logs')) renderLogs();
+    });
+    
+    eventStream.addEventListener('dropped', function() {
+        // 推送缓冲区溢出，重新拉取完整日志
+        if (isSectionVisible('logs')) fetchLogs();
+    });
+    
+    eventStream.addEventListener('status', function(e) {
+        applyBotStatus(JSON.parse(e.data));
+    });
+    
+    eventStream.addEventListener('stats', function(e) {
+        applySystemStats(JSON.parse(e.data));
+    });
+    
+    eventStream.addEventListener('metrics', function(e) {
+        applyBotMetrics(JSON.parse(e.data));
+    });
+}
+
+function isSectionVisible(sectionId) {
+    const section = document.getElementById(sectionId);
+    return section && section.style.display !== 'none';
+}
+
+function startFallbackPolling() {
+    if (!window.statusInterval) window.statusInterval = setInterval(fetchBotStatus, 3000);
+    if (!window.statsInterval) window.statsInterval = setInterval(updateSystemStats, 2000);
+    if (!window.metricsInterval) window.metricsInterval = setInterval(fetchBotMetrics, 5000);
+    if (isSectionVisible('logs') && !window.logInterval) {
+        window.logInterval = setInterval(fetchLogs, 2000);
+    }
+}
+
+function stopFallbackPolling() {
+    if (window.statusInterval) {
+        clearInterval(window.statusInterval);
+        window.statusInterval = null;
+    }
+    if (window.statsInterval) {
+        clearInterval(window.statsInterval);
+        window.statsInterval = null;
+    }
+    if (window.metricsInterval) {
+        clearInterval(window.metricsInterval);
+        window.metricsInterval = null;
+    }
+}
+
 // 获取机器人状态
 function fetchBotStatus() {
     fetch('/api/bot_status')
         .then(response => response.json())
-        .then(data => {
-            // 更新状态显示
-            const statusText = document.getElementById('status-text');
-            const startBtn = document.getElementById('start-btn');
-            const stopBtn = document.getElementById('stop-btn');
-            const restartBtn = document.getElementById('restart-btn');
-            const totalAccountsCount = document.getElementById('total-accounts-count');
-            const enabledAccountsCount = document.getElementById('enabled-accounts-count');
-            const globalKeywordsCount = document.getElementById('global-keywords-count');
-            const lastUpdate = document.getElementById('last-update');
-            
-            if (statusText) {
-                if (data.running) {
-                    statusText.innerHTML = '<span class="text-green-600 flex items-center"><i class="fa fa-circle animate-pulse mr-2"></i>运行中</span>';
-                } else {
-                    statusText.innerHTML = '<span class="text-red-600 flex items-center"><i class="fa fa-circle mr-2"></i>已停止</span>';
-                }
-            }
-            
-            if (startBtn) startBtn.disabled = data.running;
-            if (stopBtn) stopBtn.disabled = !data.running;
-            if (restartBtn) restartBtn.disabled = !data.running;
-            
-            // 更新账号数量
-            if (totalAccountsCount) totalAccountsCount.textContent = data.total_accounts_count;
-            if (enabledAccountsCount) enabledAccountsCount.textContent = data.enabled_accounts_count;
-            
-            // 更新全局关键词数量
-            const globalKeywordsCountValue = Object.keys(data.global_keywords || {}).length;
-            if (globalKeywordsCount) globalKeywordsCount.textContent = globalKeywordsCountValue;
-            
-            // 更新最后更新时间
-            if (lastUpdate) lastUpdate.textContent = new Date().toLocaleString();
-            
-            // 如果是在账号管理页面，更新账号列表
-            const accountsSection = document.getElementById('accounts');
-            if (accountsSection && accountsSection.style.display !== 'none') {
-                updateAccountsList(data.accounts);
-                updateGlobalKeywordsList(data.global_keywords);
-            }
-        })
+        .then(data => applyBotStatus(data))
         .catch(error => {
             console.error('获取机器人状态失败:', error);
             const statusText = document.getElementById('status-text');
@@ -3106,6 +3323,103 @@ function fetchBotStatus() {
         });
 }
 
+// 更新机器人状态显示
+function applyBotStatus(data) {
+    // 更新状态显示
+    const statusText = document.getElementById('status-text');
+    const startBtn = document.getElementById('start-btn');
+    const stopBtn = document.getElementById('stop-btn');
+    const restartBtn = document.getElementById('restart-btn');
+    const totalAccountsCount = document.getElementById('total-accounts-count');
+    const enabledAccountsCount = document.getElementById('enabled-accounts-count');
+    const globalKeywordsCount = document.getElementById('global-keywords-count');
+    const lastUpdate = document.getElementById('last-update');
+    
+    if (statusText) {
+        if (data.running) {
+            statusText.innerHTML = '<span class="text-green-600 flex items-center"><i class="fa fa-circle animate-pulse mr-2"></i>运行中</span>';
+        } else {
+            statusText.innerHTML = '<span class="text-red-600 flex items-center"><i class="fa fa-circle mr-2"></i>已停止</span>';
+        }
+    }
+    
+    if (startBtn) startBtn.disabled = data.running;
+    if (stopBtn) stopBtn.disabled = !data.running;
+    if (restartBtn) restartBtn.disabled = !data.running;
+    
+    // 更新账号数量
+    if (totalAccountsCount) totalAccountsCount.textContent = data.total_accounts_count;
+    if (enabledAccountsCount) enabledAccountsCount.textContent = data.enabled_accounts_count;
+    
+    // 更新全局关键词数量
+    const globalKeywordsCountValue = Object.keys(data.global_keywords || {}).length;
+    if (globalKeywordsCount) globalKeywordsCount.textContent = globalKeywordsCountValue;
+    
+    // 更新最后更新时间
+    if (lastUpdate) lastUpdate.textContent = new Date().toLocaleString();
+    
+    // 如果是在账号管理页面，更新账号列表
+    const accountsSection = document.getElementById('accounts');
+    if (accountsSection && accountsSection.style.display !== 'none') {
+        updateAccountsList(data.accounts);
+        updateGlobalKeywordsList(data.global_keywords);
+    }
+}
+
+// 转义HTML特殊字符
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text === null || text === undefined ? '' : String(text);
+    return div.innerHTML;
+}
+
+// 获取账号运行指标
+function fetchBotMetrics() {
+    fetch('/api/bot_metrics')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) applyBotMetrics(data.data);
+        })
+        .catch(error => console.error('获取运行指标失败:', error));
+}
+
+// 更新账号运行指标表格
+function applyBotMetrics(data) {
+    const tbody = document.getElementById('account-metrics-body');
+    if (!tbody) return;
+    
+    const accounts = (data && data.accounts) || [];
+    if (accounts.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="10" class="py-4 text-center text-gray-400">暂无数据</td></tr>';
+        return;
+    }
+    
+    const formatSeconds = value => value === null || value === undefined ? '-' : `${(value * 1000).toFixed(0)}ms`;
+    
+    tbody.innerHTML = accounts.map(item => {
+        const stale = item.seconds_since_last_poll === null || item.seconds_since_last_poll > 60;
+        const status = item.running
+            ? '<span class="text-green-600">运行中</span>'
+            : '<span class="text-red-600">已停止</span>';
+        const lastPoll = item.seconds_since_last_poll === null ? '-' : `${item.seconds_since_last_poll}s`;
+        
+        return `
+            <tr class="border-b border-gray-50">
+                <td class="py-2 pr-4 font-medium text-gray-800">${escapeHtml(item.account)}</td>
+                <td class="py-2 pr-4">${status}</td>
+                <td class="py-2 pr-4">${item.polls_per_minute}</td>
+                <td class="py-2 pr-4">${item.messages_received}</td>
+                <td class="py-2 pr-4">${item.replies_sent}</td>
+                <td class="py-2 pr-4 ${item.send_failures > 0 ? 'text-red-600' : ''}">${item.send_failures}</td>
+                <td class="py-2 pr-4">${item.plugin_hits}</td>
+                <td class="py-2 pr-4">${formatSeconds(item.relation_p50)} / ${formatSeconds(item.relation_p99)}</td>
+                <td class="py-2 pr-4 ${item.slo_breaches > 0 ? 'text-yellow-600' : ''}" title="超出目标 ${item.slo_breaches} 次，慢轮询 ${item.slow_polls} 次">${item.reply_p99 === null ? '-' : item.reply_p99.toFixed(1) + 's'}</td>
+                <td class="py-2 pr-4 ${stale ? 'text-red-600' : ''}">${lastPoll}</td>
+            </tr>
+        `;
+    }).join('');
+}
+
 function updateProgressCircle(elementId, targetPercentage) {
     const circle = document.getElementById(elementId);
     if (!circle) return;
@@ -3284,40 +3598,45 @@ function updateSystemStats() {
         .then(response => response.json())
         .then(data => {
             if (data.success && data.data) {
-                const stats = data.data;
-                    
-                // 更新CPU信息
-                updateProgressCircle('cpu-progress', stats.cpu.usage);
-                document.getElementById('cpu-usage').textContent = `${stats.cpu.usage}%`;
-                document.getElementById('cpu-cores').textContent = 
-                    `${stats.cpu.physical_cores}物理 / ${stats.cpu.logical_cores}逻辑`;
-                    
-                // 更新内存信息
-                updateProgressCircle('mem-progress', stats.memory.usage);
-                document.getElementById('mem-usage').textContent = `${stats.memory.usage}%`;
-                document.getElementById('mem-details').textContent = 
-                    `${stats.memory.used}/${stats.memory.total} GB`;
-                
-                // 更新磁盘信息
-                updateProgressCircle('disk-progress', stats.disk.usage);
-                document.getElementById('disk-usage').textContent = `${stats.disk.usage}%`;
-                document.getElementById('disk-details').textContent = 
-                    `${stats.disk.used}/${stats.disk.total} GB`;
-                    
-                // 更新系统负载 (仅Unix系统)
-                if (stats.load_avg) {
-                    document.getElementById('load-average-container').style.display = 'block';
-                    document.getElementById('load-1').textContent = stats.load_avg[0];
-                    document.getElementById('load-5').textContent = stats.load_avg[1];
-                    document.getElementById('load-15').textContent = stats.load_avg[2];
-                }
-
-                updateNetworkData(stats);
+                applySystemStats(data.data);
             }
         })
         .catch(error => console.error('获取系统状态失败:', error));
 }
 
+// 更新系统状态显示
+function applySystemStats(stats) {
+    // 更新CPU信息
+    // 采样刚启动时 CPU 占用尚不可用
+    const cpuReady = stats.cpu.usage !== null && stats.cpu.usage !== undefined;
+    updateProgressCircle('cpu-progress', cpuReady ? stats.cpu.usage : 0);
+    document.getElementById('cpu-usage').textContent = cpuReady ? `${stats.cpu.usage}%` : '--';
+    document.getElementById('cpu-cores').textContent = 
+        `${stats.cpu.physical_cores}物理 / ${stats.cpu.logical_cores}逻辑`;
+        
+    // 更新内存信息
+    updateProgressCircle('mem-progress', stats.memory.usage);
+    document.getElementById('mem-usage').textContent = `${stats.memory.usage}%`;
+    document.getElementById('mem-details').textContent = 
+        `${stats.memory.used}/${stats.memory.total} GB`;
+    
+    // 更新磁盘信息
+    updateProgressCircle('disk-progress', stats.disk.usage);
+    document.getElementById('disk-usage').textContent = `${stats.disk.usage}%`;
+    document.getElementById('disk-details').textContent = 
+        `${stats.disk.used}/${stats.disk.total} GB`;
+        
+    // 更新系统负载 (仅Unix系统)
+    if (stats.load_avg) {
+        document.getElementById('load-average-container').style.display = 'block';
+        document.getElementById('load-1').textContent = stats.load_avg[0];
+        document.getElementById('load-5').textContent = stats.load_avg[1];
+        document.getElementById('load-15').textContent = stats.load_avg[2];
+    }
+
+    updateNetworkData(stats);
+}
+
 // 启动机器人
 function startBot() {
     fetch('/api/start_bot', { method: 'POST' })
@@ -3464,9 +3783,10 @@ function updateUptime() {
 
 // 初始化
 document.addEventListener('DOMContentLoaded', function() {
-    // 开始状态轮询
-    setInterval(fetchBotStatus, 3000);
+    // 获取初始状态，后续由实时事件流推送
     fetchBotStatus();
+    fetchBotMetrics();
+    initEventStream();
     
     loadAccounts();
     
@@ -3496,7 +3816,6 @@ document.addEventListener('DOMContentLoaded', function() {
     setTimeout(checkForUpdates, 2000);
 
     updateSystemStats();
-    setInterval(updateSystemStats, 2000);
     initImageBed();
 
     loadInstalledPlugins()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import platform
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import psutil
+
+# 降采样层级: 名称 -> (桶宽度秒数, 保留的点数)
+DOWNSAMPLE_TIERS = {
+    '1m': (60, 24 * 60),       # 1分钟粒度保留24小时
+    '5m': (300, 7 * 24 * 12),  # 5分钟粒度保留7天
+    '1h': (3600, 30 * 24),     # 1小时粒度保留30天
+}
+
+# cpu_percent 两次调用间隔小于该值（秒）时结果没有意义
+MIN_CPU_INTERVAL = 0.1
+
+# 参与降采样的数值字段
+SERIES_FIELDS = ('cpu', 'memory', 'disk', 'sent_speed', 'recv_speed', 'load1')
+
+class _Bucket:
+    """降采样累加桶"""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.count = 0
+        self.sums = dict.fromkeys(SERIES_FIELDS, 0.0)
+        self.counts = dict.fromkeys(SERIES_FIELDS, 0)
+
+    def add(self, point: Dict[str, Any]):
+        self.count += 1
+        for field in SERIES_FIELDS:
+            value = point.get(field)
+            if value is not None:
+                self.sums[field] += value
+                self.counts[field] += 1
+
+    def to_point(self) -> Dict[str, Any]:
+        point = {'ts': self.start}
+        for field in SERIES_FIELDS:
+            point[field] = round(self.sums[field] / self.counts[field], 2) if self.counts[field] else 0
+        return point
+
+class SystemStatsSampler:
+    """后台系统状态采样器
+
+    在独立线程中按固定间隔采集 CPU、内存、磁盘、网络和负载数据，
+    原始数据保存在定长环形缓冲区中，并降采样为 1m/5m/1h 三个层级。
+    接口请求直接读取最近一次快照，不会阻塞请求线程。
+    """
+
+    def __init__(self, interval: float = 2, raw_capacity: int = 1800, disk_path: str = '/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.raw = deque(maxlen=raw_capacity)
+        self.tiers = {name: deque(maxlen=capacity) for name, (_, capacity) in DOWNSAMPLE_TIERS.items()}
+        self._buckets: Dict[str, _Bucket] = {}
+        self._latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        # 串行化采样线程的启动和首个快照，sample() 内部还要获取 _lock
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_net_io = None
+        self._last_net_time = None
+        self._cpu_baseline: Optional[float] = None
+        self._static = self._collect_static()
+
+    def _collect_static(self) -> Dict[str, Any]:
+        """采集运行期间不变的信息"""
+        return {
+            'physical_cores': psutil.cpu_count(logical=False),
+            'logical_cores': psutil.cpu_count(logical=True),
+            'system': {
+                'os': platform.system(),
+                'release': platform.release(),
+                'version': platform.version(),
+                'processor': platform.processor()
+            }
+        }
+
+    def ensure_started(self):
+        """确保采样线程已启动"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            # 第一次调用 cpu_percent 只建立基准
+            psutil.cpu_percent(interval=None)
+            self._cpu_baseline = time.monotonic()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            # 采集首个快照，避免启动后第一次请求拿不到数据（此时 CPU 占用尚不可用，为 None）
+            # 只由启动线程的调用方采集，并发的首次请求在此等待，不会重复写入环形缓冲区
+            if self._latest is None:
+                self.sample()
+
+    def stop(self):
+        """停止采样线程"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                # 单次采样失败不影响后续采样
+                pass
+
+    def sample(self) -> Dict[str, Any]:
+        """采集一次快照并写入环形缓冲区"""
+        now = time.time()
+        cpu_percent = psutil.cpu_percent(interval=None)
+        if self._cpu_baseline is not None:
+            # 紧跟在建立基准之后的读数总是 0.0
+            if time.monotonic() - self._cpu_baseline < MIN_CPU_INTERVAL:
+                cpu_percent = None
+            else:
+                self._cpu_baseline = None
+        mem = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        net_io = psutil.net_io_counters()
+
+        with self._lock:
+            if self._last_net_io is None or now <= self._last_net_time:
+                sent_speed = recv_speed = 0
+            else:
+                time_diff = now - self._last_net_time
+                sent_speed = (net_io.bytes_sent - self._last_net_io.bytes_sent) / time_diff / 1024
+                recv_speed = (net_io.bytes_recv - self._last_net_io.bytes_recv) / time_diff / 1024
+            self._last_net_io = net_io
+            self._last_net_time = now
+
+        load_avg = None
+        if platform.system() != 'Windows':
+            try:
+                load_avg = [round(x, 2) for x in psutil.getloadavg()]
+            except (AttributeError, OSError):
+                pass
+
+        snapshot = {
+            'cpu': {
+                'physical_cores': self._static['physical_cores'],
+                'logical_cores': self._static['logical_cores'],
+                'usage': cpu_percent
+            },
+            'memory': {
+                'total': round(mem.total / (1024 ** 3), 2),
+                'used': round(mem.used / (1024 ** 3), 2),
+                'usage': mem.percent
+            },
+            'disk': {
+                'total': round(disk.total / (1024 ** 3), 2),
+                'used': round(disk.used / (1024 ** 3), 2),
+                'usage': disk.percent
+            },
+            'network': {
+                'bytes_sent': round(net_io.bytes_sent / (1024 ** 2), 2),
+                'bytes_recv': round(net_io.bytes_recv / (1024 ** 2), 2),
+                'packets_sent': net_io.packets_sent,
+                'packets_recv': net_io.packets_recv,
+                'errors_in': net_io.errin,
+                'errors_out': net_io.errout,
+                'drops_in': net_io.dropin,
+                'drops_out': net_io.dropout,
+                'sent_speed': round(sent_speed, 2),  # 上传速度 KB/s
+                'recv_speed': round(recv_speed, 2)   # 下载速度 KB/s
+            },
+            'load_avg': load_avg,
+            'system': self._static['system'],
+            'timestamp': datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        point = {
+            'ts': round(now, 3),
+            'cpu': cpu_percent,
+            'memory': mem.percent,
+            'disk': disk.percent,
+            'sent_speed': round(sent_speed, 2),
+            'recv_speed': round(recv_speed, 2),
+            'load1': load_avg[0] if load_avg else None
+        }
+
+        with self._lock:
+            self._latest = snapshot
+            self.raw.append(point)
+            self._downsample(point)
+        return snapshot
+
+    def _downsample(self, point: Dict[str, Any]):
+        """把原始点累加到各层级的桶中，桶结束时写入对应层级"""
+        for name, (width, _) in DOWNSAMPLE_TIERS.items():
+            start = point['ts'] - point['ts'] % width
+            bucket = self._buckets.get(name)
+            if bucket is not None and bucket.start != start:
+                self.tiers[name].append(bucket.to_point())
+                bucket = None
+            if bucket is None:
+                bucket = self._buckets[name] = _Bucket(start)
+            bucket.add(point)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """获取最近一次快照"""
+        self.ensure_started()
+        return self._latest
+
+    def series(self, tier: str = 'raw', window: Optional[float] = None) -> List[Dict[str, Any]]:
+        """获取指定层级、指定时间窗口（秒）内的数据点"""
+        self.ensure_started()
+        with self._lock:
+            if tier == 'raw':
+                points = list(self.raw)
+            elif tier in self.tiers:
+                points = list(self.tiers[tier])
+                # 附带当前尚未结束的桶
+                bucket = self._buckets.get(tier)
+                if bucket is not None and bucket.count:
+                    points.append(bucket.to_point())
+            else:
+                raise ValueError(f"未知的采样层级: {tier}")
+
+        if window:
+            since = time.time() - window
+            points = [p for p in points if p['ts'] >= since]
+        return points
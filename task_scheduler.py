@@ -0,0 +1,296 @@
+import calendar
+import heapq
+import inspect
+import itertools
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+import metrics
+import async_runtime
+import plugin_profiler
+
+# 插件定时任务调度器
+#
+# 所有插件的定时任务共用一个调度线程：按下次执行时间放在最小堆中，到期后交给
+# 固定大小的工作线程池执行。无论插件注册多少任务，线程数都保持不变，
+# 每个任务返回可以取消的 TaskHandle，插件卸载时自动取消其全部任务。
+
+# 执行任务的工作线程数和排队上限
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 256
+
+# 错过执行时间的处理方式
+MISFIRE_COALESCE = "coalesce"   # 错过多次也只补执行一次，然后按原节奏继续
+MISFIRE_SKIP = "skip"           # 超过宽限时间的执行直接跳过，等待下一次
+DEFAULT_MISFIRE_GRACE = 1.0     # 宽限时间（秒）
+
+TASKS_SCHEDULED = metrics.registry.gauge("bot_scheduled_tasks", "已注册的定时任务数", ["plugin"])
+TASK_RUNS = metrics.registry.counter("bot_scheduled_task_runs_total", "定时任务执行次数（ok/error/misfire）", ["plugin", "result"])
+TASK_LATENESS = metrics.registry.histogram(
+    "bot_scheduled_task_lateness_seconds", "定时任务实际开始时间与计划时间的差", ["plugin"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 60)
+)
+
+class CronExpression:
+    """标准5段 cron 表达式：分 时 日 月 周
+
+    每段支持 *、数字、范围 a-b、步长 */n 或 a-b/n，以及逗号分隔的列表；
+    周的取值为 0-7（0 和 7 都是周日）。日和周都有限制时满足任一即可（与 cron 一致）。
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式应为5段: {expression}")
+        self.expression = expression
+        fields = [self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        # 转换为 datetime.weekday()：周一为0
+        self.weekdays = {(d - 1) % 7 for d in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse(part: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in part.split(","):
+            item, _, step = item.partition("/")
+            step = int(step) if step else 1
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(v) for v in item.split("-", 1))
+            else:
+                start = int(item)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"cron 字段超出范围: {part}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        """timestamp 之后（不含）第一个匹配的时间点"""
+        moment = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                days_in_month = calendar.monthrange(moment.year, moment.month)[1]
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=days_in_month))
+                continue
+            if not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+                continue
+            if moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+                continue
+            return moment.timestamp()
+        raise ValueError(f"cron 表达式没有可执行的时间: {self.expression}")
+
+class TaskHandle:
+    """定时任务句柄"""
+
+    def __init__(self, scheduler: "TaskScheduler", owner: str, func: Callable, args: tuple, kwargs: dict,
+                 next_run: float, interval: Optional[float] = None, cron: Optional[CronExpression] = None,
+                 misfire: str = MISFIRE_COALESCE, misfire_grace: float = DEFAULT_MISFIRE_GRACE):
+        if misfire not in (MISFIRE_COALESCE, MISFIRE_SKIP):
+            raise ValueError(f"未知的 misfire 策略: {misfire}")
+        self.scheduler = scheduler
+        self.owner = owner
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.next_run = next_run
+        self.interval = interval
+        self.cron = cron
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+        self.cancelled = False
+        self.running = False
+        self.runs = 0
+        self.misfires = 0
+        self.last_run: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return getattr(self.func, "__name__", repr(self.func))
+
+    @property
+    def repeating(self) -> bool:
+        return self.interval is not None or self.cron is not None
+
+    def cancel(self) -> bool:
+        """取消任务（正在执行的一次不会被打断），返回是否是本次调用取消的"""
+        return self.scheduler.cancel(self)
+
+    def _following(self, due: float, now: float) -> Optional[float]:
+        """本次计划时间 due 之后的下一次执行时间，错过的多次执行合并为一次"""
+        if self.cron is not None:
+            return self.cron.next_after(max(due, now))
+        if self.interval is not None:
+            missed = max(0, int((now - due) // self.interval))
+            return due + (missed + 1) * self.interval
+        return None
+
+    def __repr__(self):
+        state = "cancelled" if self.cancelled else f"next={self.next_run:.3f}"
+        return f"<TaskHandle {self.owner}:{self.name} {state}>"
+
+class TaskScheduler:
+    """单线程定时器堆 + 固定大小的工作线程池"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self._heap = []  # [(执行时间, 序号, 句柄)]
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._tasks: Dict[str, Set[TaskHandle]] = {}
+        self._thread = None
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_threads(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="task-scheduler", daemon=True)
+        self._thread.start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"task-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def schedule(self, handle: TaskHandle) -> TaskHandle:
+        with self._cond:
+            self._ensure_threads()
+            self._tasks.setdefault(handle.owner, set()).add(handle)
+            TASKS_SCHEDULED.labels(handle.owner).set(len(self._tasks[handle.owner]))
+            heapq.heappush(self._heap, (handle.next_run, next(self._counter), handle))
+            self._cond.notify()
+        return handle
+
+    def cancel(self, handle: TaskHandle) -> bool:
+        with self._cond:
+            if handle.cancelled:
+                return False
+            handle.cancelled = True
+            self._forget(handle)
+            # 堆中的记录在弹出时跳过；已取消的记录过多时重建堆
+            if len(self._heap) > 64 and len(self._heap) > 2 * sum(len(t) for t in self._tasks.values()):
+                self._heap = [item for item in self._heap if not item[2].cancelled]
+                heapq.heapify(self._heap)
+            self._cond.notify()
+        return True
+
+    def cancel_owner(self, owner: str) -> int:
+        """取消某个插件的全部任务，返回取消数量"""
+        with self._cond:
+            handles = list(self._tasks.get(owner, ()))
+        return sum(1 for handle in handles if self.cancel(handle))
+
+    def _forget(self, handle: TaskHandle):
+        tasks = self._tasks.get(handle.owner)
+        if tasks is not None:
+            tasks.discard(handle)
+            TASKS_SCHEDULED.labels(handle.owner).set(len(tasks))
+            if not tasks:
+                del self._tasks[handle.owner]
+
+    def tasks(self, owner: Optional[str] = None) -> List[TaskHandle]:
+        with self._cond:
+            if owner is not None:
+                return list(self._tasks.get(owner, ()))
+            return [handle for handles in self._tasks.values() for handle in handles]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][2].cancelled:
+                    if self._heap:
+                        heapq.heappop(self._heap)
+                        continue
+                    self._cond.wait()
+                due, _, handle = self._heap[0]
+                now = time.time()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                self._dispatch(handle, due, now)
+
+    def _dispatch(self, handle: TaskHandle, due: float, now: float):
+        """在持有锁时调用：提交本次执行并安排下一次"""
+        late = now - due
+        overlapping = handle.running
+        misfire = overlapping or (handle.misfire == MISFIRE_SKIP and late > handle.misfire_grace)
+        if not misfire:
+            try:
+                handle.running = True
+                self._queue.put_nowait((handle, due))
+            except queue.Full:
+                handle.running = False
+                misfire = True
+        if misfire:
+            handle.misfires += 1
+            TASK_RUNS.labels(handle.owner, "misfire").inc()
+            if overlapping:
+                logging.debug(f"插件 {handle.owner} 的定时任务 {handle.name} 上一次尚未执行完，跳过本次")
+            else:
+                logging.warning(f"插件 {handle.owner} 的定时任务 {handle.name} 错过执行（延迟 {late:.1f}s）")
+
+        following = handle._following(due, now)
+        if following is None:
+            if misfire:
+                # 一次性任务错过后不再执行
+                handle.cancelled = True
+                self._forget(handle)
+            return
+        handle.next_run = following
+        heapq.heappush(self._heap, (following, next(self._counter), handle))
+
+    def _worker(self):
+        while True:
+            handle, due = self._queue.get()
+            started = time.time()
+            try:
+                if not handle.cancelled:
+                    TASK_LATENESS.labels(handle.owner).observe(max(0.0, started - due))
+                    handle.runs += 1
+                    handle.last_run = started
+                    with plugin_profiler.accounting.measure(handle.owner, plugin_profiler.SOURCE_TASK):
+                        result = handle.func(*handle.args, **handle.kwargs)
+                        if inspect.isawaitable(result):
+                            async_runtime.runtime.run(result, timeout=None)
+                    handle.last_error = None
+                    TASK_RUNS.labels(handle.owner, "ok").inc()
+            except Exception as e:
+                handle.last_error = f"{type(e).__name__}: {e}"
+                TASK_RUNS.labels(handle.owner, "error").inc()
+                logging.error(f"插件 {handle.owner} 定时任务 {handle.name} 执行失败: {str(e)}")
+            finally:
+                with self._cond:
+                    handle.running = False
+                    if not handle.repeating and not handle.cancelled:
+                        handle.cancelled = True
+                        self._forget(handle)
+
+# 全局调度器
+scheduler = TaskScheduler()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""PluginDatabase 延迟写入测试
+
+    python -m pytest -q tests
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugin_dev import PluginDatabase
+
+class PluginDatabaseFlushTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        # 数据库路径相对于工作目录: plugins/<插件名>/<插件名>.db
+        os.chdir(self._tmp.name)
+        self.db = PluginDatabase("flush_test")
+        self.db.create_table("logs", {"id": "INTEGER PRIMARY KEY", "text": "TEXT"})
+        # 测试中手动调用 flush，不让后台线程抢先提交
+        self.db.FLUSH_INTERVAL = 60
+
+    def tearDown(self):
+        self.db._pending.clear()
+        self.db.close()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_failed_flush_keeps_queued_rows(self):
+        self.db.execute_later("INSERT INTO logs (text) VALUES (?)", ("a",))
+        self.db.execute_later("INSERT INTO logs (text) VALUES (?)", ("b",))
+        self.db.execute_later("INSERT INTO missing_table (text) VALUES (?)", ("c",))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.flush()
+
+        # 事务已回滚，整批写入仍在队列中且顺序不变
+        count = self.db.get_connection().execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+        self.assertEqual(count, 0)
+        self.assertEqual([params for _, params in self.db._pending], [("a",), ("b",), ("c",)])
+
+        # 修复出错的语句后重新提交，排队的行全部写入
+        self.db.create_table("missing_table", {"text": "TEXT"})
+        self.db.flush()
+        self.assertEqual(self.db._pending, [])
+        self.assertEqual(self.db.fetch_all("SELECT text FROM logs ORDER BY id"), [("a",), ("b",)])
+        self.assertEqual(self.db.fetch_all("SELECT text FROM missing_table"), [("c",)])
+
+    def test_closed_database_rejects_connections(self):
+        self.db.close()
+        with self.assertRaises(RuntimeError):
+            self.db.get_connection()
+        with self.assertRaises(RuntimeError):
+            self.db.execute_later("INSERT INTO logs (text) VALUES (?)", ("a",))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,12 +5,12 @@ import secrets
 import string
 import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
 from urllib.parse import urlencode
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 import subprocess
-import psutil
 import init
 import sys
 import uuid
@@ -23,10 +23,13 @@ from colorama import Fore, Back, Style
 import distro
 import mimetypes
 import bili_ticket
+import api_hosts
 from plugin_loader import plugin_loader
 from plugin_manage import plugin_manager
 from plugin_dev import PluginDeveloper
 from plugin_create import plugin_creator
+from stats_sampler import SystemStatsSampler
+import metrics
 import github
 from github import Github
 
@@ -157,6 +160,10 @@ class PanelConfigManager:
         
         self.save_config()
     
+    def get_metrics_token(self):
+        """获取 /metrics 抓取令牌（为空时仅允许已登录用户访问）"""
+        return self.config.get("metrics_token", "")
+    
     def update_github_token(self, access_token):
         """更新GitHub访问令牌"""
         if "github" not in self.config:
@@ -394,11 +401,100 @@ github_manager = GitHubDiscussionManager(panel_config)
 # 初始化配置管理器
 bot_config = ConfigManage.ConfigManager("config.json")
 
+# 实时事件流（Server-Sent Events）
+class StreamClient:
+    """单个SSE客户端的有界缓冲区，慢客户端会丢弃最旧的事件"""
+    
+    def __init__(self, max_buffer=200):
+        self.buffer = deque(maxlen=max_buffer)
+        self.condition = threading.Condition()
+        self.dropped = 0
+    
+    def push(self, event, data):
+        """写入事件（由生产者调用，不会阻塞）"""
+        with self.condition:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append((event, data))
+            self.condition.notify()
+    
+    def drain(self, timeout):
+        """取出所有待发送事件，没有事件时最多等待 timeout 秒"""
+        with self.condition:
+            if not self.buffer:
+                self.condition.wait(timeout)
+            events = list(self.buffer)
+            self.buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+class EventStreamHub:
+    """单生产者多订阅者的事件分发中心"""
+    
+    def __init__(self, status_interval=1, stats_interval=2, max_buffer=200):
+        self.status_interval = status_interval
+        self.stats_interval = stats_interval
+        self.max_buffer = max_buffer
+        self.clients = set()
+        self.lock = threading.Lock()
+        self._producer = None
+    
+    def subscribe(self):
+        """注册新的客户端"""
+        client = StreamClient(self.max_buffer)
+        with self.lock:
+            self.clients.add(client)
+            if self._producer is None or not self._producer.is_alive():
+                self._producer = threading.Thread(target=self._produce, daemon=True)
+                self._producer.start()
+        return client
+    
+    def unsubscribe(self, client):
+        """移除客户端"""
+        with self.lock:
+            self.clients.discard(client)
+    
+    def has_clients(self):
+        return bool(self.clients)
+    
+    def publish(self, event, data):
+        """向所有客户端广播事件"""
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.push(event, data)
+    
+    def _produce(self):
+        """生产者线程：推送机器人状态变化和周期性的系统状态"""
+        last_running = None
+        last_stats = 0
+        while True:
+            with self.lock:
+                if not self.clients:
+                    self._producer = None
+                    return
+            try:
+                running = bot_process is not None and bot_process.poll() is None
+                if running != last_running:
+                    last_running = running
+                    self.publish('status', build_bot_status())
+                
+                now = time.time()
+                if now - last_stats >= self.stats_interval:
+                    last_stats = now
+                    self.publish('stats', get_system_stats())
+            except Exception as e:
+                logging.error(f"事件流生产者异常: {str(e)}")
+            time.sleep(self.status_interval)
+
+stream_hub = EventStreamHub()
+
 # 日志处理
 class LogHandler:
-    def __init__(self, log_file):
+    def __init__(self, log_file, stream_hub=None):
         self.log_file = log_file
         self.logs = []
+        self.stream_hub = stream_hub
         self._ensure_log_file()
     
     def _ensure_log_file(self):
@@ -420,6 +516,10 @@ class LogHandler:
         # 写入文件
         with open(self.log_file, 'a', encoding='utf-8') as f:
             f.write(log_entry + '\n')
+        
+        # 推送给实时日志订阅者
+        if self.stream_hub and self.stream_hub.has_clients():
+            self.stream_hub.publish('log', log_entry)
     
     def get_logs(self, limit=100):
         """获取最新的日志"""
@@ -430,6 +530,8 @@ class LogHandler:
         try:
             # 清空内存中的日志
             self.logs = []
+            if self.stream_hub:
+                self.stream_hub.publish('cleared', {})
             
             # 清空日志文件
             with open(self.log_file, 'w', encoding='utf-8') as f:
@@ -443,7 +545,196 @@ class LogHandler:
             return False
 
 # 初始化日志处理器
-log_handler = LogHandler(LOG_FILE)
+log_handler = LogHandler(LOG_FILE, stream_hub)
+
+# 机器人指标
+class BotMetricsStore:
+    """保存机器人进程通过管道上报的指标快照"""
+    
+    def __init__(self, stream_hub=None):
+        self.stream_hub = stream_hub
+        self.latest = None
+        self.previous = None
+        # 机器人上报的插件加载报告 {插件名: {status, lazy, seconds, memory_bytes, error}}
+        self.load_report = {}
+        self.lock = threading.Lock()
+    
+    def update(self, snapshot):
+        """写入新的指标快照"""
+        with self.lock:
+            self.previous, self.latest = self.latest, snapshot
+        if self.stream_hub and self.stream_hub.has_clients():
+            self.stream_hub.publish('metrics', self.summary())
+    
+    def update_load_report(self, report):
+        with self.lock:
+            self.load_report = report if isinstance(report, dict) else {}
+    
+    def plugin_load_report(self, plugin_name):
+        with self.lock:
+            return self.load_report.get(plugin_name)
+    
+    def clear(self):
+        with self.lock:
+            self.previous = self.latest = None
+            self.load_report = {}
+    
+    def summary(self):
+        """按账号汇总健康和吞吐数据"""
+        with self.lock:
+            latest, previous = self.latest, self.previous
+        if not latest:
+            return {'accounts': [], 'timestamp': None}
+        
+        current = self._index(latest)
+        before = self._index(previous) if previous else {}
+        elapsed = latest['timestamp'] - previous['timestamp'] if previous else 0
+        now = time.time()
+        
+        def value(index, name, account):
+            sample = index.get(name, {}).get(account)
+            return sample['value'] if sample else 0
+        
+        accounts = {}
+        for name in ('bot_polls_total', 'bot_running'):
+            accounts.update(dict.fromkeys(current.get(name, {})))
+        
+        result = []
+        for account in sorted(accounts):
+            polls = value(current, 'bot_polls_total', account)
+            polls_per_minute = 0
+            if elapsed > 0:
+                polls_per_minute = (polls - value(before, 'bot_polls_total', account)) / elapsed * 60
+            
+            last_poll = value(current, 'bot_last_successful_poll_timestamp_seconds', account)
+            relation = current.get('bot_relation_check_seconds', {}).get(account)
+            reply_latency = current.get('bot_reply_latency_seconds', {}).get(account)
+            
+            result.append({
+                'account': account,
+                'running': bool(value(current, 'bot_running', account)),
+                'polls': polls,
+                'polls_per_minute': round(polls_per_minute, 2),
+                'poll_errors': value(current, 'bot_poll_errors_total', account),
+                'messages_received': value(current, 'bot_messages_received_total', account),
+                'replies_sent': value(current, 'bot_replies_sent_total', account),
+                'send_failures': value(current, 'bot_send_failures_total', account),
+                'plugin_hits': value(current, 'bot_plugin_hits_total', account),
+                'relation_p50': metrics.histogram_quantile(0.5, relation) if relation else None,
+                'relation_p99': metrics.histogram_quantile(0.99, relation) if relation else None,
+                'reply_p99': metrics.histogram_quantile(0.99, reply_latency) if reply_latency else None,
+                'slo_breaches': value(current, 'bot_reply_slo_breaches_total', account),
+                'slow_polls': value(current, 'bot_slow_polls_total', account),
+                'seconds_since_last_poll': round(now - last_poll, 1) if last_poll else None
+            })
+        
+        return {'accounts': result, 'timestamp': latest['timestamp']}
+    
+    @staticmethod
+    def _index(snapshot):
+        """把快照整理成 {指标名: {账号: 样本}}，插件命中按账号累加"""
+        index = {}
+        for family in snapshot.get('metrics', []):
+            by_account = index.setdefault(family['name'], {})
+            for sample in family.get('samples', []):
+                account = sample.get('labels', {}).get('account')
+                if account is None:
+                    continue
+                if family['name'] == 'bot_plugin_hits_total' and account in by_account:
+                    by_account[account] = {'value': by_account[account]['value'] + sample['value']}
+                else:
+                    by_account[account] = sample
+        return index
+
+    def plugin_summary(self):
+        """按插件汇总调用次数、耗时、CPU、异常和内存 {插件名: {...}}"""
+        with self.lock:
+            latest = self.latest
+        if not latest:
+            return {}
+        
+        summary = {}
+        
+        def entry(plugin):
+            return summary.setdefault(plugin, {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'exceptions': 0,
+                'timeouts': 0, 'memory_bytes': None, 'memory_delta_bytes': None, 'load_seconds': None
+            })
+        
+        fields = {
+            'bot_plugin_invocations_total': 'calls',
+            'bot_plugin_wall_seconds_total': 'wall_seconds',
+            'bot_plugin_cpu_seconds_total': 'cpu_seconds',
+            'bot_plugin_exceptions_total': 'exceptions',
+        }
+        gauges = {
+            'bot_plugin_memory_bytes': 'memory_bytes',
+            'bot_plugin_memory_delta_bytes': 'memory_delta_bytes',
+            'bot_plugin_load_seconds': 'load_seconds',
+        }
+        for family in latest.get('metrics', []):
+            name = family['name']
+            for sample in family.get('samples', []):
+                plugin = sample.get('labels', {}).get('plugin')
+                if plugin is None:
+                    continue
+                if name in fields:
+                    entry(plugin)[fields[name]] += sample['value']
+                elif name in gauges:
+                    entry(plugin)[gauges[name]] = sample['value']
+                elif name == 'bot_plugin_calls_total' and sample['labels'].get('result') == 'timeout':
+                    entry(plugin)['timeouts'] += sample['value']
+        
+        for item in summary.values():
+            item['avg_ms'] = round(item['wall_seconds'] / item['calls'] * 1000, 2) if item['calls'] else None
+            item['wall_seconds'] = round(item['wall_seconds'], 3)
+            item['cpu_seconds'] = round(item['cpu_seconds'], 3)
+        return summary
+
+bot_metrics = BotMetricsStore(stream_hub)
+
+class BotCommandClient:
+    """通过机器人进程的 stdin 发送控制命令（见 bot_control.py），结果由 handle_bot_line 转交"""
+    
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+    
+    def call(self, process, command, args=None, timeout=10):
+        """发送命令并等待结果，失败时抛出 RuntimeError"""
+        if process is None or process.poll() is not None or process.stdin is None:
+            raise RuntimeError('机器人未运行')
+        command_id = uuid.uuid4().hex
+        slot = {'event': threading.Event(), 'result': None}
+        with self._lock:
+            self._pending[command_id] = slot
+        try:
+            line = json.dumps({'type': 'command', 'id': command_id, 'command': command, 'args': args or {}},
+                              ensure_ascii=False)
+            with self._write_lock:
+                process.stdin.write(line + '\n')
+                process.stdin.flush()
+            if not slot['event'].wait(timeout):
+                raise RuntimeError('机器人未响应')
+            result = slot['result']
+            if not result.get('ok'):
+                raise RuntimeError(result.get('error') or '命令执行失败')
+            return result.get('result')
+        except (BrokenPipeError, OSError) as e:
+            raise RuntimeError(f'无法发送命令: {e}')
+        finally:
+            with self._lock:
+                self._pending.pop(command_id, None)
+    
+    def resolve(self, result):
+        with self._lock:
+            slot = self._pending.get(result.get('id'))
+        if slot is not None:
+            slot['result'] = result
+            slot['event'].set()
+
+bot_commands = BotCommandClient()
 
 def restart_bot_mod():
     """重启机器人"""
@@ -468,14 +759,7 @@ def restart_bot_mod():
         if not python_path:
             log_handler.add_log("未找到python3解释器", "ERROR")
         
-        bot_process = subprocess.Popen(
-            [python_path, 'index.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8',
-            bufsize=1
-        )
+        bot_process = spawn_bot_process(python_path)
         
         # 启动日志读取线程
         threading.Thread(target=read_bot_output, daemon=True).start()
@@ -618,7 +902,7 @@ def add_account():
 @login_required
 def upload_bfs():
     # 1. 基础参数校验
-    api = "https://api.bilibili.com/x/dynamic/feed/draw/upload_bfs"
+    api = f"{api_hosts.API}/x/dynamic/feed/draw/upload_bfs"
     file = request.files.get("file_up")  # 获取前端上传的文件
     account_index = request.form.get("account_index", type=int, default=0)
     
@@ -1159,6 +1443,10 @@ def logout():
 @login_required
 def get_bot_status():
     """获取机器人状态"""
+    return jsonify(build_bot_status())
+
+def build_bot_status():
+    """构建机器人状态数据"""
     global is_bot_running
     
     # 检查进程是否还在运行
@@ -1171,13 +1459,13 @@ def get_bot_status():
     accounts = bot_config.get_accounts()
     enabled_accounts = [acc for acc in accounts if acc.get("enabled", True)]
     
-    return jsonify({
+    return {
         'running': is_bot_running,
         'accounts': accounts,
         'enabled_accounts_count': len(enabled_accounts),
         'total_accounts_count': len(accounts),
         'global_keywords': bot_config.get_global_keywords()
-    })
+    }
 
 @app.route('/api/get_announcement', methods=['POST', 'GET'])
 @login_required
@@ -1208,14 +1496,7 @@ def start_bot():
             return jsonify({'success': False, 'message': '未找到python3解释器'})
         
         # 启动机器人进程
-        bot_process = subprocess.Popen(
-            [python_path, 'index.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8',
-            bufsize=1
-        )
+        bot_process = spawn_bot_process(python_path)
         
         # 启动日志读取线程
         threading.Thread(target=read_bot_output, daemon=True).start()
@@ -1257,14 +1538,21 @@ def stop_bot():
         log_handler.add_log(f"机器人停止失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'停止失败: {str(e)}'})
 
+def _market_options():
+    """插件市场查询参数：offline=1 只使用本地缓存，refresh=1 忽略缓存有效期"""
+    return {
+        'offline': request.args.get('offline', '0') in ('1', 'true'),
+        'refresh': request.args.get('refresh', '0') in ('1', 'true'),
+    }
+
 @app.route('/api/plugins/search')
 @login_required
 def search_plugins():
     """搜索插件"""
     try:
         keyword = request.args.get('keyword', '')
-        plugins = plugin_manager.search_plugins(keyword)
-        return jsonify({'success': True, 'plugins': plugins})
+        plugins, source = plugin_manager.search(keyword, **_market_options())
+        return jsonify({'success': True, 'plugins': plugins, 'source': source})
     except Exception as e:
         log_handler.add_log(f"搜索插件失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'搜索失败: {str(e)}'})
@@ -1273,8 +1561,8 @@ def search_plugins():
 @login_required
 def plugins_list():
     try:
-        plugins = plugin_manager.search_plugins()
-        return jsonify({'success': True, 'plugins': plugins})
+        plugins, source = plugin_manager.search(**_market_options())
+        return jsonify({'success': True, 'plugins': plugins, 'source': source})
     except Exception as e:
         log_handler.add_log(f"获取插件失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'获取失败: {str(e)}'})
@@ -1291,8 +1579,11 @@ def install_plugin():
         result = plugin_manager.download_plugin(repo_full_name, plugin_name)
         
         if result:
-            # 加载新插件
-            plugin_loader.load_plugin(plugin_name)
+            # 重新安装已加载的插件时换用新代码，首次安装时加载新插件
+            if plugin_name in plugin_loader.plugins:
+                plugin_loader.reload_plugin(plugin_name)
+            else:
+                plugin_loader.load_plugin(plugin_name)
             log_handler.add_log(f"安装插件: {plugin_name}")
             return jsonify({'success': True, 'message': '插件安装成功'})
         else:
@@ -1318,17 +1609,71 @@ def uninstall_plugin():
         log_handler.add_log(f"卸载插件失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'卸载失败: {str(e)}'})
 
+@app.route('/api/plugins/rollback', methods=['POST'])
+@login_required
+def rollback_plugin():
+    """回滚插件到上一个版本"""
+    try:
+        plugin_name = request.json.get('plugin_name')
+        if plugin_manager.rollback_plugin(plugin_name):
+            plugin_loader.reload_plugin(plugin_name)
+            log_handler.add_log(f"回滚插件: {plugin_name}")
+            return jsonify({'success': True, 'message': '插件已回滚到上一个版本'})
+        else:
+            return jsonify({'success': False, 'message': '插件回滚失败'})
+    
+    except Exception as e:
+        log_handler.add_log(f"回滚插件失败: {str(e)}", "ERROR")
+        return jsonify({'success': False, 'message': f'回滚失败: {str(e)}'})
+
 @app.route('/api/plugins/list')
 @login_required
 def list_plugins():
     """获取已安装插件列表"""
     try:
         plugins = plugin_manager.get_installed_plugins()
+        # 机器人进程上报的运行统计
+        stats = bot_metrics.plugin_summary()
+        for plugin in plugins:
+            plugin['stats'] = stats.get(plugin['name'])
+            plugin['load_report'] = bot_metrics.plugin_load_report(plugin['name'])
         return jsonify({'success': True, 'plugins': plugins})
     except Exception as e:
         log_handler.add_log(f"获取插件列表失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'获取失败: {str(e)}'})
 
+@app.route('/api/plugins/profile', methods=['POST'])
+@login_required
+def profile_plugin():
+    """开始或停止对插件的 cProfile 采集，停止时返回 pstats 结果"""
+    try:
+        data = request.json or {}
+        plugin_name = data.get('plugin_name')
+        action = data.get('action')
+        if not plugin_name:
+            return jsonify({'success': False, 'message': '插件名称不能为空'})
+        
+        if action == 'start':
+            started = bot_commands.call(bot_process, 'profile_start', {'plugin': plugin_name})
+            if started:
+                log_handler.add_log(f"开始采集插件性能数据: {plugin_name}")
+            return jsonify({'success': True, 'message': '已开始采集' if started else '该插件已在采集中', 'profiling': True})
+        if action == 'stop':
+            result = bot_commands.call(bot_process, 'profile_stop', {
+                'plugin': plugin_name,
+                'sort': data.get('sort', 'cumulative'),
+                'limit': data.get('limit', 50)
+            })
+            log_handler.add_log(f"插件性能采集结束: {plugin_name}")
+            return jsonify({'success': True, 'message': '采集结束', 'profiling': False, 'profile': result})
+        if action == 'status':
+            return jsonify({'success': True, 'profiling': bot_commands.call(bot_process, 'profile_status')})
+        return jsonify({'success': False, 'message': f'未知操作: {action}'})
+    
+    except Exception as e:
+        log_handler.add_log(f"插件性能采集失败: {str(e)}", "ERROR")
+        return jsonify({'success': False, 'message': f'操作失败: {str(e)}'})
+
 @app.route('/api/plugins/toggle', methods=['POST'])
 @login_required
 def toggle_plugin():
@@ -1672,109 +2017,12 @@ def create_plugin():
         log_handler.add_log(f"创建插件失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'创建失败: {str(e)}'})
 
-# 添加系统监控数据获取函数
+# 系统状态由后台线程采样，请求只读取最近的快照
+stats_sampler = SystemStatsSampler(interval=2, disk_path=disk_default)
+
 def get_system_stats():
     """获取系统状态信息"""
-    # CPU信息
-    cpu_count = psutil.cpu_count(logical=False)  # 物理核心
-    cpu_count_logical = psutil.cpu_count(logical=True)  # 逻辑核心
-    cpu_percent = psutil.cpu_percent(interval=0.1)  # CPU使用率
-    
-    # 内存信息
-    mem = psutil.virtual_memory()
-    mem_total = mem.total / (1024 **3)  # 总内存(GB)
-    mem_used = mem.used / (1024** 3)    # 已用内存(GB)
-    mem_percent = mem.percent           # 内存使用率
-    
-    # 磁盘信息
-    disk = psutil.disk_usage(disk_default)
-    disk_total = disk.total / (1024 **3)  # 总磁盘空间(GB)
-    disk_used = disk.used / (1024** 3)    # 已用磁盘空间(GB)
-    disk_percent = disk.percent           # 磁盘使用率
-
-    # 网络IO信息
-    net_io = psutil.net_io_counters()
-    net_bytes_sent = net_io.bytes_sent / (1024 ** 2)  # 发送数据量(MB)
-    net_bytes_recv = net_io.bytes_recv / (1024 ** 2)  # 接收数据量(MB)
-    net_packets_sent = net_io.packets_sent            # 发送包数量
-    net_packets_recv = net_io.packets_recv            # 接收包数量
-    net_errin = net_io.errin                          # 接收错误数
-    net_errout = net_io.errout                        # 发送错误数
-    net_dropin = net_io.dropin                        # 接收丢弃数
-    net_dropout = net_io.dropout 
-    
-    # 计算网络速度（需要保存上一次的数据）
-    current_time = time.time()
-    if not hasattr(get_system_stats, 'last_net_io'):
-        # 第一次调用，初始化数据
-        get_system_stats.last_net_io = net_io
-        get_system_stats.last_net_time = current_time
-        sent_speed = 0
-        recv_speed = 0
-    else:
-        # 计算时间差
-        time_diff = current_time - get_system_stats.last_net_time
-        if time_diff > 0:
-            # 计算速度 (KB/s)
-            sent_speed = (net_io.bytes_sent - get_system_stats.last_net_io.bytes_sent) / time_diff / 1024
-            recv_speed = (net_io.bytes_recv - get_system_stats.last_net_io.bytes_recv) / time_diff / 1024
-        else:
-            sent_speed = 0
-            recv_speed = 0
-        
-        # 更新上一次的数据
-        get_system_stats.last_net_io = net_io
-        get_system_stats.last_net_time = current_time
-
-    # 系统负载
-    load_avg = None
-    if platform.system() != 'Windows':
-        try:
-            load = psutil.getloadavg()
-            load_avg = [round(x, 2) for x in load]
-        except AttributeError:
-            pass
-    
-    # 系统信息
-    system_info = {
-        'os': platform.system(),
-        'release': platform.release(),
-        'version': platform.version(),
-        'processor': platform.processor()
-    }
-    
-    return {
-        'cpu': {
-            'physical_cores': cpu_count,
-            'logical_cores': cpu_count_logical,
-            'usage': cpu_percent
-        },
-        'memory': {
-            'total': round(mem_total, 2),
-            'used': round(mem_used, 2),
-            'usage': mem_percent
-        },
-        'disk': {
-            'total': round(disk_total, 2),
-            'used': round(disk_used, 2),
-            'usage': disk_percent
-        },
-        'network': {
-            'bytes_sent': round(net_bytes_sent, 2),
-            'bytes_recv': round(net_bytes_recv, 2),
-            'packets_sent': net_packets_sent,
-            'packets_recv': net_packets_recv,
-            'errors_in': net_errin,
-            'errors_out': net_errout,
-            'drops_in': net_dropin,
-            'drops_out': net_dropout,
-            'sent_speed': round(sent_speed, 2),  # 上传速度 KB/s
-            'recv_speed': round(recv_speed, 2)   # 下载速度 KB/s
-        },
-        'load_avg': load_avg,
-        'system': system_info,
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+    return stats_sampler.latest()
 
 @app.route('/api/proxy_image')
 @login_required
@@ -1824,10 +2072,20 @@ def proxy_image():
 @app.route('/api/system_stats')
 @login_required
 def system_stats():
-    """获取系统状态数据"""
+    """获取系统状态数据，可通过 tier(raw/1m/5m/1h) 和 window(秒) 获取历史数据"""
     try:
         stats = get_system_stats()
-        return jsonify({'success': True, 'data': stats})
+        result = {'success': True, 'data': stats}
+        
+        tier = request.args.get('tier')
+        window = request.args.get('window', type=float)
+        if tier or window:
+            result['series'] = stats_sampler.series(tier or 'raw', window)
+            result['tier'] = tier or 'raw'
+        
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
     except Exception as e:
         log_handler.add_log(f"获取系统状态失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'获取失败: {str(e)}'})
@@ -1858,14 +2116,7 @@ def restart_bot():
             log_handler.add_log("未找到python3解释器", "ERROR")
             return jsonify({'success': False, 'message': '未找到python3解释器'})
         
-        bot_process = subprocess.Popen(
-            [python_path, 'index.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8',
-            bufsize=1
-        )
+        bot_process = spawn_bot_process(python_path)
         
         # 启动日志读取线程
         threading.Thread(target=read_bot_output, daemon=True).start()
@@ -1879,13 +2130,60 @@ def restart_bot():
         log_handler.add_log(f"机器人重启失败: {str(e)}", "ERROR")
         return jsonify({'success': False, 'message': f'重启失败: {str(e)}'})
 
+def spawn_bot_process(python_path):
+    """启动机器人子进程，日志以JSON行的形式通过管道输出"""
+    env = os.environ.copy()
+    env['BPMB_LOG_FORMAT'] = 'json'
+    bot_metrics.clear()
+    return subprocess.Popen(
+        [python_path, 'index.py'],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        encoding='utf-8',
+        bufsize=1,
+        env=env
+    )
+
 def read_bot_output():
     """读取机器人输出"""
     global bot_process
     if bot_process and bot_process.stdout:
         for line in iter(bot_process.stdout.readline, ''):
             if line:
-                log_handler.add_log(f"BOT: {line.strip()}")
+                handle_bot_line(line.strip())
+
+def handle_bot_line(line):
+    """解析机器人输出的一行，JSON行按级别写入日志，其余按原文记录"""
+    if not line:
+        return
+    
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        
+        if isinstance(record, dict) and record.get('type') == 'log':
+            account = record.get('account')
+            prefix = f"[{account}] " if account else ""
+            log_handler.add_log(f"BOT: {prefix}{record.get('msg', '')}", record.get('level', 'INFO'))
+            return
+        
+        if isinstance(record, dict) and record.get('type') == 'metrics':
+            bot_metrics.update(record.get('data') or {})
+            return
+        
+        if isinstance(record, dict) and record.get('type') == 'plugin_load_report':
+            bot_metrics.update_load_report(record.get('data') or {})
+            return
+        
+        if isinstance(record, dict) and record.get('type') == 'command_result':
+            bot_commands.resolve(record.get('data') or {})
+            return
+    
+    log_handler.add_log(f"BOT: {line}")
 
 @app.route('/api/get_logs')
 @login_required
@@ -1895,6 +2193,73 @@ def get_logs():
     logs = log_handler.get_logs(limit)
     return jsonify({'logs': logs})
 
+@app.route('/api/stream')
+@login_required
+def event_stream():
+    """实时推送日志、机器人状态和系统状态（Server-Sent Events）"""
+    client = stream_hub.subscribe()
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            yield format_sse('status', build_bot_status())
+            while True:
+                events, dropped = client.drain(timeout=15)
+                if dropped:
+                    # 客户端过慢，通知前端重新拉取完整日志
+                    yield format_sse('dropped', {'count': dropped})
+                for event, data in events:
+                    yield format_sse(event, data)
+                if not events and not dropped:
+                    yield ": ping\n\n"
+        finally:
+            stream_hub.unsubscribe(client)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def format_sse(event, data):
+    """格式化SSE消息"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+@app.route('/api/bot_metrics')
+@login_required
+def get_bot_metrics():
+    """获取各账号的运行指标"""
+    return jsonify({'success': True, 'data': bot_metrics.summary()})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 文本格式的指标，需登录或携带 metrics_token"""
+    token = panel_config.get_metrics_token()
+    auth = request.headers.get('Authorization', '')
+    authorized = 'logged_in' in session or (
+        token and secrets.compare_digest(auth, f"Bearer {token}")
+    )
+    if not authorized:
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    
+    snapshot = bot_metrics.latest or {'metrics': []}
+    running = 1 if bot_process and bot_process.poll() is None else 0
+    families = [{
+        'name': 'bpmb_bot_process_up',
+        'type': 'gauge',
+        'help': '机器人进程是否在运行',
+        'samples': [{'labels': {}, 'value': running}]
+    }] + list(snapshot.get('metrics', []))
+    
+    return Response(
+        metrics.render_prometheus({'metrics': families}),
+        mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 @app.route('/api/clear_logs', methods=['POST'])
 @login_required
 def clear_logs():
@@ -2642,6 +3007,32 @@ def create_templates():
                 </div>
             </div>
 
+            <!-- 账号运行指标 -->
+            <div class="bg-white rounded-xl shadow-sm border border-gray-100 p-6 mb-6">
+                <h3 class="text-lg font-medium text-gray-800 mb-4">账号运行指标</h3>
+                <div class="overflow-x-auto">
+                    <table class="min-w-full text-sm">
+                        <thead>
+                            <tr class="text-left text-gray-500 border-b border-gray-100">
+                                <th class="py-2 pr-4">账号</th>
+                                <th class="py-2 pr-4">状态</th>
+                                <th class="py-2 pr-4">轮询/分钟</th>
+                                <th class="py-2 pr-4">收到消息</th>
+                                <th class="py-2 pr-4">已发送</th>
+                                <th class="py-2 pr-4">发送失败</th>
+                                <th class="py-2 pr-4">插件处理</th>
+                                <th class="py-2 pr-4">关系检查 p50/p99</th>
+                                <th class="py-2 pr-4">回复延迟 p99</th>
+                                <th class="py-2 pr-4">距上次成功轮询</th>
+                            </tr>
+                        </thead>
+                        <tbody id="account-metrics-body">
+                            <tr><td colspan="10" class="py-4 text-center text-gray-400">暂无数据</td></tr>
+                        </tbody>
+                    </table>
+                </div>
+            </div>
+
             <!-- 控制按钮 -->
             <div class="bg-white rounded-xl shadow-sm border border-gray-100 p-6 mb-6">
                 <h3 class="text-lg font-medium text-gray-800 mb-4">机器人控制</h3>
@@ -3613,6 +4004,31 @@ def create_templates():
     </div>
 </div>
 
+<!-- 插件性能分析结果模态框 -->
+<div id="plugin-profile-modal" class="fixed inset-0 bg-black bg-opacity-50 z-50 hidden">
+    <div class="flex items-center justify-center min-h-screen p-4">
+        <div class="bg-white rounded-xl shadow-lg w-full max-w-4xl">
+            <div class="p-6 border-b border-gray-200">
+                <h3 id="plugin-profile-title" class="text-xl font-bold text-gray-800">性能分析结果</h3>
+                <p id="plugin-profile-summary" class="text-sm text-gray-500 mt-1"></p>
+            </div>
+            <div class="p-6">
+                <pre id="plugin-profile-stats" class="text-xs bg-gray-50 border border-gray-200 rounded-lg p-4 overflow-auto" style="max-height: 60vh;"></pre>
+                <div class="mt-6 flex justify-end space-x-3">
+                    <button type="button" onclick="downloadPluginProfile()"
+                            class="px-4 py-2 bg-primary-600 text-white rounded-lg hover:bg-primary-700 transition">
+                        下载 .prof 文件
+                    </button>
+                    <button type="button" onclick="hidePluginProfileModal()"
+                            class="px-4 py-2 text-gray-700 bg-gray-200 rounded-lg hover:bg-gray-300 transition">
+                        关闭
+                    </button>
+                </div>
+            </div>
+        </div>
+    </div>
+</div>
+
 <!-- 创建插件模态框 -->
 <div id="create-plugin-modal" class="fixed inset-0 bg-black bg-opacity-50 z-50 hidden">
     <div class="flex items-center justify-center min-h-screen p-4">